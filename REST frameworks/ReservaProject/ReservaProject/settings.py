@@ -188,8 +188,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        # 1ro: Prioridad a la autenticación por Token
-        'rest_framework.authentication.TokenAuthentication',
+        # 1ro: Prioridad a la autenticación por Token (token, usuario y perfil
+        # en una query, cacheados; ver mainApp/autenticacion.py)
+        'mainApp.autenticacion.TokenAuthenticationConRol',
 
         # 2do: Permite la autenticación por Sesión (para la API Navegable)
         'rest_framework.authentication.SessionAuthentication',
@@ -299,20 +300,71 @@ if not DEBUG:
 # Generar clave: from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())
 FIELD_ENCRYPTION_KEY = os.environ.get('FIELD_ENCRYPTION_KEY', '4GmvO9dDiZCcJ-B1PglnW5nwn5pkQK3E5jYU-F517W0=')
 
+# Clave HMAC de los índices ciegos de RUT y teléfono (ver mainApp/indice_ciego.py).
+# Si no se define se deriva de SECRET_KEY. Al cambiarla hay que recalcular los
+# índices: python manage.py rellenar_indices_ciegos
+BLIND_INDEX_KEY = os.environ.get('BLIND_INDEX_KEY')
+
 # FIX #27 (MODERADO): Configuración de cache para mejorar rendimiento
 # En desarrollo: usar cache local en memoria
-# En producción: podría usar Redis configurando REDIS_URL en variables de entorno
-CACHES = {
-    'default': {
+# En producción: gunicorn corre 4 workers y LocMemCache es por proceso, así que
+# la cache de disponibilidad y los contadores de throttling (registro/login)
+# quedarían repartidos entre workers. CACHE_URL (o REDIS_URL) selecciona un
+# almacén compartido por todos los workers:
+#   redis://host:6379/0 o rediss://...  -> Redis (requiere el paquete redis)
+#   db://nombre_tabla                   -> tabla en la base de datos (SQLite o
+#                                          PostgreSQL; ejecutar createcachetable).
+#                                          La opción sin Redis para varias réplicas
+#   file:///ruta/al/directorio          -> archivos en disco: solo se comparte
+#                                          entre workers del mismo host, no sirve
+#                                          con varias réplicas/contenedores
+#   locmem://                           -> memoria local (por defecto)
+CACHE_URL = os.environ.get('CACHE_URL') or os.environ.get('REDIS_URL', '')
+CACHE_TIMEOUT = 300  # Cache por defecto: 5 minutos
+
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    }
+elif CACHE_URL.startswith('file://'):
+    CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL[len('file://'):] or os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+elif CACHE_URL.startswith('db://'):
+    CACHE_DEFAULT = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': CACHE_URL[len('db://'):] or 'reservas_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+elif CACHE_URL in ('', 'locmem://'):
+    CACHE_DEFAULT = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'reservas-cache',
         'OPTIONS': {
             'MAX_ENTRIES': 1000,  # Máximo 1000 entradas en cache
         },
-        'TIMEOUT': 300,  # Cache por defecto: 5 minutos
     }
+else:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(f'CACHE_URL no soportada: {CACHE_URL}')
+
+CACHE_DEFAULT['TIMEOUT'] = CACHE_TIMEOUT
+CACHES = {
+    'default': CACHE_DEFAULT,
 }
 
+# Segundos que se cachea la identidad (usuario y rol) de cada token. Solo se
+# cachea con un CACHE_URL compartido (no con locmem): ahí los cambios de rol,
+# desactivaciones y tokens borrados se aplican de inmediato en todos los workers.
+AUTH_CACHE_TIMEOUT = int(os.environ.get('AUTH_CACHE_TIMEOUT', 60))
+
 # FIX #21 (MODERADO): Sistema de auditoría y logging
 # En producción (Railway), usar solo console logging (Railway captura stdout/stderr)
 # En desarrollo, usar file logging
@@ -420,6 +472,8 @@ else:
     EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
     EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
     EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+    # Evita que un servidor SMTP colgado bloquee al worker de emails
+    EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 30))
 
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@restaurante.com')
 
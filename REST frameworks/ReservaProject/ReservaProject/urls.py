@@ -28,6 +28,7 @@ urlpatterns = [
     # Endpoints de gestión de usuarios (Admin)
     path('api/usuarios/', views.listar_usuarios, name='listar-usuarios'),
     path('api/usuarios/<int:user_id>/cambiar-rol/', views.cambiar_rol_usuario, name='cambiar-rol-usuario'),
+    path('api/clientes/buscar/', views.buscar_cliente, name='buscar-cliente'),
 
     # Endpoints para usuarios invitados (sin autenticación)
     path('api/verificar-token/<str:token>/', views.verificar_token_invitado, name='verificar-token'),
@@ -38,6 +39,8 @@ urlpatterns = [
     # Endpoints personalizados
     path('api/consultar-mesas/', views.ConsultaMesasView.as_view(), name='consultar-mesas'),
     path('api/horas-disponibles/', views.ConsultarHorasDisponiblesView.as_view(), name='horas-disponibles'),
+    path('api/disponibilidad-rango/', views.DisponibilidadRangoView.as_view(), name='disponibilidad-rango'),
+    path('api/cache-disponibilidad/', views.estadisticas_cache_disponibilidad, name='cache-disponibilidad'),
 
     # Incluir las rutas generadas por el router (mesas y reservas)
     path('api/', include(router.urls)),
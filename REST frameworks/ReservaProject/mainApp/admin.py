@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Perfil, Mesa, Reserva
+from .models import Perfil, Mesa, Reserva, EmailPendiente
 
 
 @admin.register(Perfil)
@@ -23,4 +23,12 @@ class ReservaAdmin(admin.ModelAdmin):
     list_filter = ('estado', 'fecha_reserva')
     search_fields = ('cliente__username', 'mesa__numero')
     ordering = ('-fecha_reserva', '-hora_inicio')
-    date_hierarchy = 'fecha_reserva' 
+    date_hierarchy = 'fecha_reserva'
+
+
+@admin.register(EmailPendiente)
+class EmailPendienteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'destinatario', 'estado', 'intentos', 'proximo_intento', 'created_at')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('destinatario', 'asunto')
+    ordering = ('-created_at',)
@@ -0,0 +1,174 @@
+"""
+Autenticación por token con la identidad y el rol cacheados.
+
+TokenAuthentication de DRF hace una query por request para el token y el
+usuario, y después get_permissions, get_queryset y las clases de
+permissions.py leen request.user.perfil.rol, que es otra query. Aquí el
+token, el usuario y el perfil se cargan en una sola query con
+select_related (sin los campos encriptados del perfil, que se cargan solo
+si se usan) y se cachean por AUTH_CACHE_TIMEOUT segundos (default 60).
+
+Cada usuario tiene una versión en la cache. La entrada del token guarda la
+versión con la que se cargó y solo es válida mientras no cambie. Las
+escrituras no borran entradas: incrementan la versión (ver signals.py), de
+modo que un cambio de rol, la desactivación del usuario o el borrado del
+token se ven en el siguiente request de cualquier worker.
+
+Eso requiere que todos los workers vean la misma versión: con una cache
+propia de cada proceso (LocMemCache, la default sin CACHE_URL) la identidad
+no se cachea y cada request hace la query.
+
+La entrada guarda solo columnas sin secretos (CAMPOS_USUARIO y
+CAMPOS_PERFIL), no los objetos: ni el hash de la contraseña ni el token
+quedan en Redis, en disco o en la tabla de cache. Con ella se arman
+instancias con el resto de los campos diferidos, que se cargan si se usan.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .cifrado import CAMPOS_CIFRADOS
+
+
+PREFIJO = 'auth'
+
+# Tiempo de vida de una identidad cacheada (segundos)
+TIMEOUT = getattr(settings, 'AUTH_CACHE_TIMEOUT', 60)
+
+# Backends que no comparten datos entre procesos
+BACKENDS_LOCALES = (LocMemCache, DummyCache)
+
+# Columnas que se cachean. username se usa en los logs de auditoría
+CAMPOS_USUARIO = ('id', 'username', 'is_active')
+CAMPOS_PERFIL = ('id', 'user_id', 'rol')
+
+
+def identidad_cacheable():
+    """True si la cache default es compartida por todos los workers."""
+    return TIMEOUT > 0 and not isinstance(caches[DEFAULT_CACHE_ALIAS], BACKENDS_LOCALES)
+
+
+def _clave_token(key):
+    # Hash del token: la clave de la cache no expone la credencial
+    return f'{PREFIJO}:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _clave_version(user_id):
+    return f'{PREFIJO}:version:{user_id}'
+
+
+def _version(user_id):
+    clave = _clave_version(user_id)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def _incrementar(user_id):
+    clave = _clave_version(user_id)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, time.time_ns(), timeout=None)
+
+
+def invalidar_identidad(user_id):
+    """
+    Descarta las identidades cacheadas del usuario. Se incrementa de
+    inmediato y otra vez al hacer commit, para descartar lo que otro worker
+    haya cacheado con datos anteriores al commit.
+    """
+    if not identidad_cacheable():
+        return
+    _incrementar(user_id)
+    transaction.on_commit(lambda: _incrementar(user_id))
+
+
+def cargar_token(key):
+    """Token, usuario y perfil en una sola query (perfil sin campos encriptados)."""
+    from rest_framework.authtoken.models import Token
+    return (
+        Token.objects
+        .select_related('user', 'user__perfil')
+        .defer(*(f'user__perfil__{campo}' for campo in CAMPOS_CIFRADOS))
+        .get(key=key)
+    )
+
+
+def _fila(instancia, campos):
+    return {campo: getattr(instancia, campo) for campo in campos}
+
+
+def _instancia(modelo, fila):
+    """Instancia como la cargada de la BD, con los campos que no están en 'fila' diferidos."""
+    campos = [f.attname for f in modelo._meta.concrete_fields if f.attname in fila]
+    return modelo.from_db(router.db_for_read(modelo), campos, [fila[c] for c in campos])
+
+
+def _entrada(token, version):
+    """Lo que se cachea del token: columnas del usuario y del perfil, sin secretos."""
+    try:
+        perfil = _fila(token.user.perfil, CAMPOS_PERFIL)
+    except AttributeError:
+        # Usuario sin perfil
+        perfil = None
+    return {'usuario': _fila(token.user, CAMPOS_USUARIO), 'perfil': perfil, 'version': version}
+
+
+def _token_desde(key, entrada):
+    from rest_framework.authtoken.models import Token
+    from .models import Perfil
+
+    user = _instancia(User, entrada['usuario'])
+    perfil = _instancia(Perfil, entrada['perfil']) if entrada['perfil'] else None
+    # user.perfil sin query (None: el acceso lanza RelatedObjectDoesNotExist)
+    User.perfil.related.set_cached_value(user, perfil)
+    if perfil is not None:
+        Perfil.user.field.set_cached_value(perfil, user)
+    token = _instancia(Token, {'key': key, 'user_id': user.pk})
+    Token.user.field.set_cached_value(token, user)
+    return token
+
+
+class TokenAuthenticationConRol(TokenAuthentication):
+    """
+    TokenAuthentication con una query por token (incluido el perfil) y la
+    identidad cacheada hasta que cambie la versión del usuario.
+    """
+
+    def authenticate_credentials(self, key):
+        from rest_framework.authtoken.models import Token
+
+        cacheable = identidad_cacheable()
+        clave = _clave_token(key)
+        entrada = cache.get(clave) if cacheable else None
+        if entrada is not None:
+            if entrada['version'] == _version(entrada['usuario']['id']):
+                return self._validar(_token_desde(key, entrada))
+
+        try:
+            # La versión se lee antes de la query: si cambia mientras tanto, la
+            # entrada queda inválida en vez de guardar datos viejos
+            token = cargar_token(key)
+            version = _version(token.user_id) if cacheable else None
+        except Token.DoesNotExist:
+            raise AuthenticationFailed('Invalid token.')
+
+        if cacheable:
+            cache.set(clave, _entrada(token, version), TIMEOUT)
+        return self._validar(token)
+
+    def _validar(self, token):
+        if not token.user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return (token.user, token)
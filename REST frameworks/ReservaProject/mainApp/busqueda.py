@@ -0,0 +1,58 @@
+"""
+Búsqueda de reservas por cliente sobre un documento desnormalizado.
+
+Buscar con icontains en cinco columnas de tres tablas (username, nombre,
+apellido, email, nombre_completo) no puede usar índices: cada búsqueda
+recorre y une todas las filas. Por eso cada Perfil guarda en 'busqueda' esos
+campos concatenados y normalizados (minúsculas, sin tildes, espacios
+simples), y ?search= filtra con un único LIKE '%termino%' sobre esa columna:
+
+- PostgreSQL: índice GIN con gin_trgm_ops (migración 0014), que resuelve el
+  LIKE con comodines a ambos lados sin recorrer la tabla.
+- Otros motores: la misma columna normalizada, sin índice especial.
+
+El documento se recalcula en Perfil.save(), que también se ejecuta al
+guardar el User (ver signals.py).
+"""
+import re
+import unicodedata
+
+from rest_framework.filters import SearchFilter
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni diacríticos y con espacios simples."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', texto.lower()).strip()
+
+
+# Campos de User que forman parte del documento
+CAMPOS_USUARIO = ('username', 'first_name', 'last_name', 'email')
+
+
+def documento_busqueda(user, perfil=None):
+    """Texto buscable de un cliente (User y Perfil)."""
+    partes = [getattr(user, campo) for campo in CAMPOS_USUARIO]
+    if perfil is not None:
+        partes += [perfil.nombre_completo, perfil.email]
+    # dict.fromkeys: sin repetidos (p. ej. el mismo email en User y Perfil)
+    return ' '.join(dict.fromkeys(p for p in map(normalizar, partes) if p))
+
+
+class BusquedaClienteFilter(SearchFilter):
+    """
+    SearchFilter sobre el documento de búsqueda del cliente: cada término
+    de ?search= debe aparecer en él (igual que SearchFilter, que exige todos
+    los términos). La vista indica el campo con 'search_document_field'.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        campo = getattr(view, 'search_document_field', None)
+        terminos = [normalizar(t) for t in self.get_search_terms(request)]
+        terminos = [t for t in terminos if t]
+        if not campo or not terminos:
+            return queryset
+        for termino in terminos:
+            queryset = queryset.filter(**{f'{campo}__contains': termino})
+        return queryset
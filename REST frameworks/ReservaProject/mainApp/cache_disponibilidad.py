@@ -0,0 +1,195 @@
+"""
+Cache versionada para las consultas de disponibilidad.
+
+Las respuestas de ConsultaMesasView y ConsultarHorasDisponiblesView se guardan
+en django.core.cache bajo una clave que incluye la versión de cada ámbito del
+que dependen:
+
+- 'fecha:<YYYY-MM-DD>': reservas y bloqueos de ese día
+- 'bloqueos': bloqueos de rango largo (se invalida en bloque en vez de día a día)
+- 'mesas': cualquier cambio en Mesa (incluye el estado)
+- 'capacidad': alta, baja o cambio de capacidad de una Mesa
+
+Las escrituras no borran entradas: incrementan la versión del ámbito (ver
+signals.py), de modo que las claves antiguas quedan huérfanas y expiran solas.
+Con la cache caliente una consulta no toca la base de datos. En los backends
+sin incr atómico (archivos, base de datos) la versión no se incrementa: se
+reemplaza por una nueva, así dos invalidaciones simultáneas no pueden dejarla
+en un valor ya usado.
+
+Los contadores de aciertos/fallos (estadisticas()) se llevan solo si el
+backend tiene un incr atómico que no escribe en la base de datos (Redis,
+LocMemCache). En FileBasedCache y DatabaseCache incr es un get + set: no es
+atómico y, con db://, cada acierto costaría escrituras en la BD. Se puede
+forzar con DISPONIBILIDAD_CACHE_ESTADISTICAS = True/False.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+PREFIJO = 'disponibilidad'
+
+# Tiempo de vida de cada respuesta cacheada (segundos)
+TIMEOUT = getattr(settings, 'DISPONIBILIDAD_CACHE_TIMEOUT', 300)
+
+# Bloqueos más largos que esto invalidan el ámbito 'bloqueos' completo
+MAX_DIAS_INVALIDACION = 31
+
+CLAVE_HITS = f'{PREFIJO}:stats:hits'
+CLAVE_MISSES = f'{PREFIJO}:stats:misses'
+
+# None: según el backend (ver BACKENDS_CON_CONTADORES)
+ESTADISTICAS = getattr(settings, 'DISPONIBILIDAD_CACHE_ESTADISTICAS', None)
+
+# Backends con incr atómico
+BACKENDS_CON_CONTADORES = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def incr_atomico():
+    """True si cache.incr del backend configurado es atómico."""
+    return settings.CACHES['default']['BACKEND'] in BACKENDS_CON_CONTADORES
+
+
+def contadores_activos():
+    """True si se llevan los contadores de aciertos/fallos."""
+    if ESTADISTICAS is not None:
+        return ESTADISTICAS
+    return incr_atomico()
+
+
+def _clave_version(ambito):
+    return f'{PREFIJO}:version:{ambito}'
+
+
+def _version_inicial():
+    # Si la versión se pierde (expulsión de la cache) se reinicia con un valor
+    # nuevo, así nunca coincide con claves cacheadas bajo la versión anterior
+    return time.time_ns()
+
+
+def ambito_fecha(fecha):
+    """Ámbito de versión para una fecha (date o string YYYY-MM-DD)."""
+    return f'fecha:{fecha}'
+
+
+def obtener_versiones(ambitos):
+    """
+    Retorna {ambito: version} leyendo todas las versiones en una sola llamada.
+    Inicializa las que no existan.
+    """
+    claves = {_clave_version(ambito): ambito for ambito in ambitos}
+    encontradas = cache.get_many(list(claves))
+
+    versiones = {}
+    for clave, ambito in claves.items():
+        version = encontradas.get(clave)
+        if version is None:
+            cache.add(clave, _version_inicial(), timeout=None)
+            version = cache.get(clave)
+        versiones[ambito] = version
+    return versiones
+
+
+def _incrementar(ambitos):
+    if not incr_atomico():
+        # incr sería get + set: con dos invalidaciones a la vez una se pierde
+        # y la versión puede quedar igual a la que usó una lectura anterior
+        cache.set_many({_clave_version(ambito): _version_inicial() for ambito in ambitos}, timeout=None)
+        return
+    for ambito in ambitos:
+        clave = _clave_version(ambito)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # La clave no existe: basta con crear una versión nueva
+            cache.add(clave, _version_inicial(), timeout=None)
+
+
+def invalidar(*ambitos):
+    """
+    Incrementa la versión de los ámbitos indicados.
+
+    Se incrementa de inmediato (lecturas dentro de la misma transacción) y otra
+    vez al hacer commit, para descartar respuestas que otro worker haya
+    cacheado con datos anteriores al commit.
+    """
+    ambitos = list(ambitos)
+    _incrementar(ambitos)
+    transaction.on_commit(lambda: _incrementar(ambitos))
+
+
+def invalidar_rango(fecha_inicio, fecha_fin):
+    """Invalida todos los días de un rango (o 'bloqueos' si el rango es largo)."""
+    from datetime import timedelta
+
+    dias = (fecha_fin - fecha_inicio).days + 1
+    if dias > MAX_DIAS_INVALIDACION:
+        invalidar('bloqueos')
+    else:
+        invalidar(*(ambito_fecha(fecha_inicio + timedelta(days=n)) for n in range(dias)))
+
+
+def obtener_o_calcular(vista, ambitos, parametros, calcular):
+    """
+    Devuelve la respuesta cacheada para (vista, parametros) o la calcula.
+
+    Args:
+        vista: str - nombre de la vista (prefijo de la clave)
+        ambitos: list[str] - ámbitos de versión de los que depende la respuesta
+        parametros: tuple - parámetros de la consulta
+        calcular: callable sin argumentos que retorna la respuesta
+
+    Returns:
+        tuple(data, bool) - respuesta y si vino de la cache
+    """
+    versiones = obtener_versiones(ambitos)
+    sufijo_version = ':'.join(f'{ambito}={versiones[ambito]}' for ambito in ambitos)
+    sufijo_parametros = ':'.join(str(p) for p in parametros)
+    clave = f'{PREFIJO}:{vista}:{sufijo_version}:{sufijo_parametros}'
+
+    data = cache.get(clave)
+    if data is not None:
+        _contar(CLAVE_HITS)
+        return data, True
+
+    _contar(CLAVE_MISSES)
+    data = calcular()
+    cache.set(clave, data, TIMEOUT)
+    return data, False
+
+
+def _contar(clave):
+    if not contadores_activos():
+        return
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, timeout=None):
+            cache.incr(clave)
+
+
+def estadisticas():
+    """
+    Contadores de aciertos/fallos de la cache de disponibilidad. 'activas'
+    indica si se están llevando (ver contadores_activos).
+    """
+    valores = cache.get_many([CLAVE_HITS, CLAVE_MISSES])
+    hits = valores.get(CLAVE_HITS, 0)
+    misses = valores.get(CLAVE_MISSES, 0)
+    total = hits + misses
+    return {
+        'activas': contadores_activos(),
+        'hits': hits,
+        'misses': misses,
+        'total': total,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reiniciar_estadisticas():
+    cache.delete_many([CLAVE_HITS, CLAVE_MISSES])
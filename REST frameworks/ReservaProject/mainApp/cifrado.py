@@ -0,0 +1,95 @@
+"""
+Descifrado de RUT y teléfono de clientes en listados de reservas.
+
+EncryptedCharField descifra en from_db_value: cargar una página de 50
+reservas con select_related('cliente__perfil') ejecuta 100 operaciones
+Fernet (RUT y teléfono de cada fila), aunque la respuesta no los incluya
+(?fields=) y aunque el mismo cliente aparezca en varias filas.
+
+En los listados:
+1. anotar_cifrados() difiere los campos encriptados del perfil y anota solo
+   el texto cifrado de los campos visibles para el rol y pedidos en
+   ?fields= (sin descifrarlo).
+2. descifrar_en_lote() descifra una vez cada texto cifrado distinto de la
+   página y deja el valor en el perfil, así que la serialización no vuelve
+   a descifrar ni hace queries.
+"""
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+
+CAMPOS_CIFRADOS = ('rut', 'telefono')
+
+# Campos encriptados del cliente que cada rol ve en las reservas: todo el
+# personal ve RUT y teléfono, y el cliente solo lista sus propias reservas,
+# así que ve sus datos. Sin rol (anónimo, sin perfil) no se ve ninguno.
+CAMPOS_VISIBLES_POR_ROL = {
+    'admin': ('rut', 'telefono'),
+    'cajero': ('rut', 'telefono'),
+    'mesero': ('rut', 'telefono'),
+    'cliente': ('rut', 'telefono'),
+}
+
+PREFIJO_ANOTACION = 'cifrado_'
+
+
+def campos_visibles(rol):
+    """Campos encriptados del cliente que puede ver el rol (permissions.rol_de)."""
+    return CAMPOS_VISIBLES_POR_ROL.get(rol, ())
+
+
+def anotar_cifrados(queryset, campos, relacion='cliente__perfil'):
+    """
+    Difiere los campos encriptados de 'relacion' y anota el texto cifrado de
+    'campos' (Cast a TextField: no pasa por from_db_value).
+    """
+    queryset = queryset.defer(*(f'{relacion}__{campo}' for campo in CAMPOS_CIFRADOS))
+    return queryset.annotate(**{
+        f'{PREFIJO_ANOTACION}{campo}': Cast(f'{relacion}__{campo}', TextField())
+        for campo in campos
+    })
+
+
+def _descifrar(campo, cifrado):
+    from .models import Perfil
+    # to_python de EncryptedCharField descifra (y deja pasar texto no cifrado)
+    return Perfil._meta.get_field(campo).to_python(cifrado)
+
+
+def valor_descifrado(reserva, campo):
+    """
+    Valor de un campo encriptado del cliente de una reserva: el ya
+    descifrado, el de la anotación o, sin anotación, el del perfil.
+    """
+    perfil = reserva.cliente.perfil
+    if campo in perfil.__dict__:
+        return perfil.__dict__[campo]
+    anotacion = f'{PREFIJO_ANOTACION}{campo}'
+    if anotacion in reserva.__dict__:
+        perfil.__dict__[campo] = _descifrar(campo, reserva.__dict__[anotacion])
+        return perfil.__dict__[campo]
+    return getattr(perfil, campo)
+
+
+def descifrar_en_lote(reservas):
+    """
+    Descifra de una vez los campos anotados de una página de reservas: cada
+    texto cifrado distinto se descifra una sola vez (un cliente con varias
+    reservas en la página cuesta lo mismo que uno con una).
+    """
+    descifrados = {}
+    for reserva in reservas:
+        for campo in CAMPOS_CIFRADOS:
+            anotacion = f'{PREFIJO_ANOTACION}{campo}'
+            if anotacion not in reserva.__dict__:
+                continue
+            try:
+                perfil = reserva.cliente.perfil
+            except AttributeError:
+                # Usuario sin perfil
+                continue
+            cifrado = reserva.__dict__[anotacion]
+            if (campo, cifrado) not in descifrados:
+                descifrados[(campo, cifrado)] = _descifrar(campo, cifrado)
+            perfil.__dict__[campo] = descifrados[(campo, cifrado)]
+    return len(descifrados)
@@ -0,0 +1,353 @@
+"""
+Motor de disponibilidad para el sistema de reservas.
+
+Calcula cuántas mesas quedan libres en cada franja horaria de un día
+leyendo la ocupación y los bloqueos UNA sola vez y resolviendo los
+solapamientos en memoria con un barrido de intervalos (antes se hacían
+3 queries por franja).
+
+La ocupación por reservas se lee de la tabla materializada OcupacionSlot,
+que se mantiene desde Reserva.save() con sincronizar_ocupacion(). Los
+bloqueos (incluidas sus recurrencias) se leen de OcurrenciaBloqueo, que se
+mantiene desde BloqueoMesa.save() (ver recurrencia.py).
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Mesa, Reserva, OcupacionSlot, OcurrenciaBloqueo
+
+
+# Estados de reserva que ocupan la mesa (mismo criterio que Reserva.clean)
+ESTADOS_OCUPAN_MESA = ('pendiente', 'activa')
+
+# Cada reserva dura 2 horas (ver Reserva.save)
+DURACION_RESERVA = timedelta(hours=2)
+
+# Máximo de días que se pueden consultar en una sola llamada por rango
+MAX_DIAS_RANGO = 90
+
+
+def generar_horarios():
+    """
+    Genera todas las horas de inicio ofrecidas (12:00 - 21:30 cada 30 min).
+
+    Returns:
+        list[time] - Horas de inicio ordenadas
+    """
+    horarios = []
+    for hora in range(12, 22):  # 12:00 a 21:30
+        for minuto in [0, 30]:
+            horarios.append(time(hora, minuto))
+    return horarios
+
+
+def calcular_hora_fin(hora_inicio):
+    """Retorna la hora de fin de una reserva que comienza en hora_inicio."""
+    dt_inicio = datetime.combine(datetime.today(), hora_inicio)
+    return (dt_inicio + DURACION_RESERVA).time()
+
+
+def mesas_no_disponibles_ids(fecha, hora_inicio, hora_fin=None):
+    """
+    IDs de mesas con una reserva o bloqueo que se solapa con el horario.
+
+    Es la regla de solapamiento en SQL para una sola franja (la usa
+    ConsultaMesasView); contar_mesas_libres aplica la misma regla en memoria.
+    Si el horario es una de las franjas ofrecidas, la ocupación por reservas
+    ya está resuelta en OcupacionSlot (una igualdad sobre su índice); otros
+    horarios aplican la regla sobre Reserva.
+
+    Args:
+        fecha: date - fecha a consultar
+        hora_inicio: time - inicio de la franja
+        hora_fin: time - fin de la franja (default: hora_inicio + 2 horas)
+
+    Returns:
+        list[int] - IDs de mesas ocupadas o bloqueadas (puede tener repetidos)
+    """
+    if hora_fin is None:
+        hora_fin = calcular_hora_fin(hora_inicio)
+
+    if hora_inicio in generar_horarios() and hora_fin == calcular_hora_fin(hora_inicio):
+        mesas_ocupadas_ids = OcupacionSlot.objects.filter(
+            fecha=fecha, slot=hora_inicio
+        ).values_list('mesa_id', flat=True)
+    else:
+        # Una reserva se solapa si empieza antes del fin de la franja
+        # y termina después de su inicio
+        mesas_ocupadas_ids = Reserva.objects.filter(
+            fecha_reserva=fecha,
+            estado__in=ESTADOS_OCUPAN_MESA,
+        ).filter(
+            Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio)
+        ).values_list('mesa_id', flat=True)
+
+    mesas_bloqueadas_ids = OcurrenciaBloqueo.objects.filter(
+        fecha=fecha
+    ).filter(
+        # Si el bloqueo es de día completo (hora_inicio=None), bloquear toda la mesa
+        Q(hora_inicio__isnull=True) |
+        (Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio))
+    ).values_list('mesa_id', flat=True)
+
+    return list(mesas_ocupadas_ids) + list(mesas_bloqueadas_ids)
+
+
+def contar_mesas_libres(mesas_ids, reservas, bloqueos, horarios=None, franjas_ocupadas=()):
+    """
+    Cuenta las mesas libres en cada franja usando un barrido de intervalos.
+
+    Una mesa queda fuera de una franja [inicio, inicio + 2h) si alguna reserva
+    o bloqueo se solapa con ella (inicio_a < fin_b y fin_a > inicio_b). Como las
+    franjas están ordenadas, cada intervalo ocupado afecta a un rango contiguo
+    de franjas que se obtiene con bisect; los rangos se fusionan por mesa (para
+    no descontar dos veces la misma mesa) y se acumulan en un arreglo de
+    diferencias.
+
+    Args:
+        mesas_ids: iterable de IDs de mesas candidatas (capacidad suficiente)
+        reservas: iterable de tuplas (mesa_id, hora_inicio, hora_fin)
+        bloqueos: iterable de tuplas (mesa_id, hora_inicio, hora_fin);
+                  hora_inicio=None indica bloqueo de día completo
+        horarios: lista ordenada de horas de inicio (default: generar_horarios())
+        franjas_ocupadas: iterable de tuplas (mesa_id, hora_inicio_franja) ya
+                          resueltas (filas de OcupacionSlot)
+
+    Returns:
+        list[int] - Mesas libres por franja, alineado con horarios
+    """
+    if horarios is None:
+        horarios = generar_horarios()
+
+    candidatas = set(mesas_ids)
+    total_franjas = len(horarios)
+    fines = [calcular_hora_fin(h) for h in horarios]
+
+    # Rangos de franjas [desde, hasta) ocupados por cada mesa
+    rangos_por_mesa = {}
+
+    def marcar(mesa_id, hora_inicio, hora_fin):
+        if mesa_id not in candidatas:
+            return
+        if hora_inicio is None:
+            # Bloqueo de día completo: todas las franjas
+            desde, hasta = 0, total_franjas
+        else:
+            # Franjas con inicio < hora_fin y fin > hora_inicio
+            desde = bisect_right(fines, hora_inicio)
+            hasta = bisect_left(horarios, hora_fin)
+        if desde < hasta:
+            rangos_por_mesa.setdefault(mesa_id, []).append((desde, hasta))
+
+    for mesa_id, hora_inicio, hora_fin in reservas:
+        marcar(mesa_id, hora_inicio, hora_fin)
+    for mesa_id, hora_inicio, hora_fin in bloqueos:
+        marcar(mesa_id, hora_inicio, hora_fin)
+
+    indice_franja = {hora: indice for indice, hora in enumerate(horarios)}
+    for mesa_id, slot in franjas_ocupadas:
+        indice = indice_franja.get(slot)
+        if mesa_id in candidatas and indice is not None:
+            rangos_por_mesa.setdefault(mesa_id, []).append((indice, indice + 1))
+
+    diferencias = [0] * (total_franjas + 1)
+    for rangos in rangos_por_mesa.values():
+        rangos.sort()
+        actual_desde, actual_hasta = rangos[0]
+        for desde, hasta in rangos[1:]:
+            if desde <= actual_hasta:
+                actual_hasta = max(actual_hasta, hasta)
+            else:
+                diferencias[actual_desde] += 1
+                diferencias[actual_hasta] -= 1
+                actual_desde, actual_hasta = desde, hasta
+        diferencias[actual_desde] += 1
+        diferencias[actual_hasta] -= 1
+
+    libres = []
+    ocupadas = 0
+    for indice in range(total_franjas):
+        ocupadas += diferencias[indice]
+        libres.append(len(candidatas) - ocupadas)
+    return libres
+
+
+def disponibilidad_del_dia(fecha, num_personas, horarios=None):
+    """
+    Calcula las mesas libres por franja para una fecha y número de personas.
+
+    Ejecuta exactamente 4 queries (mesas, ocupación, verificación de
+    ocurrencias pendientes y bloqueos del día) independiente de la cantidad
+    de franjas.
+
+    Returns:
+        list[int] | None - Mesas libres por franja, o None si ninguna mesa
+        tiene capacidad suficiente para num_personas
+    """
+    mesas_ids = list(
+        Mesa.objects.filter(capacidad__gte=num_personas).values_list('id', flat=True)
+    )
+    if not mesas_ids:
+        return None
+
+    # Lectura sobre el índice (fecha, slot, mesa) de OcupacionSlot
+    franjas_ocupadas = OcupacionSlot.objects.filter(
+        fecha=fecha
+    ).values_list('mesa_id', 'slot').distinct()
+
+    # Lectura sobre el índice (fecha, mesa) de OcurrenciaBloqueo
+    bloqueos = OcurrenciaBloqueo.objects.filter(
+        fecha=fecha
+    ).values_list('mesa_id', 'hora_inicio', 'hora_fin')
+
+    return contar_mesas_libres(mesas_ids, [], bloqueos, horarios, franjas_ocupadas)
+
+
+def disponibilidad_rango(desde, hasta, num_personas, horarios=None):
+    """
+    Calcula las mesas libres por franja para cada día entre desde y hasta
+    (ambos inclusive).
+
+    Lee la ocupación del rango con UNA query ordenada por fecha y la consume
+    con iterator(), agrupando día a día; las ocurrencias de bloqueos del
+    rango se leen con otra query. Es un generador: solo mantiene en memoria el día en curso,
+    por lo que sirve para respuestas en streaming.
+
+    Yields:
+        tuple(date, list[int]) - Fecha y mesas libres por franja
+    """
+    if horarios is None:
+        horarios = generar_horarios()
+
+    mesas_ids = list(
+        Mesa.objects.filter(capacidad__gte=num_personas).values_list('id', flat=True)
+    )
+
+    dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+
+    if not mesas_ids:
+        # Sin mesas con capacidad suficiente no hace falta leer reservas
+        for dia in dias:
+            yield dia, [0] * len(horarios)
+        return
+
+    bloqueos_por_dia = {}
+    for fecha, *bloqueo in OcurrenciaBloqueo.objects.filter(
+        fecha__range=(desde, hasta)
+    ).values_list('fecha', 'mesa_id', 'hora_inicio', 'hora_fin'):
+        bloqueos_por_dia.setdefault(fecha, []).append(bloqueo)
+
+    ocupacion = OcupacionSlot.objects.filter(
+        fecha__range=(desde, hasta)
+    ).order_by('fecha').values_list('fecha', 'mesa_id', 'slot').iterator()
+
+    ocupacion_por_dia = groupby(ocupacion, key=lambda fila: fila[0])
+    siguiente = next(ocupacion_por_dia, None)
+
+    for dia in dias:
+        franjas_dia = []
+        if siguiente is not None and siguiente[0] == dia:
+            franjas_dia = [fila[1:] for fila in siguiente[1]]
+            siguiente = next(ocupacion_por_dia, None)
+
+        bloqueos_dia = bloqueos_por_dia.get(dia, [])
+
+        yield dia, contar_mesas_libres(mesas_ids, [], bloqueos_dia, horarios, franjas_dia)
+
+
+# ============ OCUPACIÓN MATERIALIZADA (OcupacionSlot) ============
+
+def franjas_de_reserva(hora_inicio, hora_fin, horarios=None):
+    """
+    Horas de inicio de las franjas que una reserva [hora_inicio, hora_fin)
+    deja no disponibles (misma regla de solapamiento que contar_mesas_libres).
+    """
+    if horarios is None:
+        horarios = generar_horarios()
+    return [
+        hora for hora in horarios
+        if hora < hora_fin and calcular_hora_fin(hora) > hora_inicio
+    ]
+
+
+def _filas_ocupacion(reserva_id, mesa_id, fecha, hora_inicio, hora_fin, horarios):
+    return [
+        OcupacionSlot(reserva_id=reserva_id, mesa_id=mesa_id, fecha=fecha, slot=slot)
+        for slot in franjas_de_reserva(hora_inicio, hora_fin, horarios)
+    ]
+
+
+def sincronizar_ocupacion(reserva):
+    """
+    Reescribe las filas de OcupacionSlot de una reserva.
+
+    Se llama desde Reserva.save() dentro de la misma transacción, por lo que
+    todos los flujos de escritura (crear, actualizar, soft delete, cambio de
+    estado, cancelación de invitados) mantienen la tabla al día. save() la
+    omite cuando las franjas no cambian (p. ej. pendiente -> activa).
+    """
+    OcupacionSlot.objects.filter(reserva_id=reserva.pk).delete()
+
+    if reserva.deleted_at is None and reserva.estado in ESTADOS_OCUPAN_MESA:
+        OcupacionSlot.objects.bulk_create(_filas_ocupacion(
+            reserva.pk, reserva.mesa_id, reserva.fecha_reserva,
+            reserva.hora_inicio, reserva.hora_fin, generar_horarios()
+        ))
+
+
+def _ocupacion_esperada():
+    """Genera las filas que debería tener OcupacionSlot según Reserva."""
+    horarios = generar_horarios()
+    reservas = Reserva.objects.filter(
+        estado__in=ESTADOS_OCUPAN_MESA
+    ).values_list('id', 'mesa_id', 'fecha_reserva', 'hora_inicio', 'hora_fin')
+
+    for reserva_id, mesa_id, fecha, hora_inicio, hora_fin in reservas.iterator(chunk_size=2000):
+        yield from _filas_ocupacion(reserva_id, mesa_id, fecha, hora_inicio, hora_fin, horarios)
+
+
+def reconstruir_ocupacion(batch_size=2000):
+    """
+    Borra y regenera OcupacionSlot completa a partir de las reservas.
+
+    Returns:
+        int - Cantidad de filas creadas
+    """
+    total = 0
+    with transaction.atomic():
+        OcupacionSlot.objects.all().delete()
+
+        lote = []
+        for fila in _ocupacion_esperada():
+            lote.append(fila)
+            if len(lote) >= batch_size:
+                OcupacionSlot.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            OcupacionSlot.objects.bulk_create(lote)
+            total += len(lote)
+
+    return total
+
+
+def verificar_ocupacion():
+    """
+    Compara OcupacionSlot con la ocupación calculada desde Reserva.
+
+    Returns:
+        tuple(set, set) - (faltantes, sobrantes) como tuplas
+        (reserva_id, mesa_id, fecha, slot); ambos vacíos si está consistente
+    """
+    esperadas = {
+        (fila.reserva_id, fila.mesa_id, fila.fecha, fila.slot)
+        for fila in _ocupacion_esperada()
+    }
+    actuales = set(
+        OcupacionSlot.objects.values_list('reserva_id', 'mesa_id', 'fecha', 'slot')
+    )
+    return esperadas - actuales, actuales - esperadas
@@ -1,257 +1,389 @@
 """
 Servicio de envío de emails para el sistema de reservas.
 Maneja confirmaciones, activación de cuentas y notificaciones.
+
+Los enviar_email_* no se conectan al servidor SMTP: componen el mensaje y lo
+encolan en EmailPendiente (outbox) dentro de la transacción en curso. El
+worker `python manage.py procesar_emails` los envía con
+procesar_emails_pendientes(), por lotes y con reintentos.
+
+Todo envío real pasa por entregar_mensajes(), que reutiliza una conexión
+SMTP autenticada para muchos mensajes en vez de un handshake TLS por email.
+
+Los cuerpos están en templates/emails/<tipo>.txt. Cada template se compila
+una sola vez por proceso y los fragmentos fijos (firma, beneficios de la
+cuenta, links) se renderizan una vez y se reutilizan; renderizar_en_lote()
+genera los mensajes de una ola completa (recordatorios, cancelaciones) sin
+volver a parsear nada por mensaje.
 """
-from django.core.mail import send_mail
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.db import transaction
+from django.db.models import QuerySet
+from django.template.loader import get_template
+from django.utils import timezone
 
+from .models import EmailPendiente
 
-def enviar_email_confirmacion_invitado(reserva, perfil):
+logger = logging.getLogger(__name__)
+
+# Reintentos: 1 min, 2 min, 4 min, ... hasta 1 hora entre intentos
+MAX_INTENTOS = getattr(settings, 'EMAIL_OUTBOX_MAX_INTENTOS', 5)
+BACKOFF_BASE_SEGUNDOS = 60
+BACKOFF_MAXIMO_SEGUNDOS = 3600
+
+# Emails que toma el worker en cada lote
+TAMANO_LOTE = 50
+
+# Tiempo que un worker tiene reservado un lote mientras lo envía. Debe
+# alcanzar para enviar el lote completo; si vence antes (worker caído), otro
+# worker vuelve a tomar esos emails.
+LEASE_SEGUNDOS = getattr(settings, 'EMAIL_OUTBOX_LEASE_SEGUNDOS', 300)
+
+# Mensajes por sesión SMTP antes de reconectar (los servidores suelen
+# cortar las sesiones largas)
+MAX_MENSAJES_POR_CONEXION = getattr(settings, 'EMAIL_MAX_MENSAJES_POR_CONEXION', 100)
+
+
+def encolar_email(tipo, destinatario, asunto, mensaje):
     """
-    Envía email de confirmación a un usuario invitado (sin cuenta).
+    Guarda un email en el outbox para que lo envíe el worker.
 
-    Args:
-        reserva: Instancia del modelo Reserva
-        perfil: Instancia del modelo Perfil con token_activacion generado
+    Se llama dentro de la transacción del request: si ésta se revierte, el
+    email no queda encolado.
 
     Returns:
-        bool: True si se envió exitosamente, False en caso contrario
+        EmailPendiente creado, o None si el usuario no tiene email
     """
+    if not destinatario:
+        logger.warning(f"Email '{tipo}' no encolado: destinatario vacío")
+        return None
+    return EmailPendiente.objects.create(
+        tipo=tipo,
+        destinatario=destinatario,
+        asunto=asunto,
+        mensaje=mensaje,
+    )
+
+
+def _cerrar(conexion):
+    """Cierra la conexión sin propagar errores de una sesión ya rota."""
     try:
-        # Construir URLs (en producción usar dominio real)
-        base_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:5173')
-        link_ver_reserva = f"{base_url}/reserva/{perfil.token_activacion}"
-        link_activar_cuenta = f"{base_url}/activar-cuenta/{perfil.token_activacion}"
-
-        # Datos para el template
-        context = {
-            'nombre_completo': perfil.nombre_completo,
-            'reserva_id': reserva.id,
-            'mesa_numero': reserva.mesa.numero,
-            'fecha_reserva': reserva.fecha_reserva.strftime('%d/%m/%Y'),
-            'hora_inicio': reserva.hora_inicio.strftime('%H:%M'),
-            'hora_fin': reserva.hora_fin.strftime('%H:%M'),
-            'num_personas': reserva.num_personas,
-            'notas': reserva.notas if reserva.notas else 'Sin notas adicionales',
-            'link_ver_reserva': link_ver_reserva,
-            'link_activar_cuenta': link_activar_cuenta,
-            'token_valido_hasta': perfil.token_expira.strftime('%d/%m/%Y %H:%M') if perfil.token_expira else 'N/A'
-        }
-
-        # Asunto
-        asunto = f'Confirmación de Reserva - Mesa {reserva.mesa.numero} - {reserva.fecha_reserva.strftime("%d/%m/%Y")}'
-
-        # Mensaje en texto plano (fallback)
-        mensaje_texto = f"""
-¡Hola {perfil.nombre_completo}!
-
-Tu reserva ha sido confirmada exitosamente:
-
-📅 Detalles de tu Reserva:
-- Mesa: {reserva.mesa.numero}
-- Fecha: {reserva.fecha_reserva.strftime('%d/%m/%Y')}
-- Hora: {reserva.hora_inicio.strftime('%H:%M')} - {reserva.hora_fin.strftime('%H:%M')}
-- Personas: {reserva.num_personas}
-- ID de Reserva: {reserva.id}
-
-🔗 Gestionar tu Reserva:
-Puedes ver o cancelar tu reserva usando este link (válido por 48 horas):
-{link_ver_reserva}
-
-✨ ¡Crea tu cuenta!
-Si deseas gestionar tus reservas de forma más cómoda en el futuro, puedes crear tu cuenta aquí:
-{link_activar_cuenta}
-
-Con tu cuenta podrás:
-- Ver todas tus reservas en un solo lugar
-- Modificar o cancelar reservas fácilmente
-- Recibir recordatorios automáticos
-
-¡Te esperamos!
-
-Equipo del Restaurante
-        """.strip()
-
-        # Enviar email
-        send_mail(
-            subject=asunto,
-            message=mensaje_texto,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[perfil.user.email],
-            fail_silently=False,
-        )
-
-        return True
-
+        conexion.close()
     except Exception as e:
-        print(f"Error al enviar email de confirmación: {e}")
-        return False
+        logger.warning(f"Error al cerrar la conexión SMTP: {e}")
 
 
-def enviar_email_confirmacion_usuario_registrado(reserva, perfil):
+def entregar_mensajes(mensajes, max_por_conexion=MAX_MENSAJES_POR_CONEXION):
     """
-    Envía email de confirmación a un usuario registrado (con cuenta).
+    Envía EmailMessage reutilizando una conexión SMTP autenticada
+    (get_connection + send_messages).
+
+    - Abre una nueva sesión cada max_por_conexion mensajes.
+    - Si un mensaje falla, la sesión puede haber quedado inválida: se cierra
+      y el siguiente mensaje se envía por una conexión nueva.
+    - Si no se puede abrir la conexión, el resto de los mensajes se marca con
+      ese error sin reintentar (el servidor no está disponible).
 
     Args:
-        reserva: Instancia del modelo Reserva
-        perfil: Instancia del modelo Perfil
+        mensajes: iterable de EmailMessage (puede ser un generador)
+        max_por_conexion: int - mensajes por sesión SMTP
 
     Returns:
-        bool: True si se envió exitosamente, False en caso contrario
+        list - error de cada mensaje, en el mismo orden (None = enviado)
     """
+    errores = []
+    conexion = None
+    en_conexion = 0
+    error_conexion = None
+
     try:
-        # Construir URL del dashboard
-        base_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:5173')
-        link_dashboard = f"{base_url}/dashboard"
+        for mensaje in mensajes:
+            if error_conexion is not None:
+                errores.append(error_conexion)
+                continue
+
+            if conexion is None or en_conexion >= max_por_conexion:
+                if conexion is not None:
+                    _cerrar(conexion)
+                conexion = get_connection(fail_silently=False)
+                en_conexion = 0
+                try:
+                    conexion.open()
+                except Exception as e:
+                    logger.error(f"No se pudo conectar al servidor de email: {e}")
+                    conexion = None
+                    error_conexion = e
+                    errores.append(e)
+                    continue
+
+            en_conexion += 1
+            try:
+                conexion.send_messages([mensaje])
+                errores.append(None)
+            except Exception as e:
+                errores.append(e)
+                _cerrar(conexion)
+                conexion = None
+    finally:
+        if conexion is not None:
+            _cerrar(conexion)
+
+    return errores
+
+
+def calcular_backoff(intentos):
+    """Espera antes del siguiente intento tras 'intentos' fallos."""
+    return timedelta(seconds=min(BACKOFF_BASE_SEGUNDOS * 2 ** (intentos - 1), BACKOFF_MAXIMO_SEGUNDOS))
+
+
+def reclamar_emails(lote=TAMANO_LOTE):
+    """
+    Toma hasta 'lote' emails vencidos y los marca 'enviando' con un lease de
+    LEASE_SEGUNDOS, en una transacción corta que no espera al servidor SMTP.
 
-        # Asunto
-        asunto = f'Confirmación de Reserva - Mesa {reserva.mesa.numero} - {reserva.fecha_reserva.strftime("%d/%m/%Y")}'
+    Las filas se bloquean con SELECT ... FOR UPDATE SKIP LOCKED (en
+    PostgreSQL) solo mientras se marcan, así varios workers pueden drenar el
+    outbox sin tomar dos veces el mismo email. También se toman los emails
+    'enviando' cuyo lease venció (el worker que los tenía murió).
 
-        # Mensaje en texto plano
-        mensaje_texto = f"""
-¡Hola {perfil.nombre_completo}!
+    Returns:
+        list - EmailPendiente reclamados
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            EmailPendiente.objects.select_for_update(skip_locked=True).filter(
+                estado__in=['pendiente', 'enviando'], proximo_intento__lte=ahora
+            ).order_by('proximo_intento', 'id')[:lote]
+        )
+        if emails:
+            EmailPendiente.objects.filter(pk__in=[email.pk for email in emails]).update(
+                estado='enviando', proximo_intento=ahora + timedelta(seconds=LEASE_SEGUNDOS)
+            )
+    return emails
 
-Tu reserva ha sido confirmada exitosamente:
 
-📅 Detalles de tu Reserva:
-- Mesa: {reserva.mesa.numero}
-- Fecha: {reserva.fecha_reserva.strftime('%d/%m/%Y')}
-- Hora: {reserva.hora_inicio.strftime('%H:%M')} - {reserva.hora_fin.strftime('%H:%M')}
-- Personas: {reserva.num_personas}
-- ID de Reserva: {reserva.id}
+def procesar_emails_pendientes(lote=TAMANO_LOTE):
+    """
+    Envía un lote de emails pendientes cuyo próximo intento ya venció,
+    en una sola sesión SMTP (ver entregar_mensajes).
 
-🔗 Gestionar tu Reserva:
-Puedes ver y gestionar todas tus reservas en tu panel de control:
-{link_dashboard}
+    El lote se reclama primero (reclamar_emails) y se envía fuera de toda
+    transacción: ninguna fila queda bloqueada mientras se habla con el
+    servidor SMTP. Después se registra el resultado de cada email: uno que
+    falla se reprograma con backoff exponencial; tras MAX_INTENTOS queda en
+    estado 'fallido'.
 
-¡Te esperamos!
+    Returns:
+        dict - {'enviados', 'reintentos', 'fallidos'} del lote
+    """
+    resultado = {'enviados': 0, 'reintentos': 0, 'fallidos': 0}
 
-Equipo del Restaurante
-        """.strip()
+    emails = reclamar_emails(lote)
+    if not emails:
+        return resultado
 
-        # Enviar email
-        send_mail(
-            subject=asunto,
-            message=mensaje_texto,
+    errores = entregar_mensajes(
+        EmailMessage(
+            subject=email.asunto,
+            body=email.mensaje,
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[perfil.user.email],
-            fail_silently=False,
+            to=[email.destinatario],
         )
-
-        return True
-
-    except Exception as e:
-        print(f"Error al enviar email de confirmación: {e}")
-        return False
-
-
-def enviar_email_bienvenida_cuenta_activada(perfil):
+        for email in emails
+    )
+
+    ahora = timezone.now()
+    for email, error in zip(emails, errores):
+        if error is None:
+            email.estado = 'enviado'
+            email.enviado_at = ahora
+            email.ultimo_error = ''
+            resultado['enviados'] += 1
+            continue
+
+        email.intentos += 1
+        email.ultimo_error = str(error)[:1000]
+        if email.intentos >= MAX_INTENTOS:
+            email.estado = 'fallido'
+            resultado['fallidos'] += 1
+            logger.error(f"Email {email.id} ({email.tipo}) descartado tras {email.intentos} intentos: {error}")
+        else:
+            email.estado = 'pendiente'
+            email.proximo_intento = ahora + calcular_backoff(email.intentos)
+            resultado['reintentos'] += 1
+            logger.warning(f"Email {email.id} ({email.tipo}) falló, reintento {email.intentos}: {error}")
+
+    EmailPendiente.objects.bulk_update(
+        emails, ['estado', 'intentos', 'proximo_intento', 'ultimo_error', 'enviado_at']
+    )
+
+    return resultado
+
+
+@lru_cache(maxsize=None)
+def _plantilla(nombre):
+    """Template de templates/emails/ compilado una sola vez por proceso."""
+    return get_template(f'emails/{nombre}.txt')
+
+
+@lru_cache(maxsize=8)
+def _fragmentos(base_url):
+    """Partes de los emails que no dependen del destinatario."""
+    return {
+        'firma': _plantilla('_firma').render({}),
+        'beneficios_cuenta': _plantilla('_beneficios_cuenta').render({}),
+        'link_dashboard': f"{base_url}/dashboard",
+        'link_nueva_reserva': f"{base_url}/reserva",
+    }
+
+
+# Asunto de cada tipo de email (str.format sobre el contexto)
+ASUNTOS = {
+    'confirmacion_invitado': 'Confirmación de Reserva - Mesa {mesa_numero} - {fecha_reserva}',
+    'confirmacion_registrado': 'Confirmación de Reserva - Mesa {mesa_numero} - {fecha_reserva}',
+    'bienvenida': '¡Bienvenido! Tu cuenta ha sido activada',
+    'cancelacion': 'Reserva Cancelada - Mesa {mesa_numero} - {fecha_reserva}',
+    'recordatorio': 'Recordatorio de Reserva - Mesa {mesa_numero} - {fecha_reserva} {hora_inicio}',
+}
+
+
+def _contexto(tipo, perfil, reserva, fragmentos):
+    base_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:5173')
+    contexto = {**fragmentos, 'nombre_completo': perfil.nombre_completo}
+
+    if reserva is not None:
+        contexto.update({
+            'reserva_id': reserva.id,
+            'mesa_numero': reserva.mesa.numero,
+            'fecha_reserva': reserva.fecha_reserva.strftime('%d/%m/%Y'),
+            'hora_inicio': reserva.hora_inicio.strftime('%H:%M'),
+            'hora_fin': reserva.hora_fin.strftime('%H:%M'),
+            'num_personas': reserva.num_personas,
+        })
+
+    if tipo == 'confirmacion_invitado':
+        contexto['link_ver_reserva'] = f"{base_url}/reserva/{perfil.token_activacion}"
+        contexto['link_activar_cuenta'] = f"{base_url}/activar-cuenta/{perfil.token_activacion}"
+    elif tipo == 'recordatorio':
+        # Los invitados cancelan con su link único (si sigue vigente); los
+        # registrados desde el panel
+        if perfil.es_invitado and perfil.token_es_valido():
+            contexto['link_reserva'] = f"{base_url}/reserva/{perfil.token_activacion}"
+        else:
+            contexto['link_reserva'] = contexto['link_dashboard']
+    return contexto
+
+
+def componer_email(tipo, perfil, reserva=None):
     """
-    Envía email de bienvenida cuando un invitado activa su cuenta.
+    Renderiza asunto y cuerpo de un email.
 
     Args:
-        perfil: Instancia del modelo Perfil recién activado
+        tipo: str - nombre del template (ver ASUNTOS)
+        perfil: Perfil del destinatario
+        reserva: Reserva (no se usa en 'bienvenida')
 
     Returns:
-        bool: True si se envió exitosamente, False en caso contrario
+        tuple(str, str) - (asunto, mensaje en texto plano)
     """
-    try:
-        # Construir URL del dashboard
-        base_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:5173')
-        link_dashboard = f"{base_url}/dashboard"
-
-        # Asunto
-        asunto = '¡Bienvenido! Tu cuenta ha sido activada'
+    fragmentos = _fragmentos(getattr(settings, 'FRONTEND_URL', 'http://localhost:5173'))
+    contexto = _contexto(tipo, perfil, reserva, fragmentos)
+    return ASUNTOS[tipo].format(**contexto), _plantilla(tipo).render(contexto).strip()
 
-        # Mensaje en texto plano
-        mensaje_texto = f"""
-¡Hola {perfil.nombre_completo}!
 
-¡Bienvenido al sistema de reservas!
-
-Tu cuenta ha sido activada exitosamente. Ahora puedes:
-- Ver todas tus reservas en un solo lugar
-- Modificar o cancelar reservas fácilmente
-- Crear nuevas reservas más rápidamente
-- Recibir notificaciones sobre tus reservas
-
-🔗 Accede a tu panel de control:
-{link_dashboard}
+def renderizar_en_lote(tipo, reservas, chunk_size=500):
+    """
+    Genera los mensajes de una ola de emails sobre muchas reservas.
 
-¡Gracias por unirte a nosotros!
+    Los templates y fragmentos se resuelven una sola vez para toda la ola.
+    Un queryset se recorre con iterator(chunk_size) para no cargarlo
+    completo en memoria; debe traer select_related('cliente__perfil', 'mesa').
 
-Equipo del Restaurante
-        """.strip()
+    Args:
+        tipo: str - tipo de email (ver ASUNTOS)
+        reservas: QuerySet o iterable de Reserva
 
-        # Enviar email
-        send_mail(
-            subject=asunto,
-            message=mensaje_texto,
+    Yields:
+        tuple(Reserva, EmailMessage)
+    """
+    if isinstance(reservas, QuerySet):
+        reservas = reservas.iterator(chunk_size=chunk_size)
+
+    plantilla = _plantilla(tipo)
+    asunto = ASUNTOS[tipo]
+    fragmentos = _fragmentos(getattr(settings, 'FRONTEND_URL', 'http://localhost:5173'))
+
+    for reserva in reservas:
+        contexto = _contexto(tipo, reserva.cliente.perfil, reserva, fragmentos)
+        yield reserva, EmailMessage(
+            subject=asunto.format(**contexto),
+            body=plantilla.render(contexto).strip(),
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[perfil.user.email],
-            fail_silently=False,
+            to=[reserva.cliente.email],
         )
 
-        return True
 
-    except Exception as e:
-        print(f"Error al enviar email de bienvenida: {e}")
-        return False
+def enviar_email_confirmacion_invitado(reserva, perfil):
+    """
+    Encola email de confirmación a un usuario invitado (sin cuenta), con el
+    link único para ver/cancelar la reserva y el de activación de cuenta.
 
+    Args:
+        reserva: Instancia del modelo Reserva
+        perfil: Instancia del modelo Perfil con token_activacion generado
 
-def enviar_email_cancelacion_reserva(reserva, perfil):
+    Returns:
+        EmailPendiente encolado
+    """
+    asunto, mensaje = componer_email('confirmacion_invitado', perfil, reserva)
+    return encolar_email('confirmacion_invitado', perfil.user.email, asunto, mensaje)
+
+
+def enviar_email_confirmacion_usuario_registrado(reserva, perfil):
     """
-    Envía email de confirmación de cancelación de reserva.
+    Encola email de confirmación a un usuario registrado (con cuenta).
 
     Args:
-        reserva: Instancia del modelo Reserva cancelada
+        reserva: Instancia del modelo Reserva
         perfil: Instancia del modelo Perfil
 
     Returns:
-        bool: True si se envió exitosamente, False en caso contrario
+        EmailPendiente encolado
     """
-    try:
-        # Construir URL para nueva reserva
-        base_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:5173')
-        link_nueva_reserva = f"{base_url}/reserva"
-
-        # Asunto
-        asunto = f'Reserva Cancelada - Mesa {reserva.mesa.numero} - {reserva.fecha_reserva.strftime("%d/%m/%Y")}'
-
-        # Mensaje en texto plano
-        mensaje_texto = f"""
-Hola {perfil.nombre_completo},
+    asunto, mensaje = componer_email('confirmacion_registrado', perfil, reserva)
+    return encolar_email('confirmacion_registrado', perfil.user.email, asunto, mensaje)
 
-Tu reserva ha sido cancelada:
 
-📅 Detalles de la Reserva Cancelada:
-- Mesa: {reserva.mesa.numero}
-- Fecha: {reserva.fecha_reserva.strftime('%d/%m/%Y')}
-- Hora: {reserva.hora_inicio.strftime('%H:%M')} - {reserva.hora_fin.strftime('%H:%M')}
-- Personas: {reserva.num_personas}
-- ID de Reserva: {reserva.id}
+def enviar_email_bienvenida_cuenta_activada(perfil):
+    """
+    Encola email de bienvenida cuando un invitado activa su cuenta.
 
-Si deseas hacer una nueva reserva, puedes hacerlo aquí:
-{link_nueva_reserva}
+    Args:
+        perfil: Instancia del modelo Perfil recién activado
 
-¡Esperamos verte pronto!
+    Returns:
+        EmailPendiente encolado
+    """
+    asunto, mensaje = componer_email('bienvenida', perfil)
+    return encolar_email('bienvenida', perfil.user.email, asunto, mensaje)
 
-Equipo del Restaurante
-        """.strip()
 
-        # Enviar email
-        send_mail(
-            subject=asunto,
-            message=mensaje_texto,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[perfil.user.email],
-            fail_silently=False,
-        )
+def enviar_email_cancelacion_reserva(reserva, perfil):
+    """
+    Encola email de confirmación de cancelación de reserva.
 
-        return True
+    Args:
+        reserva: Instancia del modelo Reserva cancelada
+        perfil: Instancia del modelo Perfil
 
-    except Exception as e:
-        print(f"Error al enviar email de cancelación: {e}")
-        return False
+    Returns:
+        EmailPendiente encolado
+    """
+    asunto, mensaje = componer_email('cancelacion', perfil, reserva)
+    return encolar_email('cancelacion', perfil.user.email, asunto, mensaje)
@@ -0,0 +1,98 @@
+"""
+Índices ciegos (blind index) para buscar por RUT y teléfono cifrados.
+
+Perfil.rut y Perfil.telefono se guardan con Fernet, que produce un texto
+cifrado distinto en cada escritura: filter(rut=...) no puede coincidir con
+nada y cualquier búsqueda exige descifrar fila por fila. Junto a cada campo
+se guarda un HMAC-SHA256 con clave del valor normalizado (rut_indice,
+telefono_indice), así que buscar o validar unicidad es una igualdad
+indexada sin descifrar:
+
+    Perfil.objects.filter(rut_indice=indice_rut('12.345.678-5'))
+
+La clave es BLIND_INDEX_KEY (por defecto deriva de SECRET_KEY). Si cambia,
+los índices existentes dejan de coincidir: recalcularlos con
+    python manage.py rellenar_indices_ciegos
+
+Perfil.indices_calculados marca los perfiles cuyos índices ya se calcularon
+(la migración 0017 los calcula para los perfiles existentes).
+"""
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+
+
+def _clave():
+    # Se lee en cada llamada para respetar override_settings en los tests
+    clave = getattr(settings, 'BLIND_INDEX_KEY', None) or f'indice-ciego:{settings.SECRET_KEY}'
+    return clave.encode()
+
+
+def normalizar_rut(rut):
+    """'12.345.678-k' -> '12345678K' (sin puntos, guión ni espacios)."""
+    return re.sub(r'[\s.\-]', '', rut or '').upper()
+
+
+def normalizar_telefono(telefono):
+    """'+56 9 1234 5678' / '912345678' -> '56912345678' (solo dígitos, con código de país)."""
+    digitos = re.sub(r'\D', '', telefono or '')
+    if len(digitos) == 9:
+        digitos = f'56{digitos}'
+    return digitos
+
+
+def _indice(tipo, valor):
+    if not valor:
+        return None
+    # El tipo separa los dominios: un RUT y un teléfono iguales no colisionan
+    return hmac.new(_clave(), f'{tipo}:{valor}'.encode(), hashlib.sha256).hexdigest()
+
+
+def indice_rut(rut):
+    """Índice ciego de un RUT (None si está vacío)."""
+    return _indice('rut', normalizar_rut(rut))
+
+
+def indice_telefono(telefono):
+    """Índice ciego de un teléfono (None si está vacío)."""
+    return _indice('telefono', normalizar_telefono(telefono))
+
+
+def rellenar_indices(solo_faltantes=False, tamano_bloque=500):
+    """
+    Recalcula rut_indice y telefono_indice de los perfiles existentes
+    (descifrando cada fila una vez) y retorna cuántos cambiaron.
+
+    solo_faltantes=True procesa solo perfiles sin indices_calculados (creados
+    sin pasar por Perfil.save()); tras un cambio de BLIND_INDEX_KEY hay que
+    recalcular todos.
+    """
+    from .models import Perfil
+
+    perfiles = Perfil.objects.only(
+        'id', 'rut', 'telefono', 'rut_indice', 'telefono_indice', 'indices_calculados'
+    ).order_by('id')
+    if solo_faltantes:
+        perfiles = perfiles.filter(indices_calculados=False)
+
+    cambiados = []
+    total = 0
+    for perfil in perfiles.iterator(chunk_size=tamano_bloque):
+        indices = (indice_rut(perfil.rut), indice_telefono(perfil.telefono))
+        if indices != (perfil.rut_indice, perfil.telefono_indice) or not perfil.indices_calculados:
+            perfil.rut_indice, perfil.telefono_indice = indices
+            perfil.indices_calculados = True
+            cambiados.append(perfil)
+        if len(cambiados) >= tamano_bloque:
+            total += _guardar_indices(cambiados)
+            cambiados = []
+    return total + _guardar_indices(cambiados)
+
+
+def _guardar_indices(perfiles):
+    # bulk_update no pasa por Perfil.save(): solo escribe los índices
+    from .models import Perfil
+    Perfil.objects.bulk_update(perfiles, ['rut_indice', 'telefono_indice', 'indices_calculados'])
+    return len(perfiles)
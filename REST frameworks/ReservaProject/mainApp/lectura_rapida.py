@@ -0,0 +1,188 @@
+"""
+Listados de solo lectura construidos desde .values(), sin ModelSerializer.
+
+En los listados la CPU se va en instanciar modelos y en el to_representation
+de cada campo de cada fila. Un ListadoRapido describe, para un serializer
+existente, de qué columna de .values() sale cada campo y cómo se convierte
+(fechas a ISO 8601, choices a su texto con un dict precalculado), y arma
+las filas como diccionarios con las mismas claves, en el mismo orden y con
+los mismos valores que el serializer.
+
+ListadoRapidoMixin usa ese camino en la acción list del ViewSet cuando el
+serializer de la acción tiene un ListadoRapido registrado y cubre todos los
+campos pedidos; si no (p. ej. ?fields=mesa_info), usa el serializer.
+"""
+from rest_framework.response import Response
+
+from .cifrado import CAMPOS_CIFRADOS, PREFIJO_ANOTACION, _descifrar
+from .models import BloqueoMesa, Mesa, Reserva
+from .serializers import (
+    BloqueoMesaListSerializer,
+    MesaSerializer,
+    ReservaResumenSerializer,
+    ReservaSerializer,
+    campos_solicitados,
+)
+
+
+def _iso(valor):
+    # date/time -> ISO 8601, igual que DateField/TimeField de DRF
+    return None if valor is None else valor.isoformat()
+
+
+def _texto_choice(choices):
+    textos = {valor: str(texto) for valor, texto in choices}
+    return lambda valor: textos.get(valor, valor)
+
+
+class ListadoRapido:
+    """
+    columnas: {campo del serializer: (columna de .values(), conversión o None)}.
+    Los campos encriptados del cliente se declaran con la columna CIFRADO: se
+    leen de la anotación de cifrado.anotar_cifrados (None si no está, es
+    decir, si el rol no puede verlos) y se descifran una vez por valor.
+    """
+    CIFRADO = object()
+
+    def __init__(self, serializer_class, columnas):
+        self.serializer_class = serializer_class
+        self.columnas = columnas
+        self._orden = None
+
+    @property
+    def orden(self):
+        # Orden de las claves: el de los campos del serializer
+        if self._orden is None:
+            self._orden = list(self.serializer_class().fields)
+        return self._orden
+
+    def campos(self, solicitados=None):
+        """Campos de la salida, o None si alguno no tiene columna."""
+        campos = [c for c in self.orden if solicitados is None or c in solicitados]
+        if not all(c in self.columnas for c in campos):
+            return None
+        return campos
+
+    def valores(self, queryset, campos, adicionales=()):
+        """
+        .values() con las columnas de 'campos' más las 'adicionales' (p. ej.
+        las que lee el paginador por cursor), que filas() no incluye en la salida.
+        """
+        anotaciones = queryset.query.annotations
+        rutas = list(adicionales)
+        for campo in campos:
+            columna, _ = self.columnas[campo]
+            if columna is self.CIFRADO:
+                columna = self._anotacion(campo)
+                if columna not in anotaciones:
+                    continue
+            if columna not in rutas:
+                rutas.append(columna)
+        return queryset.values(*rutas)
+
+    @staticmethod
+    def _anotacion(campo):
+        # 'cliente_rut' -> 'cifrado_rut'
+        return PREFIJO_ANOTACION + next(c for c in CAMPOS_CIFRADOS if campo.endswith(c))
+
+    def filas(self, valores, campos):
+        descifrados = {}
+        conversiones = []
+        for campo in campos:
+            columna, conversion = self.columnas[campo]
+            if columna is self.CIFRADO:
+                anotacion = self._anotacion(campo)
+                campo_modelo = anotacion[len(PREFIJO_ANOTACION):]
+                conversiones.append((campo, anotacion, self._descifrador(campo_modelo, descifrados)))
+            else:
+                conversiones.append((campo, columna, conversion))
+
+        filas = []
+        for fila in valores:
+            filas.append({
+                campo: (conversion(fila[columna]) if conversion else fila[columna])
+                if columna in fila else None
+                for campo, columna, conversion in conversiones
+            })
+        return filas
+
+    @staticmethod
+    def _descifrador(campo, descifrados):
+        def descifrar(valor):
+            # Cada texto cifrado distinto se descifra una sola vez por página
+            if (campo, valor) not in descifrados:
+                descifrados[(campo, valor)] = _descifrar(campo, valor)
+            return descifrados[(campo, valor)]
+        return descifrar
+
+
+CIFRADO = ListadoRapido.CIFRADO
+
+MESAS = ListadoRapido(MesaSerializer, {
+    'id': ('id', None),
+    'numero': ('numero', None),
+    'capacidad': ('capacidad', None),
+    'estado': ('estado', None),
+})
+
+_COLUMNAS_RESERVA = {
+    'id': ('id', None),
+    'cliente': ('cliente', None),
+    'cliente_username': ('cliente__username', None),
+    'cliente_nombre': ('cliente__perfil__nombre_completo', None),
+    'cliente_telefono': (CIFRADO, None),
+    'cliente_email': ('cliente__email', None),
+    'cliente_rut': (CIFRADO, None),
+    'mesa': ('mesa', None),
+    'mesa_numero': ('mesa__numero', None),
+    'fecha_reserva': ('fecha_reserva', _iso),
+    'hora_inicio': ('hora_inicio', _iso),
+    'hora_fin': ('hora_fin', _iso),
+    'num_personas': ('num_personas', None),
+    'estado': ('estado', None),
+    'estado_display': ('estado', _texto_choice(Reserva.ESTADO_CHOICES)),
+    'notas': ('notas', None),
+}
+
+RESERVAS = ListadoRapido(ReservaResumenSerializer, _COLUMNAS_RESERVA)
+# ReservaSerializer completo: solo con ?fields= que no incluya mesa_info ni fechas de auditoría
+RESERVAS_CAMPOS = ListadoRapido(ReservaSerializer, _COLUMNAS_RESERVA)
+
+BLOQUEOS = ListadoRapido(BloqueoMesaListSerializer, {
+    'id': ('id', None),
+    'mesa_numero': ('mesa__numero', None),
+    'fecha_inicio': ('fecha_inicio', _iso),
+    'fecha_fin': ('fecha_fin', _iso),
+    'hora_inicio': ('hora_inicio', _iso),
+    'hora_fin': ('hora_fin', _iso),
+    'motivo': ('motivo', None),
+    'categoria_display': ('categoria', _texto_choice(BloqueoMesa.CATEGORIA_CHOICES)),
+    'activo': ('activo', None),
+})
+
+LISTADOS = {
+    listado.serializer_class: listado
+    for listado in (MESAS, RESERVAS, RESERVAS_CAMPOS, BLOQUEOS)
+}
+
+
+class ListadoRapidoMixin:
+    """
+    Acción list desde .values() cuando el serializer de la acción tiene un
+    ListadoRapido (ver LISTADOS). Mismos filtros, orden y paginación.
+    """
+
+    def list(self, request, *args, **kwargs):
+        listado = LISTADOS.get(self.get_serializer_class())
+        campos = listado.campos(campos_solicitados(request)) if listado else None
+        if campos is None:
+            return super().list(request, *args, **kwargs)
+
+        # El cursor se arma con las columnas del ordenamiento aunque no se pidan en ?fields=
+        columnas_de_cursor = getattr(self.paginator, 'columnas_de_cursor', None)
+        adicionales = columnas_de_cursor() if columnas_de_cursor else ()
+        queryset = listado.valores(self.filter_queryset(self.get_queryset()), campos, adicionales)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(listado.filas(page, campos))
+        return Response(listado.filas(queryset, campos))
@@ -0,0 +1,37 @@
+"""
+Management command que envía los recordatorios de reservas próximas.
+Uso: python manage.py enviar_recordatorios [--horas 24]
+
+El worker `procesar_emails --continuo` ya lo ejecuta cada 15 minutos; este
+comando sirve para correrlo a mano o desde cron si no hay worker. Las
+reservas ya recordadas no se vuelven a enviar.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from mainApp.recordatorios import VENTANA_HORAS, enviar_recordatorios
+
+
+class Command(BaseCommand):
+    help = 'Envía recordatorios por email de las reservas que comienzan en las próximas horas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas',
+            type=float,
+            default=VENTANA_HORAS,
+            help=f'Anticipación del recordatorio en horas (default: {VENTANA_HORAS})'
+        )
+
+    def handle(self, *args, **options):
+        if options['horas'] <= 0:
+            raise CommandError('--horas debe ser mayor que 0')
+
+        self.stdout.write(self.style.WARNING(
+            f"Enviando recordatorios de las próximas {options['horas']:g} horas..."
+        ))
+        resultado = enviar_recordatorios(horas=options['horas'])
+
+        if resultado['fallidos']:
+            self.stdout.write(self.style.ERROR(
+                f"  {resultado['fallidos']} recordatorios fallaron (se reintentan en la próxima ejecución)"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"✅ Recordatorios enviados: {resultado['enviados']}"))
@@ -0,0 +1,20 @@
+"""
+Management command que extiende las ocurrencias de los bloqueos recurrentes.
+Uso: python manage.py extender_ocurrencias
+
+Programarlo una vez al día: el horizonte (hoy + BLOQUEOS_HORIZONTE_DIAS)
+avanza con la fecha y las consultas de disponibilidad no expanden bloqueos.
+"""
+from django.core.management.base import BaseCommand
+from mainApp.recurrencia import HORIZONTE_MAXIMO_DIAS, extender_ocurrencias
+
+
+class Command(BaseCommand):
+    help = 'Materializa las ocurrencias de los bloqueos activos hasta el horizonte de hoy'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING(
+            f'Extendiendo ocurrencias de bloqueos hasta hoy + {HORIZONTE_MAXIMO_DIAS} días...'
+        ))
+        extendidos = extender_ocurrencias()
+        self.stdout.write(self.style.SUCCESS(f'✅ Bloqueos extendidos: {extendidos}'))
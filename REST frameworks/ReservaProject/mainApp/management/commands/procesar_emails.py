@@ -0,0 +1,87 @@
+"""
+Management command que drena el outbox de emails (EmailPendiente).
+Uso: python manage.py procesar_emails [--lote 50] [--continuo] [--intervalo 10]
+                                      [--recordatorios-cada 15]
+
+Sin --continuo envía todo lo que esté vencido y termina (apto para cron);
+con --continuo queda como worker, esperando --intervalo segundos cuando
+no hay emails pendientes, y además envía los recordatorios de reservas
+próximas (enviar_recordatorios) cada --recordatorios-cada minutos.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from mainApp.email_service import TAMANO_LOTE, procesar_emails_pendientes
+from mainApp.recordatorios import enviar_recordatorios
+
+
+class Command(BaseCommand):
+    help = 'Envía los emails pendientes del outbox por lotes, con reintentos y backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Emails por conexión SMTP (default: {TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Quedar corriendo como worker en vez de terminar al vaciar el outbox'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=10,
+            help='Segundos de espera cuando no hay emails pendientes (con --continuo)'
+        )
+        parser.add_argument(
+            '--recordatorios-cada',
+            type=float,
+            default=15,
+            help='Minutos entre envíos de recordatorios, con --continuo (0 = no enviarlos)'
+        )
+
+    def _enviar_recordatorios(self):
+        # Un error aquí no debe detener el envío del outbox
+        try:
+            resultado = enviar_recordatorios()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"  Error al enviar recordatorios: {e}"))
+            return
+        if any(resultado.values()):
+            self.stdout.write(
+                f"  Recordatorios: {resultado['enviados']} enviados, {resultado['fallidos']} fallidos"
+            )
+
+    def handle(self, *args, **options):
+        totales = {'enviados': 0, 'reintentos': 0, 'fallidos': 0}
+        recordatorios_cada = options['recordatorios_cada'] * 60 if options['continuo'] else 0
+        proximos_recordatorios = time.monotonic()
+
+        while True:
+            if recordatorios_cada and time.monotonic() >= proximos_recordatorios:
+                self._enviar_recordatorios()
+                proximos_recordatorios = time.monotonic() + recordatorios_cada
+
+            resultado = procesar_emails_pendientes(lote=options['lote'])
+            for clave, valor in resultado.items():
+                totales[clave] += valor
+
+            if any(resultado.values()):
+                self.stdout.write(
+                    f"  Lote: {resultado['enviados']} enviados, "
+                    f"{resultado['reintentos']} reprogramados, {resultado['fallidos']} fallidos"
+                )
+
+            # Lote incompleto o sin envíos exitosos: lo que queda aún no vence
+            if sum(resultado.values()) < options['lote'] or not resultado['enviados']:
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Emails enviados: {totales['enviados']} - "
+            f"reprogramados: {totales['reintentos']} - fallidos: {totales['fallidos']}"
+        ))
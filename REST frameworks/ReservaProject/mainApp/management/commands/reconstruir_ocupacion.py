@@ -0,0 +1,37 @@
+"""
+Management command para reconstruir y verificar la tabla OcupacionSlot.
+Uso: python manage.py reconstruir_ocupacion [--solo-verificar]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from mainApp.disponibilidad import reconstruir_ocupacion, verificar_ocupacion
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la ocupación por franja (OcupacionSlot) y verifica que coincida con las reservas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-verificar',
+            action='store_true',
+            help='Solo verificar la tabla actual, sin reconstruirla'
+        )
+
+    def handle(self, *args, **options):
+        if not options['solo_verificar']:
+            self.stdout.write(self.style.WARNING('Reconstruyendo ocupación por franja...'))
+            total = reconstruir_ocupacion()
+            self.stdout.write(f'  Filas creadas: {total}')
+
+        self.stdout.write(self.style.WARNING('Verificando ocupación por franja...'))
+        faltantes, sobrantes = verificar_ocupacion()
+
+        if faltantes or sobrantes:
+            for reserva_id, mesa_id, fecha, slot in sorted(faltantes)[:10]:
+                self.stdout.write(f'  Falta: Reserva {reserva_id} - Mesa {mesa_id} - {fecha} {slot}')
+            for reserva_id, mesa_id, fecha, slot in sorted(sobrantes)[:10]:
+                self.stdout.write(f'  Sobra: Reserva {reserva_id} - Mesa {mesa_id} - {fecha} {slot}')
+            raise CommandError(
+                f'Ocupación inconsistente: {len(faltantes)} filas faltantes, {len(sobrantes)} sobrantes'
+            )
+
+        self.stdout.write(self.style.SUCCESS('✅ Ocupación por franja consistente con las reservas'))
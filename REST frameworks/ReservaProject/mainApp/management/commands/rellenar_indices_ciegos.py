@@ -0,0 +1,38 @@
+"""
+Management command que calcula los índices ciegos de RUT y teléfono.
+Uso: python manage.py rellenar_indices_ciegos [--solo-faltantes] [--lote 500]
+
+La migración 0017 ya calcula los índices de los perfiles existentes.
+--solo-faltantes completa los perfiles creados sin pasar por Perfil.save()
+(se ejecuta en cada despliegue); sin esa opción recalcula todos, necesario
+después de cambiar BLIND_INDEX_KEY.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from mainApp.indice_ciego import rellenar_indices
+
+
+class Command(BaseCommand):
+    help = 'Calcula rut_indice y telefono_indice de los perfiles descifrando RUT y teléfono'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-faltantes',
+            action='store_true',
+            help='Procesar solo perfiles cuyos índices no se calcularon'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Perfiles leídos y actualizados por bloque (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        self.stdout.write(self.style.WARNING('Calculando índices ciegos de RUT y teléfono...'))
+        total = rellenar_indices(
+            solo_faltantes=options['solo_faltantes'], tamano_bloque=options['lote']
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ Perfiles actualizados: {total}'))
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:55
+
+from datetime import date, datetime, time, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Reglas de mainApp.disponibilidad al momento de esta migración, copiadas
+# para que los cambios posteriores en ese módulo no cambien lo que hace
+ESTADOS_OCUPAN_MESA = ('pendiente', 'activa')
+DURACION_RESERVA = timedelta(hours=2)
+HORARIOS = [time(hora, minuto) for hora in range(12, 22) for minuto in (0, 30)]
+
+
+def franjas_de_reserva(hora_inicio, hora_fin):
+    """Horas de inicio de las franjas que solapan con [hora_inicio, hora_fin)."""
+    return [
+        hora for hora in HORARIOS
+        if hora < hora_fin and (datetime.combine(date.min, hora) + DURACION_RESERVA).time() > hora_inicio
+    ]
+
+
+def poblar_ocupacion(apps, schema_editor):
+    """Cargar la ocupación de las reservas pendientes/activas existentes."""
+    Reserva = apps.get_model('mainApp', 'Reserva')
+    OcupacionSlot = apps.get_model('mainApp', 'OcupacionSlot')
+
+    reservas = Reserva.objects.filter(
+        deleted_at__isnull=True,
+        estado__in=ESTADOS_OCUPAN_MESA,
+    ).values_list('id', 'mesa_id', 'fecha_reserva', 'hora_inicio', 'hora_fin')
+
+    OcupacionSlot.objects.bulk_create([
+        OcupacionSlot(reserva_id=reserva_id, mesa_id=mesa_id, fecha=fecha, slot=slot)
+        for reserva_id, mesa_id, fecha, hora_inicio, hora_fin in reservas.iterator()
+        for slot in franjas_de_reserva(hora_inicio, hora_fin)
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0008_alter_reserva_estado_bloqueomesa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('slot', models.TimeField(help_text='Hora de inicio de la franja ocupada')),
+                ('mesa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion', to='mainApp.mesa')),
+                ('reserva', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion', to='mainApp.reserva')),
+            ],
+            options={
+                'verbose_name': 'Ocupación por franja',
+                'verbose_name_plural': 'Ocupación por franjas',
+                'indexes': [models.Index(fields=['fecha', 'slot', 'mesa'], name='idx_ocupacion_fecha_slot'), models.Index(fields=['mesa', 'fecha', 'slot'], name='idx_ocupacion_mesa_fecha')],
+                'constraints': [models.UniqueConstraint(fields=('reserva', 'slot'), name='ocupacion_unica_por_reserva')],
+            },
+        ),
+        migrations.RunPython(poblar_ocupacion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-17 16:10
+
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+
+
+CONSTRAINT = 'reserva_sin_solapamiento'
+
+
+def crear_constraint(apps, schema_editor):
+    """
+    Impide en PostgreSQL dos reservas pendientes/activas de la misma mesa con
+    horarios solapados. En SQLite no se crea: Reserva.clean() hace la validación.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    tabla = schema_editor.quote_name(apps.get_model('mainApp', 'Reserva')._meta.db_table)
+    schema_editor.execute(
+        f"ALTER TABLE {tabla} ADD CONSTRAINT {CONSTRAINT} EXCLUDE USING gist ("
+        f"mesa_id WITH =, "
+        f"fecha_reserva WITH =, "
+        f"tsrange(fecha_reserva + hora_inicio, fecha_reserva + hora_fin, '[)') WITH &&"
+        f") WHERE (estado IN ('pendiente', 'activa') AND deleted_at IS NULL)"
+    )
+
+
+def eliminar_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    tabla = schema_editor.quote_name(apps.get_model('mainApp', 'Reserva')._meta.db_table)
+    schema_editor.execute(f"ALTER TABLE {tabla} DROP CONSTRAINT IF EXISTS {CONSTRAINT}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0009_ocupacionslot'),
+    ]
+
+    operations = [
+        # btree_gist permite combinar igualdad (mesa, fecha) con rangos en GiST
+        BtreeGistExtension(),
+        migrations.RunPython(crear_constraint, eliminar_constraint),
+    ]
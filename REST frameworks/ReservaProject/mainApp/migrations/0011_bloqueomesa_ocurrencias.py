@@ -0,0 +1,117 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:27
+
+import calendar
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Copia de mainApp.recurrencia al momento de esta migración: los cambios
+# posteriores en ese módulo no deben cambiar lo que hace
+HORIZONTE_MAXIMO_DIAS = getattr(settings, 'BLOQUEOS_HORIZONTE_DIAS', 365)
+PERIODO_DIAS = {'diaria': 1, 'semanal': 7}
+
+
+def sumar_meses(fecha, meses):
+    total = fecha.month - 1 + meses
+    anio, mes = fecha.year + total // 12, total % 12 + 1
+    return fecha.replace(year=anio, month=mes, day=min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+
+def fechas_del_bloqueo(bloqueo, hasta):
+    """Fechas entre fecha_inicio y hasta (inclusive) en que aplica el bloqueo."""
+    duracion = (bloqueo.fecha_fin - bloqueo.fecha_inicio).days
+    if bloqueo.tipo_recurrencia == 'ninguna':
+        return [bloqueo.fecha_inicio + timedelta(days=n) for n in range(duracion + 1)]
+
+    fechas = set()
+    n = 0
+    inicio = bloqueo.fecha_inicio
+    while inicio <= hasta:
+        fechas.update(
+            inicio + timedelta(days=d) for d in range(duracion + 1)
+            if inicio + timedelta(days=d) <= hasta
+        )
+        n += 1
+        if bloqueo.tipo_recurrencia == 'mensual':
+            inicio = sumar_meses(bloqueo.fecha_inicio, n)
+        else:
+            inicio = bloqueo.fecha_inicio + timedelta(days=n * PERIODO_DIAS[bloqueo.tipo_recurrencia])
+    return sorted(fechas)
+
+
+def materializar_ocurrencias(apps, schema_editor):
+    """
+    Materializa las ocurrencias de los bloqueos activos existentes, como lo
+    hace BloqueoMesa.save(): sin ellas las consultas de disponibilidad no
+    verían los bloqueos creados antes de esta migración.
+    """
+    BloqueoMesa = apps.get_model('mainApp', 'BloqueoMesa')
+    OcurrenciaBloqueo = apps.get_model('mainApp', 'OcurrenciaBloqueo')
+    horizonte = timezone.now().date() + timedelta(days=HORIZONTE_MAXIMO_DIAS)
+
+    for bloqueo in BloqueoMesa.objects.filter(activo=True):
+        hasta = bloqueo.fecha_fin if bloqueo.tipo_recurrencia == 'ninguna' else horizonte
+        OcurrenciaBloqueo.objects.bulk_create([
+            OcurrenciaBloqueo(
+                bloqueo_id=bloqueo.pk, mesa_id=bloqueo.mesa_id, fecha=fecha,
+                hora_inicio=bloqueo.hora_inicio, hora_fin=bloqueo.hora_fin,
+            )
+            for fecha in fechas_del_bloqueo(bloqueo, hasta)
+        ], batch_size=2000)
+        BloqueoMesa.objects.filter(pk=bloqueo.pk).update(ocurrencias_hasta=hasta)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0010_reserva_sin_solapamiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcurrenciaBloqueo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora_inicio', models.TimeField(blank=True, help_text='Vacío = día completo', null=True)),
+                ('hora_fin', models.TimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Ocurrencia de bloqueo',
+                'verbose_name_plural': 'Ocurrencias de bloqueos',
+            },
+        ),
+        migrations.AddField(
+            model_name='bloqueomesa',
+            name='ocurrencias_hasta',
+            field=models.DateField(blank=True, editable=False, help_text='Fecha hasta la que están materializadas las ocurrencias (vacío = pendiente)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bloqueomesa',
+            index=models.Index(fields=['activo', 'ocurrencias_hasta'], name='idx_bloqueo_ocurrencias'),
+        ),
+        migrations.AddField(
+            model_name='ocurrenciabloqueo',
+            name='bloqueo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocurrencias', to='mainApp.bloqueomesa'),
+        ),
+        migrations.AddField(
+            model_name='ocurrenciabloqueo',
+            name='mesa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocurrencias_bloqueo', to='mainApp.mesa'),
+        ),
+        migrations.AddIndex(
+            model_name='ocurrenciabloqueo',
+            index=models.Index(fields=['fecha', 'mesa'], name='idx_ocurrencia_fecha_mesa'),
+        ),
+        migrations.AddConstraint(
+            model_name='ocurrenciabloqueo',
+            constraint=models.UniqueConstraint(fields=('bloqueo', 'fecha'), name='ocurrencia_unica_por_dia'),
+        ),
+        migrations.RunPython(materializar_ocurrencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0011_bloqueomesa_ocurrencias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('confirmacion_invitado', 'Confirmación de reserva (invitado)'), ('confirmacion_registrado', 'Confirmación de reserva (usuario registrado)'), ('bienvenida', 'Bienvenida por cuenta activada'), ('cancelacion', 'Cancelación de reserva')], max_length=30)),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('asunto', models.CharField(max_length=255)),
+                ('mensaje', models.TextField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, help_text='No se envía antes de esta fecha')),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('enviado_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Email pendiente',
+                'verbose_name_plural': 'Emails pendientes',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='idx_email_pendiente_cola')],
+            },
+        ),
+    ]
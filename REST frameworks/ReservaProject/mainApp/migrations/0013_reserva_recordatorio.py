@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0012_emailpendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='recordatorio_enviado_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:57
+
+import re
+import unicodedata
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+INDICE = 'idx_perfil_busqueda_trgm'
+
+
+# Copia de mainApp.busqueda al momento de esta migración: los cambios
+# posteriores en ese módulo no deben cambiar lo que hace
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', texto.lower()).strip()
+
+
+def documento_busqueda(user, perfil):
+    partes = [user.username, user.first_name, user.last_name, user.email,
+              perfil.nombre_completo, perfil.email]
+    return ' '.join(dict.fromkeys(p for p in map(normalizar, partes) if p))
+
+
+def calcular_busqueda(apps, schema_editor):
+    """Rellena el documento de búsqueda de los perfiles existentes."""
+    Perfil = apps.get_model('mainApp', 'Perfil')
+    perfiles = list(Perfil.objects.select_related('user'))
+    for perfil in perfiles:
+        perfil.busqueda = documento_busqueda(perfil.user, perfil)
+    Perfil.objects.bulk_update(perfiles, ['busqueda'], batch_size=500)
+
+
+def crear_indice(apps, schema_editor):
+    """
+    Índice GIN de trigramas para LIKE '%termino%' en PostgreSQL. En SQLite no
+    se crea: la búsqueda usa la columna normalizada sin índice.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    tabla = schema_editor.quote_name(apps.get_model('mainApp', 'Perfil')._meta.db_table)
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDICE} ON {tabla} USING gin (busqueda gin_trgm_ops)"
+    )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDICE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0013_reserva_recordatorio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfil',
+            name='busqueda',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Username, nombre, apellido, email y nombre completo normalizados'),
+        ),
+        migrations.RunPython(calcular_busqueda, migrations.RunPython.noop),
+        # pg_trgm provee el operador de clase gin_trgm_ops
+        TrigramExtension(),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
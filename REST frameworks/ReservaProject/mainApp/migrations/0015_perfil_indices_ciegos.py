@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0014_perfil_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfil',
+            name='rut_indice',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='perfil',
+            name='telefono_indice',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+    ]
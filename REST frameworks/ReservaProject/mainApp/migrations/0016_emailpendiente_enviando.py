@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0015_perfil_indices_ciegos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailpendiente',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10),
+        ),
+    ]
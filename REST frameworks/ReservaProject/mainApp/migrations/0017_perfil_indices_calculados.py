@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:12
+
+import hashlib
+import hmac
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copia de mainApp.indice_ciego al momento de esta migración: los cambios
+# posteriores en ese módulo no deben cambiar lo que hace
+def _indice(tipo, valor):
+    if not valor:
+        return None
+    clave = getattr(settings, 'BLIND_INDEX_KEY', None) or f'indice-ciego:{settings.SECRET_KEY}'
+    return hmac.new(clave.encode(), f'{tipo}:{valor}'.encode(), hashlib.sha256).hexdigest()
+
+
+def indice_rut(rut):
+    return _indice('rut', re.sub(r'[\s.\-]', '', rut or '').upper())
+
+
+def indice_telefono(telefono):
+    digitos = re.sub(r'\D', '', telefono or '')
+    if len(digitos) == 9:
+        digitos = f'56{digitos}'
+    return _indice('telefono', digitos)
+
+
+def calcular_indices(apps, schema_editor):
+    """
+    Calcula los índices ciegos de los perfiles existentes (la migración 0015
+    solo agregó las columnas), descifrando RUT y teléfono una vez por fila.
+    """
+    Perfil = apps.get_model('mainApp', 'Perfil')
+    perfiles = []
+    for perfil in Perfil.objects.only('id', 'rut', 'telefono').iterator(chunk_size=500):
+        perfil.rut_indice = indice_rut(perfil.rut)
+        perfil.telefono_indice = indice_telefono(perfil.telefono)
+        perfil.indices_calculados = True
+        perfiles.append(perfil)
+    Perfil.objects.bulk_update(
+        perfiles, ['rut_indice', 'telefono_indice', 'indices_calculados'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainApp', '0016_emailpendiente_enviando'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfil',
+            name='indices_calculados',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(calcular_indices, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -22,7 +22,56 @@ class SoftDeleteManager(models.Manager):
         return super().get_queryset().filter(deleted_at__isnull=False)
 
 
-class Perfil(models.Model):
+# Exclusion constraint de PostgreSQL que impide reservas solapadas en la misma
+# mesa (ver migración 0010). En otros motores se valida en Reserva.clean().
+RESERVA_SIN_SOLAPAMIENTO = 'reserva_sin_solapamiento'
+
+
+def solapamiento_validado_por_bd(using=None):
+    """True si la base de datos aplica la exclusion constraint de solapamiento."""
+    alias = using or router.db_for_write(Reserva)
+    return connections[alias].vendor == 'postgresql'
+
+
+class CamposModificadosMixin:
+    """
+    Recuerda los valores con que se cargó la instancia para que save() sepa
+    qué campos cambiaron (campos_modificados) y escriba solo esos. Los
+    valores se toman al instanciar (post_init en signals.py), al guardar y
+    al recargar campos. Se leen desde __dict__ para no cargar campos diferidos.
+    """
+
+    def _recordar_valores(self, campos=None):
+        if campos is None:
+            self._valores_originales = {}
+            campos = [f.attname for f in self._meta.concrete_fields]
+        elif not hasattr(self, '_valores_originales'):
+            self._valores_originales = {}
+        for campo in campos:
+            campo = self._meta.get_field(campo).attname
+            if campo in self.__dict__:
+                self._valores_originales[campo] = self.__dict__[campo]
+
+    def valor_original(self, campo):
+        """Valor del campo (attname) en la base de datos, según lo recordado."""
+        return getattr(self, '_valores_originales', {}).get(campo)
+
+    def campos_modificados(self):
+        """Campos (attname) cuyo valor cambió desde que se cargó o guardó la instancia."""
+        originales = getattr(self, '_valores_originales', {})
+        return {
+            f.attname for f in self._meta.concrete_fields
+            if f.attname in self.__dict__
+            and (f.attname not in originales or self.__dict__[f.attname] != originales[f.attname])
+        }
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # Incluye la carga de un campo diferido: no cuenta como modificación
+        self._recordar_valores(fields)
+
+
+class Perfil(CamposModificadosMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     ROL_CHOICES = (
         ('admin', 'Administrador'),
@@ -36,6 +85,14 @@ class Perfil(models.Model):
     # FIX #17 (MODERADO): RUT debe ser único
     rut = EncryptedCharField(max_length=12, blank=True, null=True, unique=True, help_text="RUT del usuario (encriptado)")
     telefono = EncryptedCharField(max_length=15, blank=True, help_text="Teléfono del usuario (encriptado)")
+    # Índices ciegos (HMAC) de los campos encriptados, para buscar y validar
+    # unicidad con una igualdad indexada (ver indice_ciego.py)
+    rut_indice = models.CharField(max_length=64, blank=True, null=True, db_index=True, editable=False)
+    telefono_indice = models.CharField(max_length=64, blank=True, null=True, db_index=True, editable=False)
+    # False si los índices aún no se calcularon (perfiles creados sin pasar
+    # por save()). Un índice vacío no basta para saberlo: RUT y teléfono
+    # vacíos también lo dejan en NULL
+    indices_calculados = models.BooleanField(default=False, editable=False)
     # FIX #18 (MODERADO): Email debe ser único
     email = models.EmailField(blank=True, null=True, unique=True)
 
@@ -61,16 +118,70 @@ class Perfil(models.Model):
         help_text="Indica si el token de activación ya fue usado para crear cuenta"
     )
 
+    # Documento de búsqueda desnormalizado (ver busqueda.py). En PostgreSQL
+    # tiene un índice GIN de trigramas (migración 0014)
+    busqueda = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Username, nombre, apellido, email y nombre completo normalizados"
+    )
+
     def __str__(self):
         return f"{self.user.username} - {self.get_rol_display()}"
 
-    def generar_token_activacion(self):
-        """Genera un token único de activación válido por 48 horas"""
+    # Campos derivados que save() recalcula a partir de otros
+    CAMPOS_DERIVADOS = ('busqueda', 'rut_indice', 'telefono_indice')
+
+    def save(self, *args, **kwargs):
+        """
+        Un perfil ya guardado solo escribe las columnas que cambiaron (y nada
+        si no cambió ninguna): RUT y teléfono se vuelven a encriptar solo si
+        se modificaron. Con update_fields se escriben esos campos y los
+        derivados que cambien.
+        """
+        from .busqueda import documento_busqueda
+        from .indice_ciego import indice_rut, indice_telefono
+        update_fields = kwargs.get('update_fields')
+        nuevo = self._state.adding or kwargs.get('force_insert')
+        if nuevo:
+            origen = {'rut', 'telefono'}
+            self.indices_calculados = True
+        elif update_fields is not None:
+            origen = set(update_fields)
+        else:
+            origen = self.campos_modificados()
+
+        # Los índices se recalculan solo si cambió su origen: leer un campo
+        # encriptado diferido costaría una query y un descifrado
+        if 'rut' in origen:
+            self.rut_indice = indice_rut(self.rut)
+        if 'telefono' in origen:
+            self.telefono_indice = indice_telefono(self.telefono)
+        self.busqueda = documento_busqueda(self.user, self)
+
+        if not nuevo:
+            modificados = self.campos_modificados()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *(modificados & set(self.CAMPOS_DERIVADOS))}
+            elif not modificados:
+                return
+            else:
+                kwargs['update_fields'] = modificados
+        super().save(*args, **kwargs)
+        self._recordar_valores(None if nuevo else kwargs['update_fields'])
+
+    def generar_token_activacion(self, guardar=True):
+        """
+        Genera un token único de activación válido por 48 horas.
+        Con guardar=False solo lo asigna (para guardar muchos con bulk_update).
+        """
         import secrets
         self.token_activacion = secrets.token_urlsafe(32)
         self.token_expira = timezone.now() + timedelta(hours=48)
         self.token_usado = False
-        self.save()
+        if guardar:
+            self.save()
         return self.token_activacion
 
     def token_es_valido(self):
@@ -117,7 +228,7 @@ class Mesa(models.Model):
         ordering = ['numero']
 
 
-class Reserva(models.Model):
+class Reserva(CamposModificadosMixin, models.Model):
     ESTADO_CHOICES = (
         ('pendiente', 'Pendiente'),
         ('confirmada', 'Confirmada'),
@@ -139,6 +250,8 @@ class Reserva(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # FIX #28 (MODERADO): Soft delete - timestamp de eliminación
     deleted_at = models.DateTimeField(null=True, blank=True, help_text="Fecha y hora de eliminación (soft delete)")
+    # Marcado por `manage.py enviar_recordatorios` para no repetir el recordatorio
+    recordatorio_enviado_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     # FIX #28 (MODERADO): Manager por defecto excluye eliminados
     objects = SoftDeleteManager()
@@ -151,8 +264,28 @@ class Reserva(models.Model):
         """
         Validar que la mesa esté disponible en la fecha y hora solicitada.
 
-        FIX #6 (MODERADO): Valida hora pasada en día actual
         FIX #1 (CRÍTICO): Valida solapamiento de horarios
+        """
+        self.validar_horario_y_capacidad()
+
+        self.validar_solapamiento()
+
+    def validar_solapamiento(self):
+        """
+        Validar que la mesa no esté reservada en el mismo horario.
+        En PostgreSQL lo garantiza la exclusion constraint al guardar.
+        """
+        if self.hora_fin and not solapamiento_validado_por_bd(self._state.db):
+            reserva = self.reserva_en_conflicto()
+            if reserva:
+                raise ValidationError(self._mensaje_solapamiento(reserva))
+
+    def validar_horario_y_capacidad(self):
+        """
+        Reglas de la reserva que no requieren consultar otras reservas
+        (también las usa la creación masiva, que valida solapamientos en memoria).
+
+        FIX #6 (MODERADO): Valida hora pasada en día actual
         FIX #9 (GRAVE): Usa timezone-aware dates para comparaciones
         FIX #8 (GRAVE): Valida horario de cierre
         """
@@ -210,24 +343,47 @@ class Reserva(models.Model):
         if self.num_personas < 1:
             raise ValidationError("Debe reservar para al menos 1 persona")
 
-        # Validar que la mesa no esté reservada en el mismo horario
-        reservas_conflicto = Reserva.objects.filter(
-            mesa=self.mesa,
+    def reserva_en_conflicto(self):
+        """Primera reserva pendiente/activa de la misma mesa que se solapa con esta."""
+        return Reserva.objects.filter(
+            mesa_id=self.mesa_id,
             fecha_reserva=self.fecha_reserva,
-            estado__in=['pendiente', 'activa']
-        ).exclude(id=self.id)
+            estado__in=['pendiente', 'activa'],
+            hora_inicio__lt=self.hora_fin,
+            hora_fin__gt=self.hora_inicio,
+        ).exclude(id=self.id).only('hora_inicio', 'hora_fin').first()
+
+    def _mensaje_solapamiento(self, reserva):
+        return (
+            f"Solapamiento detectado: La mesa {self.mesa.numero} ya está reservada entre "
+            f"{reserva.hora_inicio} y {reserva.hora_fin}"
+        )
+
+    # Campos que se escriben sin full_clean(): transiciones internas (cambio de
+    # estado, soft delete, recordatorios) que no alteran horario ni datos
+    CAMPOS_SIN_VALIDACION = ('estado', 'deleted_at', 'recordatorio_enviado_at', 'updated_at')
+    # Campos que definen las franjas de OcupacionSlot
+    CAMPOS_HORARIO = ('mesa_id', 'fecha_reserva', 'hora_inicio', 'hora_fin')
+
+    def ocupa_mesa(self, original=False):
+        """Si la reserva ocupa la mesa (ahora, o según los valores cargados de la BD)."""
+        from .disponibilidad import ESTADOS_OCUPAN_MESA
+        valor = self.valor_original if original else self.__dict__.get
+        return valor('deleted_at') is None and valor('estado') in ESTADOS_OCUPAN_MESA
+
+    def save(self, *args, validar=None, **kwargs):
+        """
+        Guarda validando según lo que cambió (validar=None):
 
-        # Verificar que hora_fin esté calculada antes de validar solapamiento
-        if self.hora_fin:
-            for reserva in reservas_conflicto:
-                # Verificar solapamiento de horarios
-                if (self.hora_inicio < reserva.hora_fin and self.hora_fin > reserva.hora_inicio):
-                    raise ValidationError(
-                        f"Solapamiento detectado: La mesa {self.mesa.numero} ya está reservada entre "
-                        f"{reserva.hora_inicio} y {reserva.hora_fin}"
-                    )
+        - Reserva nueva, o cambios de horario, mesa, cliente o datos: full_clean().
+        - Solo campos internos (CAMPOS_SIN_VALIDACION): sin validaciones ni
+          consulta de solapamiento; si la reserva vuelve a ocupar la mesa
+          (restore, reactivación) solo se valida el solapamiento.
 
-    def save(self, *args, **kwargs):
+        Una reserva ya guardada escribe solo las columnas modificadas (o las
+        de update_fields) y no escribe nada si no cambió ninguna.
+        validar=True fuerza full_clean(); validar=False no valida.
+        """
         # Auto-calcular hora_fin como hora_inicio + 2 horas
         if self.hora_inicio:
             from datetime import datetime
@@ -236,14 +392,53 @@ class Reserva(models.Model):
             dt_fin = dt_inicio + timedelta(hours=2)
             self.hora_fin = dt_fin.time()
 
-        self.full_clean()  # Ejecutar validaciones antes de guardar
-        super().save(*args, **kwargs)
+        nuevo = self._state.adding or kwargs.get('force_insert')
+        update_fields = kwargs.get('update_fields')
+        if nuevo:
+            campos = None
+        else:
+            campos = self.campos_modificados()
+            if update_fields is not None:
+                campos = {self._meta.get_field(campo).attname for campo in update_fields} | (campos & {'hora_fin'})
+            if not campos:
+                return
+            kwargs['update_fields'] = campos | {'updated_at'}
+
+        solo_solapamiento = False
+        if validar is None:
+            validar = nuevo or bool(campos - set(self.CAMPOS_SIN_VALIDACION))
+            # Reactivar o restaurar: vuelve a ocupar la mesa
+            solo_solapamiento = not validar and self.ocupa_mesa() and not self.ocupa_mesa(original=True)
+        if validar:
+            self.full_clean()  # Ejecutar validaciones antes de guardar
+        elif solo_solapamiento:
+            self.validar_solapamiento()
+
+        # Guardar y actualizar la ocupación por franja en la misma transacción
+        from .disponibilidad import sincronizar_ocupacion
+
+        try:
+            with transaction.atomic(using=kwargs.get('using')):
+                super().save(*args, **kwargs)
+                # Entre estados que ocupan la mesa (pendiente -> activa) las
+                # franjas no cambian
+                if nuevo or campos & set(self.CAMPOS_HORARIO) or self.ocupa_mesa() != self.ocupa_mesa(original=True):
+                    sincronizar_ocupacion(self)
+            self._recordar_valores(kwargs.get('update_fields'))
+        except IntegrityError as e:
+            # La exclusion constraint detectó una reserva concurrente solapada
+            if RESERVA_SIN_SOLAPAMIENTO not in str(e):
+                raise
+            reserva = self.reserva_en_conflicto()
+            if reserva is None:
+                raise
+            raise ValidationError(self._mensaje_solapamiento(reserva))
 
     # FIX #28 (MODERADO): Soft delete methods
     def delete(self, using=None, keep_parents=False):
         """Soft delete: marca como eliminado en lugar de borrar"""
         self.deleted_at = timezone.now()
-        self.save(using=using)
+        self.save(using=using, update_fields=['deleted_at'])
 
     def hard_delete(self):
         """Eliminación real de la base de datos"""
@@ -252,7 +447,7 @@ class Reserva(models.Model):
     def restore(self):
         """Restaurar una reserva eliminada"""
         self.deleted_at = None
-        self.save()
+        self.save(update_fields=['deleted_at'])
 
     @property
     def is_deleted(self):
@@ -285,6 +480,34 @@ class Reserva(models.Model):
         ]
 
 
+class OcupacionSlot(models.Model):
+    """
+    Ocupación materializada por franja horaria.
+
+    Cada fila indica que una reserva impide reservar la mesa en la franja que
+    comienza a la hora 'slot' (franjas de 2 horas cada 30 min, ver
+    disponibilidad.generar_horarios). Se mantiene desde Reserva.save() y se
+    puede reconstruir con: python manage.py reconstruir_ocupacion
+    """
+    reserva = models.ForeignKey(Reserva, on_delete=models.CASCADE, related_name='ocupacion')
+    mesa = models.ForeignKey(Mesa, on_delete=models.CASCADE, related_name='ocupacion')
+    fecha = models.DateField()
+    slot = models.TimeField(help_text="Hora de inicio de la franja ocupada")
+
+    def __str__(self):
+        return f"Mesa {self.mesa_id} - {self.fecha} {self.slot} (Reserva {self.reserva_id})"
+
+    class Meta:
+        verbose_name = "Ocupación por franja"
+        verbose_name_plural = "Ocupación por franjas"
+        indexes = [
+            models.Index(fields=['fecha', 'slot', 'mesa'], name='idx_ocupacion_fecha_slot'),
+            models.Index(fields=['mesa', 'fecha', 'slot'], name='idx_ocupacion_mesa_fecha'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['reserva', 'slot'], name='ocupacion_unica_por_reserva'),
+        ]
+
 class BloqueoMesa(models.Model):
     """
     Modelo para bloquear mesas por mantenimiento, eventos, u otros motivos.
@@ -355,6 +578,12 @@ class BloqueoMesa(models.Model):
         default=True,
         help_text="Si el bloqueo está activo"
     )
+    ocurrencias_hasta = models.DateField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Fecha hasta la que están materializadas las ocurrencias (vacío = pendiente)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -409,39 +638,71 @@ class BloqueoMesa(models.Model):
 
         # Validar solapamiento con otros bloqueos activos de la misma mesa
         if self.activo:
-            bloqueos_conflicto = BloqueoMesa.objects.filter(
-                mesa=self.mesa,
-                activo=True
-            ).exclude(id=self.id)
-
-            for bloqueo in bloqueos_conflicto:
-                # Verificar solapamiento de fechas
-                if (self.fecha_inicio <= bloqueo.fecha_fin and
-                    self.fecha_fin >= bloqueo.fecha_inicio):
-
-                    # Si ambos bloqueos son de día completo, hay conflicto
-                    if not self.hora_inicio and not bloqueo.hora_inicio:
-                        raise ValidationError(
-                            f"Existe un bloqueo de día completo en las fechas {bloqueo.fecha_inicio} - {bloqueo.fecha_fin}"
-                        )
-
-                    # Si uno es de día completo y el otro tiene horario, hay conflicto
-                    if not self.hora_inicio or not bloqueo.hora_inicio:
-                        raise ValidationError(
-                            f"Existe un bloqueo que se solapa con las fechas seleccionadas"
-                        )
-
-                    # Si ambos tienen horario, verificar solapamiento de horas
-                    if (self.hora_inicio < bloqueo.hora_fin and
-                        self.hora_fin > bloqueo.hora_inicio):
-                        raise ValidationError(
-                            f"Existe un bloqueo entre {bloqueo.hora_inicio} y {bloqueo.hora_fin} "
-                            f"en las fechas {bloqueo.fecha_inicio} - {bloqueo.fecha_fin}"
-                        )
+            bloqueo = self.bloqueo_en_conflicto()
+            if bloqueo is None:
+                return
+
+            # Si ambos bloqueos son de día completo, hay conflicto
+            if not self.hora_inicio and not bloqueo.hora_inicio:
+                raise ValidationError(
+                    f"Existe un bloqueo de día completo en las fechas {bloqueo.fecha_inicio} - {bloqueo.fecha_fin}"
+                )
+
+            # Si uno es de día completo y el otro tiene horario, hay conflicto
+            if not self.hora_inicio or not bloqueo.hora_inicio:
+                raise ValidationError(
+                    f"Existe un bloqueo que se solapa con las fechas seleccionadas"
+                )
+
+            # Ambos tienen horario y se solapan
+            raise ValidationError(
+                f"Existe un bloqueo entre {bloqueo.hora_inicio} y {bloqueo.hora_fin} "
+                f"en las fechas {bloqueo.fecha_inicio} - {bloqueo.fecha_fin}"
+            )
+
+    def bloqueo_en_conflicto(self):
+        """
+        Primer bloqueo activo de la misma mesa que se solapa con este.
+
+        Una sola query filtrada por rango de fechas (índice mesa, fecha_inicio,
+        fecha_fin) y horas: el historial de bloqueos que no se solapan no se
+        carga en memoria.
+        """
+        conflictos = BloqueoMesa.objects.filter(
+            mesa_id=self.mesa_id,
+            activo=True,
+            fecha_inicio__lte=self.fecha_fin,
+            fecha_fin__gte=self.fecha_inicio,
+        ).exclude(id=self.id)
+
+        # Un bloqueo con horario solo choca con bloqueos de día completo
+        # o con horarios que se solapan
+        if self.hora_inicio:
+            conflictos = conflictos.filter(
+                models.Q(hora_inicio__isnull=True) |
+                models.Q(hora_inicio__lt=self.hora_fin, hora_fin__gt=self.hora_inicio)
+            )
+
+        return conflictos.only(
+            'fecha_inicio', 'fecha_fin', 'hora_inicio', 'hora_fin'
+        ).order_by('-fecha_inicio').first()
 
     def save(self, *args, **kwargs):
+        from .recurrencia import crear_ocurrencias, limite_de_expansion
         self.full_clean()  # Ejecutar validaciones antes de guardar
-        super().save(*args, **kwargs)
+
+        # Las ocurrencias se regeneran aquí, para que las consultas de
+        # disponibilidad solo lean (ver recurrencia.py). Un bloqueo inactivo
+        # no tiene ocurrencias
+        self.ocurrencias_hasta = limite_de_expansion(self) if self.activo else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'ocurrencias_hasta'}
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            OcurrenciaBloqueo.objects.filter(bloqueo_id=self.pk).delete()
+            if self.activo:
+                crear_ocurrencias(self, self.fecha_inicio, self.ocurrencias_hasta)
 
     def esta_activo_en_fecha_hora(self, fecha, hora_inicio=None, hora_fin=None):
         """
@@ -455,11 +716,13 @@ class BloqueoMesa(models.Model):
         Returns:
             bool - True si el bloqueo aplica en la fecha/hora especificada
         """
+        from .recurrencia import fechas_del_bloqueo
+
         if not self.activo:
             return False
 
-        # Verificar si la fecha está dentro del rango
-        if not (self.fecha_inicio <= fecha <= self.fecha_fin):
+        # Verificar si la fecha cae en alguna ocurrencia (o en el rango si no se repite)
+        if not fechas_del_bloqueo(self, fecha, fecha):
             return False
 
         # Si el bloqueo es de día completo, aplica siempre
@@ -481,5 +744,84 @@ class BloqueoMesa(models.Model):
             models.Index(fields=['mesa', 'fecha_inicio', 'fecha_fin']),
             models.Index(fields=['activo']),
             models.Index(fields=['categoria']),
+            models.Index(fields=['activo', 'ocurrencias_hasta'], name='idx_bloqueo_ocurrencias'),
+        ]
+
+
+class OcurrenciaBloqueo(models.Model):
+    """
+    Expansión materializada de un BloqueoMesa: una fila por día en que aplica.
+
+    Los bloqueos recurrentes se expanden hasta un horizonte acotado (ver
+    recurrencia.py) y las consultas de disponibilidad leen esta tabla por
+    (fecha, mesa) en vez de evaluar las reglas de recurrencia en cada request.
+    """
+    bloqueo = models.ForeignKey(BloqueoMesa, on_delete=models.CASCADE, related_name='ocurrencias')
+    mesa = models.ForeignKey(Mesa, on_delete=models.CASCADE, related_name='ocurrencias_bloqueo')
+    fecha = models.DateField()
+    hora_inicio = models.TimeField(null=True, blank=True, help_text="Vacío = día completo")
+    hora_fin = models.TimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Bloqueo {self.bloqueo_id} - Mesa {self.mesa_id} - {self.fecha}"
+
+    class Meta:
+        verbose_name = "Ocurrencia de bloqueo"
+        verbose_name_plural = "Ocurrencias de bloqueos"
+        indexes = [
+            models.Index(fields=['fecha', 'mesa'], name='idx_ocurrencia_fecha_mesa'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['bloqueo', 'fecha'], name='ocurrencia_unica_por_dia'),
         ]
 
+
+class EmailPendiente(models.Model):
+    """
+    Outbox de emails transaccionales.
+
+    Los endpoints no hablan con el servidor SMTP: email_service encola el
+    mensaje ya compuesto en esta tabla, dentro de la misma transacción que la
+    reserva (si la transacción se revierte, el email tampoco existe). El
+    worker `python manage.py procesar_emails` los envía por lotes, con
+    reintentos y backoff exponencial.
+
+    Mientras un worker envía un lote, sus filas quedan en estado 'enviando'
+    y proximo_intento marca el fin de esa reserva (lease): si el worker muere
+    antes de registrar el resultado, al vencer otro worker las vuelve a tomar.
+    """
+    ESTADO_CHOICES = (
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    )
+
+    TIPO_CHOICES = (
+        ('confirmacion_invitado', 'Confirmación de reserva (invitado)'),
+        ('confirmacion_registrado', 'Confirmación de reserva (usuario registrado)'),
+        ('bienvenida', 'Bienvenida por cuenta activada'),
+        ('cancelacion', 'Cancelación de reserva'),
+    )
+
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    destinatario = models.EmailField()
+    asunto = models.CharField(max_length=255)
+    mensaje = models.TextField()
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now, help_text="No se envía antes de esta fecha")
+    ultimo_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    enviado_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.destinatario} ({self.get_estado_display()})"
+
+    class Meta:
+        verbose_name = "Email pendiente"
+        verbose_name_plural = "Emails pendientes"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='idx_email_pendiente_cola'),
+        ]
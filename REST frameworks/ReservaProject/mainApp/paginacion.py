@@ -0,0 +1,176 @@
+"""
+Paginación por cursor (keyset) para listados largos.
+
+PageNumberPagination hace un COUNT(*) completo y un OFFSET que recorre todas
+las filas anteriores: la página 200 del historial cuesta 200 veces más que la
+primera. Con ?paginacion=cursor el listado se recorre por posición: el cursor
+guarda los valores del último elemento de la página y la siguiente se pide con
+
+    WHERE (fecha, hora, id) < (cursor)  ORDER BY fecha DESC, hora DESC, id DESC  LIMIT n+1
+
+que usa el índice de ordenamiento y no cuenta filas. Cada página cuesta lo
+mismo sin importar la profundidad.
+
+A diferencia de CursorPagination de DRF (que posiciona solo por el primer
+campo y desempata con OFFSET), aquí la posición es la clave completa, con
+'id' como desempate para que sea única.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por clave compuesta. Las subclases definen 'ordering'
+    (campos no nulos, el último único, p. ej. 'id').
+
+    Respuesta: {'next', 'previous', 'results'} (sin 'count').
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def _campos(self, invertir=False):
+        """[(campo, descendente)] del ordenamiento, opcionalmente invertido."""
+        return [
+            (campo.lstrip('-'), campo.startswith('-') != invertir)
+            for campo in self.ordering
+        ]
+
+    @classmethod
+    def columnas_de_cursor(cls):
+        """Columnas que el cursor lee de cada fila."""
+        return [campo.lstrip('-') for campo in cls.ordering]
+
+    def _filtro_despues_de(self, valores, invertir):
+        """Q de las filas posteriores a 'valores' según el ordenamiento."""
+        condiciones = []
+        iguales = {}
+        for (campo, descendente), valor in zip(self._campos(invertir), valores):
+            lookup = 'lt' if descendente else 'gt'
+            condiciones.append(Q(**iguales, **{f'{campo}__{lookup}': valor}))
+            iguales[campo] = valor
+        return reduce(or_, condiciones)
+
+    def _codificar(self, fila, anterior=False):
+        # Filas de modelo o diccionarios de .values() (ver lectura_rapida.py)
+        if isinstance(fila, dict):
+            valores = [fila[campo] for campo, _ in self._campos()]
+        else:
+            valores = [fila.serializable_value(campo) for campo, _ in self._campos()]
+        datos = {'v': [str(v) for v in valores]}
+        if anterior:
+            datos['a'] = 1
+        return urlsafe_b64encode(json.dumps(datos).encode()).decode()
+
+    def _decodificar(self, cursor, modelo):
+        try:
+            datos = json.loads(urlsafe_b64decode(cursor.encode()))
+            campos = self._campos()
+            if len(datos['v']) != len(campos):
+                raise ValueError
+            valores = [
+                modelo._meta.get_field(campo).to_python(valor)
+                for (campo, _), valor in zip(campos, datos['v'])
+            ]
+            return valores, bool(datos.get('a'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        anterior = False
+        if cursor:
+            valores, anterior = self._decodificar(cursor, queryset.model)
+            queryset = queryset.filter(self._filtro_despues_de(valores, invertir=anterior))
+
+        orden = [f"{'-' if desc else ''}{campo}" for campo, desc in self._campos(invertir=anterior)]
+        filas = list(queryset.order_by(*orden)[:self.page_size + 1])
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+
+        if anterior:
+            # Se leyó hacia atrás: devolver en el orden normal
+            filas.reverse()
+            self.siguiente = filas[-1] if filas else None
+            self.previo = filas[0] if hay_mas else None
+        else:
+            self.siguiente = filas[-1] if hay_mas else None
+            self.previo = filas[0] if cursor and filas else None
+        return filas
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self._codificar(self.siguiente))
+
+    def get_previous_link(self):
+        if self.previo is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self._codificar(self.previo, anterior=True)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class ReservaKeysetPagination(KeysetPagination):
+    # Sigue el índice (-fecha_reserva, -hora_inicio) de Reserva
+    ordering = ('-fecha_reserva', '-hora_inicio', '-id')
+
+
+class BloqueoKeysetPagination(KeysetPagination):
+    # hora_inicio admite NULL (bloqueo de día completo): no sirve como clave
+    ordering = ('-fecha_inicio', '-id')
+
+
+class PaginacionConCursorOpcional(PageNumberPagination):
+    """
+    Paginación por número de página (default) o por cursor con
+    ?paginacion=cursor. Los links 'next'/'previous' del modo cursor ya
+    incluyen ?cursor=..., que también activa el modo.
+    """
+    keyset_class = KeysetPagination
+    modo_query_param = 'paginacion'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (request.query_params.get(self.modo_query_param) == 'cursor'
+                or self.keyset_class.cursor_query_param in request.query_params):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def columnas_de_cursor(self):
+        return self.keyset_class.columnas_de_cursor()
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class PaginacionReservas(PaginacionConCursorOpcional):
+    keyset_class = ReservaKeysetPagination
+
+
+class PaginacionBloqueos(PaginacionConCursorOpcional):
+    keyset_class = BloqueoKeysetPagination
@@ -1,168 +1,121 @@
+"""
+Permisos por rol.
+
+El rol del usuario se resuelve una vez por request (rol_de) y se guarda en
+el request: los permisos, get_queryset y los serializers lo leen de ahí en
+vez de repetir request.user.perfil.rol en cada chequeo.
+
+Cada clase de permiso es una fila de la tabla de PermisoPorRol:
+- roles: acceso a la vista y a todos los objetos
+- roles_duenos: acceso a la vista, pero solo a los objetos propios
+- autenticados: cualquier usuario autenticado accede a la vista (los
+  objetos se siguen chequeando con las dos listas anteriores)
+"""
 from rest_framework.permissions import BasePermission
 
 
-class IsAdministrador(BasePermission):
-    """
-    Permite acceso solo a usuarios con rol 'Administrador'.
-    """
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            return request.user.perfil.rol == 'admin'
-        except AttributeError:
-            # Si el usuario no tiene perfil, denegar acceso
-            return False
+ROLES = ('admin', 'cajero', 'mesero', 'cliente')
 
-    def has_object_permission(self, request, view, obj):
-        """Admin tiene acceso a todos los objetos"""
-        if not request.user or not request.user.is_authenticated:
-            return False
 
-        try:
-            return request.user.perfil.rol == 'admin'
-        except AttributeError:
-            return False
+def _resolver_rol(user):
+    """Rol del usuario, o None si no está autenticado o no tiene perfil."""
+    if not user or not user.is_authenticated:
+        return None
+    try:
+        return user.perfil.rol
+    except AttributeError:
+        # Usuario sin perfil
+        return None
 
 
-class IsCajero(BasePermission):
+def rol_de(request):
     """
-    Permite acceso solo a usuarios con rol 'Cajero'.
+    Rol del usuario del request, resuelto una sola vez. Se guarda junto al
+    usuario para el que se resolvió: si request.user cambia (login) se
+    vuelve a resolver.
     """
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
+    user = request.user
+    resuelto = getattr(request, '_rol_resuelto', None)
+    if resuelto is None or resuelto[0] is not user:
+        resuelto = (user, _resolver_rol(user))
+        request._rol_resuelto = resuelto
+    return resuelto[1]
 
-        try:
-            return request.user.perfil.rol == 'cajero'
-        except AttributeError:
-            return False
 
-    def has_object_permission(self, request, view, obj):
-        """Cajero tiene acceso a todos los objetos"""
-        if not request.user or not request.user.is_authenticated:
-            return False
+def es_dueno(user, obj):
+    """Reserva del usuario o su propio perfil (compara ids, sin queries)."""
+    if hasattr(obj, 'cliente_id'):
+        return obj.cliente_id == user.pk
+    if hasattr(obj, 'user_id'):
+        return obj.user_id == user.pk
+    return False
 
-        try:
-            return request.user.perfil.rol == 'cajero'
-        except AttributeError:
-            return False
 
+class PermisoPorRol(BasePermission):
+    """Permiso definido por tabla de roles (ver docstring del módulo)."""
+    roles = ()
+    roles_duenos = ()
+    autenticados = False
 
-class IsMesero(BasePermission):
-    """
-    Permite acceso solo a usuarios con rol 'Mesero'.
-    """
     def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            return request.user.perfil.rol == 'mesero'
-        except AttributeError:
-            return False
+        if self.autenticados:
+            return bool(request.user and request.user.is_authenticated)
+        rol = rol_de(request)
+        return rol in self.roles or rol in self.roles_duenos
 
     def has_object_permission(self, request, view, obj):
-        """Mesero tiene acceso a todos los objetos"""
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            return request.user.perfil.rol == 'mesero'
-        except AttributeError:
-            return False
+        rol = rol_de(request)
+        if rol in self.roles:
+            return True
+        if rol in self.roles_duenos:
+            return es_dueno(request.user, obj)
+        return False
 
 
-class IsCliente(BasePermission):
+class IsAdministrador(PermisoPorRol):
     """
-    Permite acceso solo a usuarios con rol 'Cliente'.
+    Permite acceso solo a usuarios con rol 'Administrador'.
     """
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
+    roles = ('admin',)
 
-        try:
-            return request.user.perfil.rol == 'cliente'
-        except AttributeError:
-            return False
 
-    def has_object_permission(self, request, view, obj):
-        """
-        Cliente solo puede acceder a sus propios objetos.
-        IMPORTANTE: Verifica que el objeto (Reserva) pertenezca al cliente.
-        """
-        if not request.user or not request.user.is_authenticated:
-            return False
+class IsCajero(PermisoPorRol):
+    """
+    Permite acceso solo a usuarios con rol 'Cajero'.
+    """
+    roles = ('cajero',)
 
-        try:
-            # Verificar que sea cliente
-            if request.user.perfil.rol != 'cliente':
-                return False
 
-            # Para objetos Reserva, verificar que sea del cliente
-            if hasattr(obj, 'cliente'):
-                return obj.cliente == request.user
+class IsMesero(PermisoPorRol):
+    """
+    Permite acceso solo a usuarios con rol 'Mesero'.
+    """
+    roles = ('mesero',)
 
-            # Para objetos Perfil, verificar que sea el suyo
-            if hasattr(obj, 'user'):
-                return obj.user == request.user
 
-            # Por defecto, denegar acceso
-            return False
-        except AttributeError:
-            return False
+class IsCliente(PermisoPorRol):
+    """
+    Permite acceso solo a usuarios con rol 'Cliente'.
+    IMPORTANTE: a nivel de objeto solo accede a sus propias reservas/perfil.
+    """
+    roles_duenos = ('cliente',)
 
 
-class IsAdminOrCajero(BasePermission):
+class IsAdminOrCajero(PermisoPorRol):
     """
     Permite acceso a usuarios con rol 'Administrador' o 'Cajero'.
     """
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            return request.user.perfil.rol in ['admin', 'cajero']
-        except AttributeError:
-            return False
-
-    def has_object_permission(self, request, view, obj):
-        """Admin o Cajero tienen acceso a todos los objetos"""
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            return request.user.perfil.rol in ['admin', 'cajero']
-        except AttributeError:
-            return False
+    roles = ('admin', 'cajero')
 
 
-class IsAdminOrCajeroOrMesero(BasePermission):
+class IsAdminOrCajeroOrMesero(PermisoPorRol):
     """
     Permite acceso a usuarios con rol 'Administrador', 'Cajero' o 'Mesero'.
     """
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            return request.user.perfil.rol in ['admin', 'cajero', 'mesero']
-        except AttributeError:
-            return False
-
-    def has_object_permission(self, request, view, obj):
-        """Admin, Cajero o Mesero tienen acceso a todos los objetos"""
-        if not request.user or not request.user.is_authenticated:
-            return False
+    roles = ('admin', 'cajero', 'mesero')
 
-        try:
-            return request.user.perfil.rol in ['admin', 'cajero', 'mesero']
-        except AttributeError:
-            return False
 
-
-class IsOwnerOrAdmin(BasePermission):
+class IsOwnerOrAdmin(PermisoPorRol):
     """
     Permite acceso a:
     - Administradores: acceso total a todas las reservas
@@ -172,39 +125,12 @@ class IsOwnerOrAdmin(BasePermission):
     1. Admins pueden ver/editar/eliminar cualquier reserva
     2. Clientes solo pueden ver/editar/eliminar sus propias reservas
     """
-    def has_permission(self, request, view):
-        """Permitir a usuarios autenticados acceder a la vista"""
-        return request.user and request.user.is_authenticated
-
-    def has_object_permission(self, request, view, obj):
-        """
-        Verificar permisos a nivel de objeto:
-        - Admin: tiene acceso a todo
-        - Cliente: solo a sus propias reservas
-        """
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            # Si es admin, permitir acceso total
-            if request.user.perfil.rol == 'admin':
-                return True
-
-            # Si es el dueño del objeto (reserva), permitir acceso
-            if hasattr(obj, 'cliente'):
-                return obj.cliente == request.user
+    roles = ('admin',)
+    roles_duenos = ROLES
+    autenticados = True
 
-            # Si es su propio perfil, permitir acceso
-            if hasattr(obj, 'user'):
-                return obj.user == request.user
 
-            # Por defecto, denegar acceso
-            return False
-        except AttributeError:
-            return False
-
-
-class IsAdminOrCajeroOrOwner(BasePermission):
+class IsAdminOrCajeroOrOwner(PermisoPorRol):
     """
     Permite acceso a:
     - Administradores: acceso total a todas las reservas
@@ -214,34 +140,6 @@ class IsAdminOrCajeroOrOwner(BasePermission):
     Este permiso se usa en ReservaViewSet para operaciones de actualización,
     permitiendo que cajeros puedan confirmar/activar reservas de cualquier cliente.
     """
-    def has_permission(self, request, view):
-        """Permitir a usuarios autenticados acceder a la vista"""
-        return request.user and request.user.is_authenticated
-
-    def has_object_permission(self, request, view, obj):
-        """
-        Verificar permisos a nivel de objeto:
-        - Admin o Cajero: tiene acceso a todo
-        - Cliente: solo a sus propias reservas
-        """
-        if not request.user or not request.user.is_authenticated:
-            return False
-
-        try:
-            # Si es admin o cajero, permitir acceso total
-            if request.user.perfil.rol in ['admin', 'cajero']:
-                return True
-
-            # Si es el dueño del objeto (reserva), permitir acceso
-            if hasattr(obj, 'cliente'):
-                return obj.cliente == request.user
-
-            # Si es su propio perfil, permitir acceso
-            if hasattr(obj, 'user'):
-                return obj.user == request.user
-
-            # Por defecto, denegar acceso
-            return False
-        except AttributeError:
-            return False
-
+    roles = ('admin', 'cajero')
+    roles_duenos = ROLES
+    autenticados = True
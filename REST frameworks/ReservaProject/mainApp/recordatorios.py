@@ -0,0 +1,113 @@
+"""
+Recordatorios de reservas próximas (`python manage.py enviar_recordatorios`).
+
+Corre periódicamente dentro del worker `procesar_emails --continuo` (o
+desde cron). Cada ejecución:
+- Busca en UNA query, sobre el índice (fecha_reserva, estado), las reservas
+  pendientes/confirmadas que comienzan dentro de la ventana y aún no tienen
+  recordatorio (recordatorio_enviado_at vacío).
+- Recorre el resultado con iterator() en bloques de TAMANO_BLOQUE: la
+  memoria no crece con la cantidad de reservas del día.
+- Renderiza cada bloque con los templates ya compilados
+  (renderizar_en_lote), lo envía por una conexión SMTP reutilizada
+  (entregar_mensajes) y marca las enviadas con un solo UPDATE por bloque,
+  así una nueva ejecución no las repite. Las que fallan quedan sin marcar y
+  se reintentan en la siguiente ejecución mientras sigan dentro de la ventana.
+- El link de un invitado lleva su token, que vence 48 horas después de
+  reservar: los vencidos se renuevan antes de enviar el bloque.
+
+No está pensado para ejecutarse en paralelo consigo mismo: con varias
+réplicas del worker, solo una debe enviar recordatorios (las demás con
+--recordatorios-cada 0).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .email_service import entregar_mensajes, renderizar_en_lote
+from .models import Perfil, Reserva
+
+
+# Horas de anticipación con que se envía el recordatorio
+VENTANA_HORAS = getattr(settings, 'RECORDATORIOS_VENTANA_HORAS', 24)
+
+# Reservas leídas, renderizadas y enviadas por bloque
+TAMANO_BLOQUE = 500
+
+ESTADOS_CON_RECORDATORIO = ('pendiente', 'confirmada')
+
+
+def _filtro_ventana(inicio, fin):
+    """Reservas que comienzan entre inicio y fin (datetimes locales)."""
+    if inicio.date() == fin.date():
+        return Q(fecha_reserva=inicio.date(), hora_inicio__gte=inicio.time(), hora_inicio__lte=fin.time())
+    return (
+        Q(fecha_reserva=inicio.date(), hora_inicio__gte=inicio.time())
+        | Q(fecha_reserva__gt=inicio.date(), fecha_reserva__lt=fin.date())
+        | Q(fecha_reserva=fin.date(), hora_inicio__lte=fin.time())
+    )
+
+
+def reservas_para_recordar(horas=VENTANA_HORAS, ahora=None):
+    """Queryset de reservas que comienzan en las próximas 'horas' sin recordatorio."""
+    inicio = timezone.localtime(ahora)
+    fin = inicio + timedelta(hours=horas)
+    return Reserva.objects.filter(
+        _filtro_ventana(inicio, fin),
+        # Rango explícito para que el OR de arriba use el índice (fecha_reserva, estado)
+        fecha_reserva__range=(inicio.date(), fin.date()),
+        estado__in=ESTADOS_CON_RECORDATORIO,
+        recordatorio_enviado_at__isnull=True,
+    ).exclude(
+        cliente__email=''
+    ).select_related('cliente__perfil', 'mesa').only(
+        # Sin los campos encriptados del perfil: no se descifran en cada fila
+        'id', 'fecha_reserva', 'hora_inicio', 'hora_fin', 'num_personas',
+        'mesa__numero', 'cliente__email',
+        'cliente__perfil__nombre_completo', 'cliente__perfil__es_invitado',
+        'cliente__perfil__token_activacion', 'cliente__perfil__token_expira',
+        'cliente__perfil__token_usado',
+    ).order_by('fecha_reserva', 'hora_inicio', 'id')
+
+
+def _renovar_tokens_vencidos(bloque):
+    """Renueva, con un solo UPDATE, los tokens vencidos de los invitados del bloque."""
+    perfiles = []
+    for reserva in bloque:
+        perfil = reserva.cliente.perfil
+        if perfil.es_invitado and not perfil.token_usado and not perfil.token_es_valido():
+            perfil.generar_token_activacion(guardar=False)
+            perfiles.append(perfil)
+    if perfiles:
+        Perfil.objects.bulk_update(perfiles, ['token_activacion', 'token_expira', 'token_usado'])
+
+
+def _enviar_bloque(bloque, resultado):
+    _renovar_tokens_vencidos(bloque)
+    errores = entregar_mensajes(mensaje for _, mensaje in renderizar_en_lote('recordatorio', bloque))
+    enviadas = [reserva.id for reserva, error in zip(bloque, errores) if error is None]
+    if enviadas:
+        Reserva.all_objects.filter(id__in=enviadas).update(recordatorio_enviado_at=timezone.now())
+    resultado['enviados'] += len(enviadas)
+    resultado['fallidos'] += len(bloque) - len(enviadas)
+
+
+def enviar_recordatorios(horas=VENTANA_HORAS, ahora=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Envía los recordatorios pendientes de la ventana.
+
+    Returns:
+        dict - {'enviados', 'fallidos'}
+    """
+    resultado = {'enviados': 0, 'fallidos': 0}
+    bloque = []
+    for reserva in reservas_para_recordar(horas, ahora).iterator(chunk_size=tamano_bloque):
+        bloque.append(reserva)
+        if len(bloque) >= tamano_bloque:
+            _enviar_bloque(bloque, resultado)
+            bloque = []
+    if bloque:
+        _enviar_bloque(bloque, resultado)
+    return resultado
@@ -0,0 +1,159 @@
+"""
+Motor de recurrencia para BloqueoMesa.
+
+Un bloqueo recurrente repite su rango base [fecha_inicio, fecha_fin] cada día,
+semana o mes a partir de fecha_inicio, sin fecha de término. Para no evaluar
+las reglas en cada request, las fechas en que aplica cada bloqueo se
+materializan en OcurrenciaBloqueo, y las consultas de disponibilidad solo
+leen esa tabla (no escriben):
+
+- Al guardar: BloqueoMesa.save() reemplaza las ocurrencias del bloqueo, en
+  la misma transacción, por las de su regla hasta limite_de_expansion().
+- Acotada: los bloqueos recurrentes se expanden como máximo hasta
+  hoy + HORIZONTE_MAXIMO_DIAS; más allá de ese horizonte no se aplican.
+  Los bloqueos sin recurrencia se expanden siempre completos.
+- El horizonte avanza cada día: el comando extender_ocurrencias (programado
+  una vez al día) lo lleva de nuevo a hoy + HORIZONTE_MAXIMO_DIAS e invalida
+  la disponibilidad cacheada de los días recién expandidos.
+"""
+import calendar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache_disponibilidad
+from .models import BloqueoMesa, OcurrenciaBloqueo
+
+
+# Límite de la expansión de bloqueos recurrentes
+HORIZONTE_MAXIMO_DIAS = getattr(settings, 'BLOQUEOS_HORIZONTE_DIAS', 365)
+
+# Periodo en días de las recurrencias de paso fijo
+PERIODO_DIAS = {'diaria': 1, 'semanal': 7}
+
+
+def sumar_meses(fecha, meses):
+    """Suma meses a una fecha; si el día no existe se usa el último del mes."""
+    total = fecha.month - 1 + meses
+    anio, mes = fecha.year + total // 12, total % 12 + 1
+    return fecha.replace(year=anio, month=mes, day=min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+
+def _inicios_de_ocurrencia(bloqueo, desde, hasta):
+    """Fechas de inicio de las repeticiones que pueden tocar [desde, hasta]."""
+    duracion = (bloqueo.fecha_fin - bloqueo.fecha_inicio).days
+
+    if bloqueo.tipo_recurrencia == 'mensual':
+        # Saltar directo a los meses cercanos a 'desde'
+        meses = (desde.year - bloqueo.fecha_inicio.year) * 12 + desde.month - bloqueo.fecha_inicio.month
+        n = max(0, meses - duracion // 28 - 1)
+        inicio = sumar_meses(bloqueo.fecha_inicio, n)
+        while inicio <= hasta:
+            yield inicio
+            n += 1
+            inicio = sumar_meses(bloqueo.fecha_inicio, n)
+        return
+
+    periodo = PERIODO_DIAS[bloqueo.tipo_recurrencia]
+    # Primera repetición que termina en 'desde' o después
+    n = max(0, -(-((desde - bloqueo.fecha_inicio).days - duracion) // periodo))
+    inicio = bloqueo.fecha_inicio + timedelta(days=n * periodo)
+    while inicio <= hasta:
+        yield inicio
+        inicio += timedelta(days=periodo)
+
+
+def fechas_del_bloqueo(bloqueo, desde, hasta):
+    """
+    Fechas entre desde y hasta (inclusive) en que aplica el bloqueo según su
+    recurrencia. Se evalúa en memoria, sin consultar la base de datos.
+
+    Returns:
+        list[date] - Fechas ordenadas y sin repetir
+    """
+    if bloqueo.tipo_recurrencia == 'ninguna':
+        inicio = max(desde, bloqueo.fecha_inicio)
+        fin = min(hasta, bloqueo.fecha_fin)
+        return [inicio + timedelta(days=n) for n in range((fin - inicio).days + 1)]
+
+    desde = max(desde, bloqueo.fecha_inicio)
+    duracion = (bloqueo.fecha_fin - bloqueo.fecha_inicio).days
+    fechas = set()
+    for inicio in _inicios_de_ocurrencia(bloqueo, desde, hasta):
+        for n in range(duracion + 1):
+            fecha = inicio + timedelta(days=n)
+            if desde <= fecha <= hasta:
+                fechas.add(fecha)
+    return sorted(fechas)
+
+
+def horizonte_maximo():
+    return timezone.now().date() + timedelta(days=HORIZONTE_MAXIMO_DIAS)
+
+
+def limite_de_expansion(bloqueo):
+    """Fecha hasta la que se materializan las ocurrencias del bloqueo."""
+    if bloqueo.tipo_recurrencia == 'ninguna':
+        return bloqueo.fecha_fin
+    return horizonte_maximo()
+
+
+def crear_ocurrencias(bloqueo, desde, hasta):
+    """Inserta las ocurrencias del bloqueo entre desde y hasta (inclusive)."""
+    OcurrenciaBloqueo.objects.bulk_create([
+        OcurrenciaBloqueo(
+            bloqueo_id=bloqueo.pk, mesa_id=bloqueo.mesa_id, fecha=fecha,
+            hora_inicio=bloqueo.hora_inicio, hora_fin=bloqueo.hora_fin,
+        )
+        for fecha in fechas_del_bloqueo(bloqueo, desde, hasta)
+    ], batch_size=2000, ignore_conflicts=True)
+
+
+def _extender(bloqueo, hasta):
+    """
+    Materializa las ocurrencias del bloqueo desde su último punto expandido
+    hasta 'hasta'. Si el bloqueo cambió mientras tanto (updated_at u
+    ocurrencias_hasta distintos) no escribe nada: el save() que lo cambió ya
+    regeneró las ocurrencias.
+
+    Las respuestas de disponibilidad cacheadas para esos días se calcularon
+    sin el bloqueo: se invalida el rango recién expandido.
+    """
+    desde = bloqueo.fecha_inicio
+    if bloqueo.ocurrencias_hasta is not None:
+        desde = bloqueo.ocurrencias_hasta + timedelta(days=1)
+
+    with transaction.atomic():
+        actualizado = BloqueoMesa.objects.filter(
+            pk=bloqueo.pk,
+            updated_at=bloqueo.updated_at,
+            ocurrencias_hasta=bloqueo.ocurrencias_hasta,
+        ).update(ocurrencias_hasta=hasta)
+        if not actualizado:
+            return False
+        crear_ocurrencias(bloqueo, desde, hasta)
+        cache_disponibilidad.invalidar_rango(desde, hasta)
+    bloqueo.ocurrencias_hasta = hasta
+    return True
+
+
+def extender_ocurrencias():
+    """
+    Lleva las ocurrencias de los bloqueos activos hasta su límite de
+    expansión (el horizonte de hoy para los recurrentes). Con todo al día
+    cuesta una sola query sobre el índice (activo, ocurrencias_hasta).
+
+    Returns:
+        int - Cantidad de bloqueos extendidos
+    """
+    limite = horizonte_maximo()
+    # Sin recurrencia solo los que no tienen ocurrencias (p. ej. activados
+    # con update()); los recurrentes, los que quedaron antes del horizonte
+    pendientes = BloqueoMesa.objects.filter(activo=True).filter(
+        Q(ocurrencias_hasta__isnull=True) |
+        (Q(ocurrencias_hasta__lt=limite) & ~Q(tipo_recurrencia='ninguna'))
+    )
+    return sum(_extender(bloqueo, limite_de_expansion(bloqueo)) for bloqueo in pendientes)
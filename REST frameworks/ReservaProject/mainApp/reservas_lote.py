@@ -0,0 +1,165 @@
+"""
+Creación masiva de reservas (POST /api/reservas/bulk/).
+
+Pensada para planificadores de grupos grandes y la importación del call
+center. En vez de una transacción, un lock y un full_clean por reserva:
+
+- Bloquea una sola vez las mesas afectadas, en orden de id, para que dos
+  lotes concurrentes no se bloqueen mutuamente (deadlock).
+- Lee en UNA query las reservas existentes de esas mesas y fechas, y valida
+  los solapamientos de todo el lote en memoria (contra la base de datos y
+  entre los elementos del propio lote).
+- Inserta con bulk_create, junto con su ocupación por franja (OcupacionSlot).
+
+Modos:
+- 'todo_o_nada' (default): si algún elemento es inválido no se crea ninguno.
+- 'parcial': se crean los válidos y se informan los errores del resto.
+"""
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from . import cache_disponibilidad
+from .disponibilidad import ESTADOS_OCUPAN_MESA, calcular_hora_fin, franjas_de_reserva
+from .models import Mesa, Reserva, OcupacionSlot, RESERVA_SIN_SOLAPAMIENTO
+from .serializers import ReservaLoteSerializer
+
+
+MODO_TODO_O_NADA = 'todo_o_nada'
+MODO_PARCIAL = 'parcial'
+MODOS = (MODO_TODO_O_NADA, MODO_PARCIAL)
+
+# Máximo de reservas por request
+MAX_RESERVAS_LOTE = 500
+
+
+def _ids(elementos, campo):
+    ids = set()
+    for elemento in elementos:
+        try:
+            ids.add(int(elemento.get(campo)))
+        except (TypeError, ValueError):
+            pass  # El serializer informa el error del elemento
+    return ids
+
+
+def _mensajes(error):
+    """Errores de un ValidationError de Django en el formato de DRF."""
+    if hasattr(error, 'message_dict'):
+        return error.message_dict
+    return {'non_field_errors': error.messages}
+
+
+def crear_reservas_en_lote(elementos, usuario, modo=MODO_TODO_O_NADA):
+    """
+    Valida y crea un lote de reservas.
+
+    Args:
+        elementos: list[dict] - datos de cada reserva (campos de ReservaSerializer;
+                   'cliente' opcional, por defecto el usuario que hace el request)
+        usuario: User - usuario que hace el request
+        modo: 'todo_o_nada' | 'parcial'
+
+    Returns:
+        tuple(list[dict], list[Reserva]) - resultado por elemento
+        ({'indice', 'ok', 'id'} o {'indice', 'ok', 'errores'}) y reservas creadas
+
+    Raises:
+        ValidationError si otra transacción ocupó un horario del lote entre la
+        validación y la inserción (exclusion constraint en PostgreSQL)
+    """
+    resultados = [{'indice': indice, 'ok': False} for indice in range(len(elementos))]
+
+    with transaction.atomic():
+        # 1. Lock de las mesas afectadas en orden estable (evita deadlocks)
+        mesas = {
+            mesa.id: mesa
+            for mesa in Mesa.objects.select_for_update().filter(
+                id__in=_ids(elementos, 'mesa')
+            ).order_by('id')
+        }
+        clientes = User.objects.in_bulk(_ids(elementos, 'cliente'))
+        contexto = {'mesas': mesas, 'clientes': clientes}
+
+        # 2. Validación por elemento (campos y reglas que no dependen de otras reservas)
+        candidatas = []
+        for indice, elemento in enumerate(elementos):
+            serializer = ReservaLoteSerializer(data=elemento, context=contexto)
+            if not serializer.is_valid():
+                resultados[indice]['errores'] = serializer.errors
+                continue
+
+            datos = dict(serializer.validated_data)
+            datos.setdefault('cliente', usuario)
+            reserva = Reserva(**datos)
+            reserva.hora_fin = calcular_hora_fin(reserva.hora_inicio)
+            try:
+                reserva.validar_horario_y_capacidad()
+            except ValidationError as e:
+                resultados[indice]['errores'] = _mensajes(e)
+                continue
+            candidatas.append((indice, reserva))
+
+        # 3. Solapamientos contra la base de datos y dentro del lote, en memoria
+        ocupadas = {}
+        existentes = Reserva.objects.filter(
+            mesa_id__in={reserva.mesa_id for _, reserva in candidatas},
+            fecha_reserva__in={reserva.fecha_reserva for _, reserva in candidatas},
+            estado__in=ESTADOS_OCUPAN_MESA,
+        ).values_list('mesa_id', 'fecha_reserva', 'hora_inicio', 'hora_fin')
+        for mesa_id, fecha, hora_inicio, hora_fin in existentes:
+            ocupadas.setdefault((mesa_id, fecha), []).append((hora_inicio, hora_fin))
+
+        validas = []
+        for indice, reserva in candidatas:
+            if reserva.estado in ESTADOS_OCUPAN_MESA:
+                horarios = ocupadas.setdefault((reserva.mesa_id, reserva.fecha_reserva), [])
+                conflicto = next((
+                    (inicio, fin) for inicio, fin in horarios
+                    if reserva.hora_inicio < fin and reserva.hora_fin > inicio
+                ), None)
+                if conflicto:
+                    resultados[indice]['errores'] = {'non_field_errors': [
+                        f"Solapamiento detectado: La mesa {reserva.mesa.numero} ya está reservada entre "
+                        f"{conflicto[0]} y {conflicto[1]}"
+                    ]}
+                    continue
+                horarios.append((reserva.hora_inicio, reserva.hora_fin))
+            validas.append((indice, reserva))
+
+        if modo == MODO_TODO_O_NADA and len(validas) < len(elementos):
+            return resultados, []
+
+        # 4. Inserción masiva de reservas y de su ocupación por franja
+        creadas = [reserva for _, reserva in validas]
+        try:
+            with transaction.atomic():
+                Reserva.objects.bulk_create(creadas, batch_size=500)
+                OcupacionSlot.objects.bulk_create([
+                    OcupacionSlot(reserva_id=reserva.pk, mesa_id=reserva.mesa_id,
+                                  fecha=reserva.fecha_reserva, slot=slot)
+                    for reserva in creadas if reserva.estado in ESTADOS_OCUPAN_MESA
+                    for slot in franjas_de_reserva(reserva.hora_inicio, reserva.hora_fin)
+                ], batch_size=2000)
+        except IntegrityError as e:
+            if RESERVA_SIN_SOLAPAMIENTO not in str(e):
+                raise
+            raise ValidationError(
+                'Otra reserva ocupó uno de los horarios mientras se procesaba el lote. '
+                'Intente nuevamente.'
+            )
+
+        # 5. Mismo efecto que perform_create sobre el estado de las mesas
+        if Mesa.objects.filter(
+            id__in={reserva.mesa_id for reserva in creadas}, estado='disponible'
+        ).update(estado='reservada'):
+            cache_disponibilidad.invalidar('mesas')
+
+        # bulk_create no emite post_save: invalidar la cache de disponibilidad aquí
+        cache_disponibilidad.invalidar(*{
+            cache_disponibilidad.ambito_fecha(reserva.fecha_reserva) for reserva in creadas
+        })
+
+    for indice, reserva in validas:
+        resultados[indice] = {'indice': indice, 'ok': True, 'id': reserva.pk}
+    return resultados, creadas
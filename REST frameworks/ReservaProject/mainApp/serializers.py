@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import models
 from .models import Mesa, Perfil, Reserva, BloqueoMesa
+from .indice_ciego import indice_rut
+from .cifrado import campos_visibles, descifrar_en_lote, valor_descifrado
+from .permissions import rol_de
 import re
 
 
@@ -146,13 +150,18 @@ class RegisterSerializer(serializers.ModelSerializer):
             existing_user = User.objects.filter(email=email).first()
             if existing_user and hasattr(existing_user, 'perfil'):
                 existing_perfil = existing_user.perfil
-                # Solo validar RUT si ambos tienen RUT (no vacío)
-                if rut_normalizado and existing_perfil.rut and rut_normalizado != existing_perfil.rut:
+                # Solo validar RUT si ambos tienen RUT (no vacío). Se comparan
+                # los índices ciegos: no hace falta descifrar el RUT guardado
+                if (rut_normalizado and existing_perfil.rut_indice
+                        and indice_rut(rut_normalizado) != existing_perfil.rut_indice):
                     raise serializers.ValidationError({
                         'rut': 'El RUT ingresado no coincide con tu cuenta existente. Verifica tus datos o contacta al administrador.'
                     })
 
-        if rut_normalizado and Perfil.objects.filter(rut=rut_normalizado).exists() and not allow_existing_user:
+        # El RUT está encriptado (Fernet no es determinista): la unicidad se
+        # valida con su índice ciego, una igualdad sobre una columna indexada
+        if (rut_normalizado and not allow_existing_user
+                and Perfil.objects.filter(rut_indice=indice_rut(rut_normalizado)).exists()):
             raise serializers.ValidationError({
                 'rut': 'El RUT ingresado ya se encuentra registrado.'
             })
@@ -288,7 +297,7 @@ class PerfilSerializer(serializers.ModelSerializer):
         if request and hasattr(request, 'user'):
             user = request.user
             # Si no es el dueño del perfil y no es admin, ocultar campos sensibles
-            if user != instance.user and (not hasattr(user, 'perfil') or user.perfil.rol != 'admin'):
+            if user != instance.user and rol_de(request) != 'admin':
                 representation['rut'] = None
                 representation['telefono'] = None
 
@@ -308,13 +317,79 @@ class MesaSerializer(serializers.ModelSerializer):
         return value
 
 
+def campos_solicitados(request):
+    """
+    Conjunto de campos pedidos con ?fields=id,estado,... (None si no se pidió).
+    Solo aplica a lecturas: en escrituras la respuesta es siempre completa.
+    """
+    if request is None or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    valor = request.query_params.get('fields')
+    if not valor:
+        return None
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+# Sparse fieldsets: ?fields= limita los campos de la respuesta
+class CamposDinamicosMixin:
+    """
+    Con ?fields=id,estado,mesa_numero la respuesta solo incluye esos campos
+    (los nombres desconocidos se ignoran). Los campos que no se piden se
+    quitan del serializer, así que tampoco se calculan.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        solicitados = campos_solicitados(self.context.get('request'))
+        if solicitados:
+            for nombre in set(fields) - solicitados:
+                fields.pop(nombre)
+        return fields
+
+
+# Campo de solo lectura para el RUT/teléfono (encriptados) del cliente de una reserva
+class CampoCifradoCliente(serializers.Field):
+    """
+    Solo se descifra si el rol del usuario del request puede verlo
+    (cifrado.campos_visibles); si no, retorna None sin tocar el valor cifrado.
+    Sin request en el contexto (uso interno) siempre se muestra.
+    """
+
+    def __init__(self, campo, **kwargs):
+        self.campo = campo
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        request = self.context.get('request')
+        if request is not None and self.campo not in campos_visibles(rol_de(request)):
+            return None
+        try:
+            return valor_descifrado(instance, self.campo)
+        except AttributeError:
+            # Cliente sin perfil
+            return None
+
+    def to_representation(self, value):
+        return value
+
+
+# ListSerializer que descifra en lote los datos de clientes de la página
+class ReservaListaDescifradaSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        reservas = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        descifrar_en_lote(reservas)
+        return super().to_representation(reservas)
+
+
 # Serializer para el modelo Reserva
-class ReservaSerializer(serializers.ModelSerializer):
+class ReservaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     cliente_username = serializers.CharField(source='cliente.username', read_only=True)
     cliente_nombre = serializers.CharField(source='cliente.perfil.nombre_completo', read_only=True)
-    cliente_telefono = serializers.CharField(source='cliente.perfil.telefono', read_only=True)
+    cliente_telefono = CampoCifradoCliente('telefono')
     cliente_email = serializers.EmailField(source='cliente.email', read_only=True)
-    cliente_rut = serializers.CharField(source='cliente.perfil.rut', read_only=True)
+    cliente_rut = CampoCifradoCliente('rut')
     mesa_numero = serializers.IntegerField(source='mesa.numero', read_only=True)
     mesa_info = MesaSerializer(source='mesa', read_only=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
@@ -328,6 +403,7 @@ class ReservaSerializer(serializers.ModelSerializer):
                   'num_personas', 'estado', 'estado_display', 'notas',
                   'created_at', 'updated_at')
         read_only_fields = ('cliente', 'hora_fin', 'created_at', 'updated_at')
+        list_serializer_class = ReservaListaDescifradaSerializer
 
     def validate(self, data):
         """
@@ -379,6 +455,48 @@ class ReservaSerializer(serializers.ModelSerializer):
         return data
 
 
+# Serializer compacto para el listado de /api/reservas/
+class ReservaResumenSerializer(ReservaSerializer):
+    """
+    Lo que muestran los paneles del staff: sin la mesa anidada (mesa_info),
+    los textos para mostrar ni las fechas de auditoría. El detalle, las
+    escrituras y ?vista=completa usan ReservaSerializer.
+    """
+
+    class Meta(ReservaSerializer.Meta):
+        fields = ('id', 'cliente', 'cliente_username', 'cliente_nombre',
+                  'cliente_telefono', 'cliente_email', 'cliente_rut',
+                  'mesa', 'mesa_numero',
+                  'fecha_reserva', 'hora_inicio', 'hora_fin',
+                  'num_personas', 'estado', 'notas')
+
+
+# Serializer para cada elemento de la creación masiva (POST /api/reservas/bulk/)
+class ReservaLoteSerializer(ReservaSerializer):
+    """
+    Igual que ReservaSerializer, pero mesa y cliente se resuelven desde
+    diccionarios precargados en el contexto ('mesas' y 'clientes') en vez de
+    hacer una query por elemento.
+    """
+    mesa = serializers.IntegerField()
+    cliente = serializers.IntegerField(required=False)
+
+    class Meta(ReservaSerializer.Meta):
+        read_only_fields = ('hora_fin', 'created_at', 'updated_at')
+
+    def validate_mesa(self, value):
+        mesa = self.context['mesas'].get(value)
+        if mesa is None:
+            raise serializers.ValidationError(f'La mesa {value} no existe')
+        return mesa
+
+    def validate_cliente(self, value):
+        cliente = self.context['clientes'].get(value)
+        if cliente is None:
+            raise serializers.ValidationError(f'El usuario {value} no existe')
+        return cliente
+
+
 # Serializer compacto para listados rápidos
 class ReservaListSerializer(serializers.ModelSerializer):
     cliente_username = serializers.CharField(source='cliente.username', read_only=True)
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Perfil
+from rest_framework.authtoken.models import Token
+from .models import Perfil, Mesa, Reserva, BloqueoMesa
+from . import autenticacion, cache_disponibilidad
+from .busqueda import CAMPOS_USUARIO
+from .cifrado import CAMPOS_CIFRADOS
 
 
 @receiver(post_save, sender=User)
@@ -15,9 +19,119 @@ def crear_perfil_usuario(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def guardar_perfil_usuario(sender, instance, **kwargs):
+def guardar_perfil_usuario(sender, instance, update_fields=None, **kwargs):
     """
-    Signal para guardar el perfil cada vez que se guarda el usuario.
+    Signal para guardar el perfil cada vez que se guarda el usuario (su
+    documento de búsqueda incluye campos del User). Perfil.save() solo
+    escribe lo que cambió.
+
+    Si el perfil no está cargado y el guardado no toca campos del documento
+    (p. ej. last_login al iniciar sesión) no hay nada que actualizar. Si hay
+    que cargarlo, se lee sin RUT ni teléfono: no se necesitan descifrar.
+    """
+    if User.perfil.related.is_cached(instance):
+        perfil = instance.perfil
+    elif update_fields is not None and not set(update_fields) & set(CAMPOS_USUARIO):
+        return
+    else:
+        perfil = Perfil.objects.defer(*CAMPOS_CIFRADOS).filter(user=instance).first()
+        if perfil is None:
+            return
+        perfil.user = instance
+    perfil.save()
+
+
+@receiver(post_init, sender=Perfil)
+@receiver(post_init, sender=Reserva)
+def recordar_valores_cargados(sender, instance, **kwargs):
+    """Valores cargados (CamposModificadosMixin), para que save() escriba solo lo modificado."""
+    instance._recordar_valores()
+
+
+# ============ INVALIDACIÓN DE LA IDENTIDAD CACHEADA ============
+# Ver autenticacion.py: cambios de rol (Perfil), desactivación (User) y
+# tokens borrados descartan las entradas cacheadas del usuario.
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_identidad_usuario(sender, instance, **kwargs):
+    autenticacion.invalidar_identidad(instance.pk)
+
+
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def invalidar_identidad_perfil(sender, instance, **kwargs):
+    autenticacion.invalidar_identidad(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def invalidar_identidad_token(sender, instance, **kwargs):
+    autenticacion.invalidar_identidad(instance.user_id)
+
+
+# ============ INVALIDACIÓN DE LA CACHE DE DISPONIBILIDAD ============
+# Se recuerda el valor original de los campos que definen el ámbito afectado
+# para invalidar también la fecha/rango anterior cuando se modifican.
+# Se lee desde __dict__ para no disparar queries sobre campos diferidos.
+
+@receiver(post_init, sender=Reserva)
+def recordar_fecha_reserva(sender, instance, **kwargs):
+    instance._fecha_reserva_original = instance.__dict__.get('fecha_reserva')
+
+
+@receiver(post_save, sender=Reserva)
+@receiver(post_delete, sender=Reserva)
+def invalidar_disponibilidad_reserva(sender, instance, **kwargs):
+    """Cualquier escritura de una reserva invalida su fecha (y la anterior)."""
+    fechas = {instance.fecha_reserva, getattr(instance, '_fecha_reserva_original', None)}
+    cache_disponibilidad.invalidar(*(
+        cache_disponibilidad.ambito_fecha(fecha) for fecha in fechas if fecha
+    ))
+    instance._fecha_reserva_original = instance.fecha_reserva
+
+
+@receiver(post_init, sender=BloqueoMesa)
+def recordar_rango_bloqueo(sender, instance, **kwargs):
+    instance._rango_original = (
+        instance.__dict__.get('fecha_inicio'),
+        instance.__dict__.get('fecha_fin'),
+    )
+    instance._recurrencia_original = instance.__dict__.get('tipo_recurrencia')
+
+
+@receiver(post_save, sender=BloqueoMesa)
+@receiver(post_delete, sender=BloqueoMesa)
+def invalidar_disponibilidad_bloqueo(sender, instance, **kwargs):
+    """
+    Un bloqueo invalida todos los días de su rango (actual y anterior). Si es
+    o era recurrente afecta fechas sin límite: se invalida 'bloqueos' completo.
+    """
+    recurrencias = {instance.tipo_recurrencia, getattr(instance, '_recurrencia_original', None)}
+    if recurrencias - {'ninguna', None}:
+        cache_disponibilidad.invalidar('bloqueos')
+    else:
+        rangos = {(instance.fecha_inicio, instance.fecha_fin), getattr(instance, '_rango_original', (None, None))}
+        for fecha_inicio, fecha_fin in rangos:
+            if fecha_inicio and fecha_fin:
+                cache_disponibilidad.invalidar_rango(fecha_inicio, fecha_fin)
+    instance._rango_original = (instance.fecha_inicio, instance.fecha_fin)
+    instance._recurrencia_original = instance.tipo_recurrencia
+
+
+@receiver(post_init, sender=Mesa)
+def recordar_capacidad_mesa(sender, instance, **kwargs):
+    instance._capacidad_original = instance.__dict__.get('capacidad')
+
+
+@receiver(post_save, sender=Mesa)
+@receiver(post_delete, sender=Mesa)
+def invalidar_disponibilidad_mesa(sender, instance, created=False, **kwargs):
+    """
+    Una mesa no pertenece a una fecha: invalida las consultas de mesas de todos
+    los días, y las de horas solo si cambia el conjunto de capacidades.
     """
-    if hasattr(instance, 'perfil'):
-        instance.perfil.save()
+    ambitos = ['mesas']
+    if created or kwargs.get('signal') is post_delete or instance.capacidad != instance._capacidad_original:
+        ambitos.append('capacidad')
+    cache_disponibilidad.invalidar(*ambitos)
+    instance._capacidad_original = instance.capacidad
@@ -228,6 +228,20 @@ def enable_db_access_for_all_tests(db):
     pass
 
 
+@pytest.fixture(autouse=True)
+def limpiar_cache():
+    """
+    Limpia la cache entre tests.
+
+    La base de datos se revierte al final de cada test pero la cache (LocMem)
+    no: sin esto un test podría leer disponibilidad cacheada por otro.
+    """
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def freeze_time():
     """
@@ -23,7 +23,7 @@ from factory import faker
 from datetime import date, time, timedelta
 from django.contrib.auth.models import User
 from django.utils import timezone
-from mainApp.models import Perfil, Mesa, Reserva
+from mainApp.models import Perfil, Mesa, Reserva, BloqueoMesa
 
 
 class UserFactory(DjangoModelFactory):
@@ -268,6 +268,30 @@ class ReservaCanceladaFactory(ReservaFactory):
     estado = 'cancelada'
 
 
+class BloqueoMesaFactory(DjangoModelFactory):
+    """
+    Factory para crear bloqueos de mesa.
+
+    IMPORTANTE: Por defecto bloquea el día completo de MAÑANA (fecha válida).
+
+    Ejemplo:
+        bloqueo = BloqueoMesaFactory(mesa=mesa)
+        bloqueo_parcial = BloqueoMesaFactory(hora_inicio=time(14, 0), hora_fin=time(16, 0))
+        bloqueo_semanal = BloqueoMesaFactory(tipo_recurrencia='semanal')
+    """
+    class Meta:
+        model = BloqueoMesa
+
+    mesa = factory.SubFactory(MesaFactory)
+    fecha_inicio = factory.LazyFunction(
+        lambda: date.today() + timedelta(days=1)
+    )
+    fecha_fin = factory.LazyAttribute(lambda obj: obj.fecha_inicio)
+    motivo = factory.Faker('sentence', nb_words=4, locale='es')
+    categoria = 'mantenimiento'
+    usuario_creador = factory.SubFactory(UserFactory)
+
+
 # ============================================================================
 # HELPERS: Funciones auxiliares para crear escenarios complejos
 # ============================================================================
@@ -0,0 +1,145 @@
+"""
+Tests para la autenticación por token con identidad cacheada (mainApp/autenticacion.py)
+"""
+
+import pickle
+import pytest
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from mainApp import autenticacion
+
+
+URL = '/api/reservas/'
+IDENTIDAD_CACHEABLE = autenticacion.identidad_cacheable
+
+
+def queries_de(cliente, url=URL):
+    """Ejecuta un GET y retorna (response, SQL ejecutado)."""
+    sql = []
+    with connection.execute_wrapper(lambda execute, q, *args: sql.append(q) or execute(q, *args)):
+        response = cliente.get(url)
+    return response, sql
+
+
+@pytest.fixture(autouse=True)
+def cache_compartida():
+    # En los tests la cache es LocMemCache (por proceso); se trata como compartida
+    with mock.patch.object(autenticacion, 'identidad_cacheable', return_value=True):
+        yield
+
+
+def cliente_con_token(usuario):
+    cliente = APIClient()
+    cliente.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=usuario)[0].key}')
+    return cliente
+
+
+@pytest.mark.api
+class TestIdentidadCacheada:
+    """Una query por token y ninguna mientras la identidad está en cache"""
+
+    def test_una_query_con_perfil_y_ninguna_en_cache(self, user_cliente):
+        cliente = cliente_con_token(user_cliente)
+
+        primera, sql_primera = queries_de(cliente)
+        segunda, sql_segunda = queries_de(cliente)
+
+        assert primera.status_code == segunda.status_code == status.HTTP_200_OK
+        auth = [q for q in sql_primera if 'authtoken_token' in q]
+        assert len(auth) == 1
+        assert 'mainApp_perfil' in auth[0]
+        assert not any('authtoken_token' in q for q in sql_segunda)
+        assert len(sql_segunda) == len(sql_primera) - 1
+
+    def test_no_descifra_el_perfil_del_usuario(self, user_cliente):
+        cliente = cliente_con_token(user_cliente)
+        _, sql = queries_de(cliente)
+
+        auth = next(q for q in sql if 'authtoken_token' in q)
+        assert '"rut"' not in auth and '"telefono"' not in auth
+
+    def test_entrada_sin_secretos(self, user_cliente):
+        user_cliente.perfil.token_activacion = 'secreto-de-activacion'
+        user_cliente.perfil.save()
+        cliente = cliente_con_token(user_cliente)
+        key = Token.objects.get(user=user_cliente).key
+        queries_de(cliente)
+
+        entrada = cache.get(autenticacion._clave_token(key))
+        serializada = pickle.dumps(entrada)
+        assert entrada['perfil']['rol'] == 'cliente'
+        for secreto in (user_cliente.password, key, 'secreto-de-activacion', '12345678-5'):
+            assert secreto.encode() not in serializada
+
+    def test_identidad_desde_la_cache(self, user_cliente, django_assert_num_queries):
+        key = Token.objects.get_or_create(user=user_cliente)[0].key
+        autenticacion.TokenAuthenticationConRol().authenticate_credentials(key)
+
+        with django_assert_num_queries(0):
+            user, token = autenticacion.TokenAuthenticationConRol().authenticate_credentials(key)
+            assert (user.pk, user.username, user.is_active) == (user_cliente.pk, user_cliente.username, True)
+            assert user.perfil.rol == 'cliente'
+            assert token.key == key and token.user is user
+        # El resto de los campos se carga si se usa
+        assert user.email == user_cliente.email
+
+    def test_no_cachea_con_cache_por_proceso(self, user_cliente):
+        # Con LocMemCache la versión incrementada en un worker no se ve en los demás
+        assert IDENTIDAD_CACHEABLE() is False
+        cliente = cliente_con_token(user_cliente)
+        with mock.patch.object(autenticacion, 'identidad_cacheable', IDENTIDAD_CACHEABLE):
+            queries_de(cliente)
+            _, sql = queries_de(cliente)
+
+        assert any('authtoken_token' in q for q in sql)
+
+    def test_token_invalido(self, api_client):
+        api_client.credentials(HTTP_AUTHORIZATION='Token ' + 'x' * 40)
+        assert api_client.get(URL).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.api
+class TestInvalidacion:
+    """Cambios de rol, desactivación y borrado del token se aplican de inmediato"""
+
+    def test_cambiar_rol(self, admin_client, user_cliente):
+        cliente = cliente_con_token(user_cliente)
+        assert cliente.get('/api/usuarios/').status_code == status.HTTP_403_FORBIDDEN
+
+        response = admin_client.patch(
+            f'/api/usuarios/{user_cliente.id}/cambiar-rol/', {'rol': 'admin'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert cliente.get('/api/usuarios/').status_code == status.HTTP_200_OK
+
+    def test_desactivar_usuario(self, user_cliente):
+        cliente = cliente_con_token(user_cliente)
+        assert cliente.get(URL).status_code == status.HTTP_200_OK
+
+        user_cliente.is_active = False
+        user_cliente.save()
+
+        assert cliente.get(URL).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_borrar_token(self, user_cliente):
+        cliente = cliente_con_token(user_cliente)
+        assert cliente.get(URL).status_code == status.HTTP_200_OK
+
+        Token.objects.filter(user=user_cliente).delete()
+
+        assert cliente.get(URL).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_otro_usuario_no_se_invalida(self, user_cliente, user_admin):
+        cliente = cliente_con_token(user_cliente)
+        queries_de(cliente)
+
+        user_admin.perfil.rol = 'cajero'
+        user_admin.perfil.save()
+
+        _, sql = queries_de(cliente)
+        assert not any('authtoken_token' in q for q in sql)
@@ -0,0 +1,423 @@
+"""
+Benchmarks de la API: queries y latencia por endpoint
+
+Siembra un restaurante de tamaño fijo con las factories y mide, para cada
+endpoint, el número de queries y la latencia p50/p95 de requests sin cache.
+Los resultados se comparan con benchmark_baseline.json (versionado junto
+a este archivo) y el test falla si algún endpoint empeora.
+
+- Queries: deben ser <= a las del baseline (deterministas, sin tolerancia).
+- Latencia: el p95 puede superar al del baseline hasta TOLERANCIA veces
+  (más HOLGURA_MS) para absorber la diferencia entre máquinas.
+
+Está pensado para SQLite (offline); los números del baseline se midieron así:
+    DATABASE_URL=sqlite:////tmp/bench.db pytest -m benchmark -s
+
+Las tablas de resultados solo se imprimen con -s (fixture 'reporte'). Las
+mediciones usan contar_queries() y cronometrar().
+
+Variables de entorno:
+    BENCHMARK_ACTUALIZAR=1    reescribe el baseline con la medición actual
+    BENCHMARK_TOLERANCIA=3    factor permitido sobre el p95 del baseline
+    BENCHMARK_SOLO_QUERIES=1  no compara latencias (máquinas muy lentas/CI compartido)
+"""
+
+import json
+import os
+import statistics
+import time as reloj
+from datetime import date, time, timedelta
+from pathlib import Path
+
+import pytest
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_init
+from encrypted_model_fields import fields as campos_encriptados
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from mainApp import lectura_rapida, permissions, serializers, views
+from mainApp.cifrado import CAMPOS_VISIBLES_POR_ROL, anotar_cifrados, descifrar_en_lote
+from mainApp.models import Reserva
+from mainApp.tests.factories import (
+    BloqueoMesaFactory, MesaFactory, ReservaFactory, UserFactory
+)
+
+
+BASELINE = Path(__file__).with_name('benchmark_baseline.json')
+
+# Tamaño del restaurante sembrado
+NUM_MESAS = 20
+NUM_CLIENTES = 25
+DIAS_CON_RESERVAS = 5
+HORAS_RESERVA = (time(12, 0), time(14, 0), time(16, 0), time(18, 0))  # 400 reservas
+NUM_BLOQUEOS = 10
+
+# Requests medidos por endpoint (además de uno de calentamiento)
+REPETICIONES = 20
+
+TOLERANCIA = float(os.environ.get('BENCHMARK_TOLERANCIA', '3'))
+HOLGURA_MS = 5.0
+
+
+def _celda(valor):
+    return f'{valor:.2f}' if isinstance(valor, float) else str(valor)
+
+
+@pytest.fixture
+def reporte(request):
+    """
+    reporte(encabezados, filas) imprime una tabla de resultados, solo con -s
+    (--capture=no). La primera columna se alinea a la izquierda.
+    """
+    def imprimir(encabezados, filas):
+        celdas = [list(encabezados)] + [[_celda(valor) for valor in fila] for fila in filas]
+        anchos = [max(len(fila[i]) for fila in celdas) for i in range(len(encabezados))]
+        print()
+        for fila in celdas:
+            print('  '.join([fila[0].ljust(anchos[0])] + [c.rjust(a) for c, a in zip(fila[1:], anchos[1:])]))
+
+    if request.config.getoption('capture') == 'no':
+        return imprimir
+    return lambda encabezados, filas: None
+
+
+def contar_queries(funcion):
+    """
+    Ejecuta funcion y retorna (resultado, queries ejecutadas).
+
+    execute_wrapper en vez de CaptureQueriesContext: el test client dispara
+    request_started, que vacía connection.queries_log a mitad de la medición.
+    """
+    queries = []
+    with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+        resultado = funcion()
+    return resultado, len(queries)
+
+
+def cronometrar(funcion, medir_tiempo=reloj.perf_counter):
+    """
+    Ejecuta funcion REPETICIONES veces y retorna la duración de cada una (ms).
+    La cache (respuestas e historial del throttling) se limpia antes de cada
+    ejecución. medir_tiempo=reloj.process_time mide solo CPU.
+    """
+    tiempos = []
+    for _ in range(REPETICIONES):
+        cache.clear()
+        t0 = medir_tiempo()
+        funcion()
+        tiempos.append((medir_tiempo() - t0) * 1000)
+    return tiempos
+
+
+def percentil(valores, p):
+    """Percentil por el método nearest-rank."""
+    ordenados = sorted(valores)
+    indice = max(0, -(-len(ordenados) * p // 100) - 1)
+    return ordenados[int(indice)]
+
+
+@pytest.fixture
+def restaurante(settings, user_admin):
+    """
+    Siembra mesas, clientes, reservas y bloqueos, y retorna la fecha con
+    reservas que consultan los endpoints de disponibilidad.
+    """
+    # PBKDF2 haría que sembrar usuarios domine el tiempo del test
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+    mesas = MesaFactory.create_batch(NUM_MESAS)
+    clientes = UserFactory.create_batch(NUM_CLIENTES)
+    for n, cliente in enumerate(clientes):
+        cliente.perfil.rut = f'{10000000 + n}-K'
+        cliente.perfil.telefono = f'+569{10000000 + n}'
+        cliente.perfil.save()
+    inicio = date.today() + timedelta(days=1)
+
+    n = 0
+    for dia in range(DIAS_CON_RESERVAS):
+        for mesa in mesas:
+            for hora in HORAS_RESERVA:
+                ReservaFactory(
+                    mesa=mesa, cliente=clientes[n % NUM_CLIENTES],
+                    fecha_reserva=inicio + timedelta(days=dia), hora_inicio=hora,
+                )
+                n += 1
+
+    # Bloqueos en días sin reservas (clean() impide bloquear mesas con reservas)
+    for i, mesa in enumerate(mesas[:NUM_BLOQUEOS]):
+        BloqueoMesaFactory(
+            mesa=mesa, usuario_creador=user_admin,
+            fecha_inicio=inicio + timedelta(days=DIAS_CON_RESERVAS + i),
+        )
+    return inicio
+
+
+def medir(cliente, url, params):
+    """
+    Ejecuta el endpoint sin cache y retorna queries y latencias (ms).
+
+    La cache se limpia antes de cada request: se mide el camino que llega a la
+    base de datos, que es el que empeora cuando hay regresiones.
+    """
+    cache.clear()
+    response = cliente.get(url, params)  # Calentamiento
+    assert response.status_code == 200, f'{url}: {response.status_code}'
+
+    cache.clear()
+    _, queries = contar_queries(lambda: cliente.get(url, params))
+    latencias = cronometrar(lambda: cliente.get(url, params))
+
+    return {
+        'queries': queries,
+        'p50_ms': round(statistics.median(latencias), 2),
+        'p95_ms': round(percentil(latencias, 95), 2),
+    }
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark
+class TestBenchmarkAPI:
+    """Regresiones de queries y latencia contra el baseline versionado"""
+
+    def test_endpoints_sin_regresiones(self, restaurante, user_admin, reporte):
+        if connection.vendor != 'sqlite':
+            pytest.skip('El baseline se mide sobre SQLite (DATABASE_URL=sqlite:///...)')
+
+        fecha = restaurante.isoformat()
+        admin = APIClient()
+        admin.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user_admin).key}')
+        anonimo = APIClient()
+
+        endpoints = {
+            'reservas': (admin, '/api/reservas/', {}),
+            'reservas_dia_campos': (admin, '/api/reservas/', {
+                'date': fecha, 'fields': 'id,hora_inicio,mesa_numero,cliente_nombre,estado'
+            }),
+            'horas_disponibles': (anonimo, '/api/horas-disponibles/', {'fecha': fecha, 'personas': 2}),
+            'consultar_mesas': (anonimo, '/api/consultar-mesas/', {'fecha': fecha, 'hora': '14:00'}),
+            'bloqueos': (admin, '/api/bloqueos/', {}),
+            'usuarios': (admin, '/api/usuarios/', {}),
+        }
+        actual = {nombre: medir(*args) for nombre, args in endpoints.items()}
+
+        reporte(
+            ('endpoint', 'queries', 'p50_ms', 'p95_ms'),
+            [(nombre, m['queries'], m['p50_ms'], m['p95_ms']) for nombre, m in actual.items()],
+        )
+
+        if os.environ.get('BENCHMARK_ACTUALIZAR') == '1':
+            BASELINE.write_text(json.dumps(actual, indent=2, sort_keys=True) + '\n')
+            pytest.skip(f'Baseline actualizado en {BASELINE.name}')
+
+        baseline = json.loads(BASELINE.read_text())
+        solo_queries = os.environ.get('BENCHMARK_SOLO_QUERIES') == '1'
+        regresiones = []
+        for nombre, m in actual.items():
+            base = baseline.get(nombre)
+            if base is None:
+                regresiones.append(f'{nombre}: sin baseline (ejecutar con BENCHMARK_ACTUALIZAR=1)')
+                continue
+            if m['queries'] > base['queries']:
+                regresiones.append(f"{nombre}: {m['queries']} queries (baseline {base['queries']})")
+            limite = base['p95_ms'] * TOLERANCIA + HOLGURA_MS
+            if not solo_queries and m['p95_ms'] > limite:
+                regresiones.append(f"{nombre}: p95 {m['p95_ms']} ms (límite {limite:.1f} ms)")
+
+        assert not regresiones, 'Regresiones de rendimiento:\n' + '\n'.join(regresiones)
+
+    def test_descifrado_por_pagina(self, restaurante, reporte):
+        """
+        CPU de descifrado de una página de reservas: cargar el perfil completo
+        (una operación Fernet por campo encriptado y fila) frente a anotar
+        solo los campos visibles y pedidos y descifrarlos en lote.
+        """
+        base = Reserva.objects.select_related('cliente__perfil', 'mesa').order_by('-fecha_reserva', '-hora_inicio')
+        tamano = 50
+
+        def cargar_completo():
+            list(base[:tamano])
+
+        def cargar_en_lote(campos):
+            descifrar_en_lote(list(anotar_cifrados(base, campos)[:tamano]))
+
+        casos = {
+            'sin lote': cargar_completo,
+            'lote': lambda: cargar_en_lote(CAMPOS_VISIBLES_POR_ROL['admin']),
+            'lote solo teléfono': lambda: cargar_en_lote(('telefono',)),  # ?fields= sin cliente_rut
+        }
+
+        medicion = {}
+        for nombre, cargar in casos.items():
+            with mock.patch.object(campos_encriptados, 'decrypt_str', wraps=campos_encriptados.decrypt_str) as espia:
+                cargar()
+            cpu = statistics.median(cronometrar(cargar, medir_tiempo=reloj.process_time))
+            medicion[nombre] = (espia.call_count, cpu)
+
+        completo = medicion['sin lote']
+        reporte(
+            (f'página de {tamano} reservas', 'descifrados', 'cpu_ms', 'ahorro_ms'),
+            [(nombre, descifrados, cpu_ms, completo[1] - cpu_ms)
+             for nombre, (descifrados, cpu_ms) in medicion.items()],
+        )
+
+        clientes_en_pagina = len({r.cliente_id for r in base[:tamano]})
+        assert completo[0] == 2 * tamano
+        assert medicion['lote'][0] <= 2 * clientes_en_pagina
+        assert medicion['lote solo teléfono'][0] <= clientes_en_pagina
+
+    def test_listados_desde_values(self, restaurante, user_admin, reporte):
+        """
+        Requests por segundo de los listados con el camino rápido (.values())
+        frente a los serializers (LISTADOS vacío), con las mismas respuestas.
+
+        Los requests por segundo solo se reportan: varían con la máquina. Se
+        verifica lo que los explica y es determinista: el camino rápido no
+        construye instancias de modelo por fila ni hace más queries.
+        """
+        admin = APIClient()
+        admin.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user_admin).key}')
+        listados = {
+            'mesas': '/api/mesas/',
+            'reservas': '/api/reservas/',
+            'bloqueos': '/api/bloqueos/',
+        }
+
+        def pedir(url):
+            # Sin cache: ni respuestas cacheadas ni el historial del throttling
+            cache.clear()
+            response = admin.get(url)
+            assert response.status_code == 200, f'{url}: {response.status_code}'
+            return response.content
+
+        def medir_listado(url):
+            instancias = []
+
+            def contar_instancia(sender, **kwargs):
+                instancias.append(sender)
+
+            pedir(url)  # Calentamiento
+            post_init.connect(contar_instancia, weak=False)
+            try:
+                contenido, queries = contar_queries(lambda: pedir(url))
+            finally:
+                post_init.disconnect(contar_instancia)
+            rps = REPETICIONES * 1000 / sum(cronometrar(lambda: admin.get(url)))
+            return {'contenido': contenido, 'queries': queries, 'instancias': len(instancias), 'rps': rps}
+
+        filas = []
+        for nombre, url in listados.items():
+            with mock.patch.dict(lectura_rapida.LISTADOS, clear=True):
+                serializer = medir_listado(url)
+            rapido = medir_listado(url)
+            filas.append((nombre, serializer['rps'], rapido['rps'], f"{rapido['rps'] / serializer['rps']:.2f}x",
+                          serializer['instancias'], rapido['instancias']))
+
+            assert rapido['contenido'] == serializer['contenido']
+            assert rapido['queries'] <= serializer['queries']
+            # Solo las instancias de la autenticación, no una por fila
+            assert rapido['instancias'] < serializer['instancias']
+
+        reporte(('listado', 'serializer_rps', 'values_rps', 'ganancia', 'serializer_inst', 'values_inst'), filas)
+
+    def test_permisos_por_request(self, restaurante, user_admin, reporte):
+        """
+        Overhead de resolver el rol en ReservaViewSet: resuelto en cada
+        chequeo (permisos, get_queryset, campos cifrados del serializer) como
+        antes de permissions.rol_de, frente a una vez por request.
+        """
+        user_admin.perfil.rol = 'cajero'
+        user_admin.perfil.save()
+        cajero = APIClient()
+        cajero.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user_admin).key}')
+        reserva = Reserva.objects.order_by('id').first()
+        requests = {
+            'detalle': lambda: cajero.get(f'/api/reservas/{reserva.id}/'),
+            'actualizar': lambda: cajero.patch(f'/api/reservas/{reserva.id}/', {'notas': 'x'}, format='json'),
+            'listado completo': lambda: cajero.get('/api/reservas/', {'vista': 'completa', 'page_size': 50}),
+        }
+
+        def sin_cache(request):
+            return permissions._resolver_rol(request.user)
+
+        def medir_rol(rol_de, hacer_request):
+            medicion = {'segundos': 0.0}
+
+            def cronometrado(request):
+                t0 = reloj.perf_counter()
+                try:
+                    return rol_de(request)
+                finally:
+                    medicion['segundos'] += reloj.perf_counter() - t0
+
+            def verificado():
+                response = hacer_request()
+                assert response.status_code == 200, response.status_code
+
+            with mock.patch.object(permissions, 'rol_de', cronometrado), \
+                    mock.patch.object(views, 'rol_de', cronometrado), \
+                    mock.patch.object(serializers, 'rol_de', cronometrado), \
+                    mock.patch.object(permissions, '_resolver_rol', wraps=permissions._resolver_rol) as resolver:
+                cronometrar(verificado)
+            return resolver.call_count / REPETICIONES, medicion['segundos'] * 1e6 / REPETICIONES
+
+        filas = []
+        for nombre, hacer_request in requests.items():
+            hacer_request()  # Calentamiento
+            antes = medir_rol(sin_cache, hacer_request)
+            despues = medir_rol(permissions.rol_de, hacer_request)
+            filas.append((nombre, int(antes[0]), antes[1], int(despues[0]), despues[1]))
+            # El overhead que se eliminó: cada request resolvía el rol en cada
+            # chequeo y ahora una sola vez (el tiempo solo se reporta)
+            assert despues[0] == 1
+            assert antes[0] > despues[0]
+
+        reporte(('request', 'antes_resol', 'antes_us', 'despues_resol', 'despues_us'), filas)
+
+    def test_guardado_sin_full_clean(self, restaurante, user_admin, reporte):
+        """
+        Queries de las transiciones internas de una reserva (cambio de estado,
+        soft delete, restore) con full_clean() en cada save, como antes, frente
+        a Reserva.save() validando solo lo que cambió.
+        """
+        admin = APIClient()
+        admin.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user_admin).key}')
+        pendientes = iter(Reserva.objects.filter(estado='pendiente').order_by('id'))
+        guardar = Reserva.save
+
+        def con_full_clean(reserva, *args, **kwargs):
+            return guardar(reserva, *args, validar=True, **kwargs)
+
+        # Cada operación prepara una reserva pendiente distinta y retorna la acción a medir
+        def cambiar_estado():
+            reserva = next(pendientes)
+            return lambda: admin.patch(f'/api/reservas/{reserva.id}/cambiar_estado/', {'estado': 'activa'}, format='json')
+
+        def eliminar():
+            reserva = next(pendientes)
+            return lambda: admin.delete(f'/api/reservas/{reserva.id}/')
+
+        def restaurar():
+            reserva = next(pendientes)
+            reserva.delete()
+            return reserva.restore
+
+        operaciones = {'cambiar_estado': cambiar_estado, 'eliminar': eliminar, 'restore': restaurar}
+
+        def contar(preparar):
+            ejecutar = preparar()
+            cache.clear()  # Historial del throttling
+            respuesta, queries = contar_queries(ejecutar)
+            assert getattr(respuesta, 'status_code', 200) < 300
+            return queries
+
+        filas = []
+        for nombre, preparar in operaciones.items():
+            with mock.patch.object(Reserva, 'save', con_full_clean):
+                antes = contar(preparar)
+            despues = contar(preparar)
+            filas.append((nombre, antes, despues))
+            assert despues < antes
+
+        reporte(('operación', 'antes', 'después'), filas)
@@ -0,0 +1,110 @@
+"""
+Tests para la búsqueda de reservas por cliente (mainApp/busqueda.py)
+"""
+
+import pytest
+from datetime import date, timedelta
+from django.db import connection
+from rest_framework import status
+from mainApp.busqueda import documento_busqueda, normalizar
+from mainApp.models import Perfil, Reserva
+from mainApp.tests.factories import ReservaFactory, UserFactory
+
+
+def buscar(cliente, texto, **params):
+    response = cliente.get('/api/reservas/', {'search': texto, **params})
+    assert response.status_code == status.HTTP_200_OK
+    return {r['id'] for r in response.json()['results']}
+
+
+@pytest.mark.unit
+class TestDocumentoBusqueda:
+    """Normalización y mantenimiento de Perfil.busqueda"""
+
+    def test_normalizar(self):
+        assert normalizar('  José   PÉREZ\tÑuñoa ') == 'jose perez nunoa'
+        assert normalizar(None) == ''
+
+    def test_documento_incluye_user_y_perfil(self):
+        usuario = UserFactory(username='jperez', first_name='José', last_name='Pérez',
+                              email='jose@test.com')
+        usuario.perfil.nombre_completo = 'José Pérez Soto'
+        usuario.perfil.save()
+
+        perfil = Perfil.objects.get(user=usuario)
+        assert perfil.busqueda == 'jperez jose perez jose@test.com jose perez soto'
+        assert perfil.busqueda == documento_busqueda(usuario, perfil)
+
+    def test_se_actualiza_al_guardar_el_user(self):
+        usuario = UserFactory(username='bsoto', first_name='Ana', last_name='Soto', email='bsoto@test.com')
+        usuario.first_name = 'Beatriz'
+        usuario.save()
+
+        assert Perfil.objects.get(user=usuario).busqueda == 'bsoto beatriz soto bsoto@test.com'
+
+    def test_update_fields_incluye_busqueda(self):
+        usuario = UserFactory()
+        perfil = Perfil.objects.get(user=usuario)
+        perfil.nombre_completo = 'Nombre Nuevo'
+        perfil.save(update_fields=['nombre_completo'])
+
+        assert 'nombre nuevo' in Perfil.objects.get(user=usuario).busqueda
+
+
+@pytest.mark.api
+class TestBusquedaReservas:
+    """?search= en /api/reservas/"""
+
+    def test_busca_en_todo_el_historial(self, admin_client):
+        """Sin ventana de 7 días: las reservas antiguas también aparecen"""
+        usuario = UserFactory(first_name='Juan', last_name='Pérez')
+        antigua = ReservaFactory(cliente=usuario)
+        Reserva.objects.filter(id=antigua.id).update(fecha_reserva=date.today() - timedelta(days=400))
+        futura = ReservaFactory(cliente=usuario)
+
+        assert buscar(admin_client, 'juan') == {antigua.id, futura.id}
+
+    def test_sin_distinguir_tildes_ni_mayusculas(self, admin_client):
+        reserva = ReservaFactory(cliente=UserFactory(last_name='Pérez'))
+
+        assert reserva.id in buscar(admin_client, 'PEREZ')
+        assert reserva.id in buscar(admin_client, 'pérez')
+
+    def test_todos_los_terminos(self, admin_client):
+        juan_perez = ReservaFactory(cliente=UserFactory(first_name='Juan', last_name='Pérez'))
+        juan_soto = ReservaFactory(cliente=UserFactory(first_name='Juan', last_name='Soto'))
+
+        assert buscar(admin_client, 'juan perez') == {juan_perez.id}
+        assert buscar(admin_client, 'juan') == {juan_perez.id, juan_soto.id}
+
+    def test_por_email_y_nombre_completo(self, admin_client):
+        usuario = UserFactory(email='cliente.frecuente@example.com')
+        usuario.perfil.nombre_completo = 'Carla Muñoz'
+        usuario.perfil.save()
+        reserva = ReservaFactory(cliente=usuario)
+
+        assert buscar(admin_client, '@example.com') >= {reserva.id}
+        assert buscar(admin_client, 'munoz') == {reserva.id}
+
+    def test_combina_con_fecha(self, admin_client):
+        usuario = UserFactory(first_name='Juan')
+        hoy = ReservaFactory(cliente=usuario, fecha_reserva=date.today() + timedelta(days=1))
+        ReservaFactory(cliente=usuario, fecha_reserva=date.today() + timedelta(days=2))
+
+        assert buscar(admin_client, 'juan', fecha_reserva=hoy.fecha_reserva.isoformat()) == {hoy.id}
+
+    def test_cliente_solo_busca_en_sus_reservas(self, authenticated_client):
+        propia = ReservaFactory(cliente=authenticated_client.user)
+        ReservaFactory(cliente=UserFactory(first_name=authenticated_client.user.first_name))
+
+        assert buscar(authenticated_client, authenticated_client.user.first_name) == {propia.id}
+
+    def test_filtra_por_la_columna_desnormalizada(self, admin_client):
+        ReservaFactory()
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            buscar(admin_client, 'juan')
+
+        sql = next(q for q in queries if 'LIKE' in q.upper())
+        assert '"busqueda"' in sql
+        assert '"first_name" LIKE' not in sql
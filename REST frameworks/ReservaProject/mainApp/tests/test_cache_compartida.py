@@ -0,0 +1,97 @@
+"""
+Tests de la cache compartida entre procesos (CACHE_URL).
+
+Cada "worker" es un proceso Python independiente con su propio django.setup(),
+igual que los workers de gunicorn, apuntando al mismo almacén local.
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from django.conf import settings
+
+
+WORKER = textwrap.dedent('''
+    import json, sys
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import AnonymousUser
+    from rest_framework.test import APIRequestFactory
+    from mainApp import cache_disponibilidad
+    from mainApp.views import LoginRateThrottle
+
+    accion = sys.argv[1]
+    resultado = {'backend': settings.CACHES['default']['BACKEND']}
+
+    if accion == 'login':
+        request = APIRequestFactory().post('/api/login/', REMOTE_ADDR='10.0.0.1')
+        request.user = AnonymousUser()
+        permitidos = 0
+        for _ in range(int(sys.argv[2])):
+            if LoginRateThrottle().allow_request(request, None):
+                permitidos += 1
+        resultado['permitidos'] = permitidos
+    elif accion == 'version':
+        resultado['version'] = cache_disponibilidad.obtener_versiones(['fecha:2030-01-01'])['fecha:2030-01-01']
+    elif accion == 'invalidar':
+        cache_disponibilidad.invalidar('fecha:2030-01-01')
+
+    print(json.dumps(resultado))
+''')
+
+
+def ejecutar_worker(cache_url, *args):
+    env = dict(os.environ)
+    env.update({
+        'DJANGO_SETTINGS_MODULE': 'ReservaProject.settings',
+        'DATABASE_URL': 'sqlite:///:memory:',
+        'CACHE_URL': cache_url,
+    })
+    salida = subprocess.run(
+        [sys.executable, '-c', WORKER, *args],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.integration
+@pytest.mark.slow
+class TestCacheCompartida:
+    """Dos procesos con CACHE_URL=file:// comparten throttling y versiones"""
+
+    @pytest.fixture
+    def cache_url(self, tmp_path):
+        return f'file://{tmp_path}'
+
+    def test_backend_desde_cache_url(self, cache_url):
+        resultado = ejecutar_worker(cache_url, 'ninguna')
+        assert resultado['backend'] == 'django.core.cache.backends.filebased.FileBasedCache'
+
+    def test_throttle_login_compartido(self, cache_url):
+        # login: 10/hour. Entre los dos workers no pueden pasar más de 10
+        primero = ejecutar_worker(cache_url, 'login', '6')
+        segundo = ejecutar_worker(cache_url, 'login', '6')
+
+        assert primero['permitidos'] == 6
+        assert segundo['permitidos'] == 4
+
+    def test_throttle_con_memoria_local_no_se_comparte(self):
+        # Referencia: con LocMemCache cada worker tiene su propio contador
+        primero = ejecutar_worker('locmem://', 'login', '6')
+        segundo = ejecutar_worker('locmem://', 'login', '6')
+
+        assert primero['permitidos'] == 6
+        assert segundo['permitidos'] == 6
+
+    def test_invalidacion_visible_en_otro_worker(self, cache_url):
+        antes = ejecutar_worker(cache_url, 'version')['version']
+        ejecutar_worker(cache_url, 'invalidar')
+        despues = ejecutar_worker(cache_url, 'version')['version']
+
+        assert despues != antes
+        # Sin escrituras la versión se mantiene entre procesos
+        assert ejecutar_worker(cache_url, 'version')['version'] == despues
@@ -0,0 +1,87 @@
+"""
+Tests para el listado compacto y ?fields= de /api/reservas/
+"""
+
+import pytest
+from unittest import mock
+from datetime import date, timedelta
+from encrypted_model_fields import fields as campos_encriptados
+from rest_framework import status
+from mainApp.serializers import ReservaResumenSerializer
+from mainApp.tests.factories import MesaFactory, ReservaFactory
+
+
+URL = '/api/reservas/'
+
+
+@pytest.fixture
+def reservas(user_cliente):
+    return [ReservaFactory(cliente=user_cliente, mesa=mesa) for mesa in MesaFactory.create_batch(5)]
+
+
+@pytest.mark.api
+class TestListadoCompacto:
+    """Serializer compacto por defecto en el listado"""
+
+    def test_listado_usa_el_serializer_compacto(self, admin_client, reservas):
+        resultado = admin_client.get(URL).json()['results'][0]
+
+        assert set(resultado) == set(ReservaResumenSerializer.Meta.fields)
+        assert 'mesa_info' not in resultado
+        assert resultado['cliente_rut'] == '12345678-5'
+
+    def test_vista_completa(self, admin_client, reservas):
+        resultado = admin_client.get(URL, {'vista': 'completa'}).json()['results'][0]
+
+        assert resultado['mesa_info']['numero'] == resultado['mesa_numero']
+        assert 'estado_display' in resultado
+
+    def test_detalle_completo(self, admin_client, reservas):
+        resultado = admin_client.get(f'{URL}{reservas[0].id}/').json()
+        assert 'mesa_info' in resultado
+
+    def test_payload_mas_chico(self, admin_client, reservas):
+        compacto = admin_client.get(URL).content
+        completo = admin_client.get(URL, {'vista': 'completa'}).content
+        assert len(compacto) < len(completo) * 0.7
+
+
+@pytest.mark.api
+class TestCamposDinamicos:
+    """?fields= (sparse fieldsets)"""
+
+    def test_solo_los_campos_pedidos(self, admin_client, reservas):
+        response = admin_client.get(URL, {'fields': 'id, estado,mesa_numero,no_existe'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert all(set(r) == {'id', 'estado', 'mesa_numero'} for r in response.json()['results'])
+        assert 'count' in response.json()
+
+    def test_puede_pedir_campos_de_la_vista_completa(self, admin_client, reservas):
+        resultado = admin_client.get(URL, {'fields': 'id,mesa_info'}).json()['results'][0]
+        assert set(resultado) == {'id', 'mesa_info'}
+
+    def test_en_el_detalle(self, admin_client, reservas):
+        resultado = admin_client.get(f'{URL}{reservas[0].id}/', {'fields': 'id,hora_inicio'}).json()
+        assert resultado == {'id': reservas[0].id, 'hora_inicio': reservas[0].hora_inicio.strftime('%H:%M:%S')}
+
+    def test_sin_campos_cifrados_no_descifra(self, admin_client, reservas):
+        with mock.patch.object(campos_encriptados, 'decrypt_str', wraps=campos_encriptados.decrypt_str) as espia:
+            admin_client.get(URL, {'fields': 'id,cliente_nombre', 'all': 'true'})
+        antes = espia.call_count
+
+        with mock.patch.object(campos_encriptados, 'decrypt_str', wraps=campos_encriptados.decrypt_str) as espia:
+            admin_client.get(URL, {'fields': 'id,cliente_telefono', 'all': 'true'})
+
+        # Con cliente_telefono se descifra además el teléfono del (único) cliente
+        assert espia.call_count == antes + 1
+
+    def test_escrituras_ignoran_fields(self, authenticated_client, mesa_disponible):
+        response = authenticated_client.post(f'{URL}?fields=id', {
+            'mesa': mesa_disponible.id,
+            'fecha_reserva': (date.today() + timedelta(days=3)).isoformat(),
+            'hora_inicio': '13:00', 'num_personas': 2,
+        }, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert 'mesa_info' in response.json()
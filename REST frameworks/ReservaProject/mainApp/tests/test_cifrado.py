@@ -0,0 +1,111 @@
+"""
+Tests para el descifrado por rol y en lote de RUT/teléfono (mainApp/cifrado.py)
+"""
+
+import pytest
+from datetime import time
+from unittest import mock
+from encrypted_model_fields import fields as campos_encriptados
+from rest_framework import status
+from rest_framework.test import APIClient
+from mainApp.serializers import ReservaSerializer
+from mainApp.tests.factories import MesaFactory, ReservaFactory, UserFactory
+
+
+@pytest.fixture
+def contar_descifrados():
+    """Cuenta las operaciones Fernet de descifrado."""
+    with mock.patch.object(campos_encriptados, 'decrypt_str', wraps=campos_encriptados.decrypt_str) as espia:
+        yield espia
+
+
+@pytest.fixture
+def pagina(user_admin):
+    """12 reservas de 3 clientes con RUT y teléfono."""
+    clientes = []
+    for i, rut in enumerate(['44444444-4', '55555555-5', '66666666-6']):
+        usuario = UserFactory()
+        usuario.perfil.rut = rut
+        usuario.perfil.telefono = f'+5691234567{i}'
+        usuario.perfil.save()
+        clientes.append(usuario)
+    mesas = MesaFactory.create_batch(4)
+    return [
+        ReservaFactory(cliente=cliente, mesa=mesa, hora_inicio=hora)
+        for cliente, hora in zip(clientes, (time(12, 0), time(14, 0), time(16, 0))) for mesa in mesas
+    ]
+
+
+def cliente_con_rol(user_admin, rol):
+    user_admin.perfil.rol = rol
+    user_admin.perfil.save()
+    cliente = APIClient()
+    cliente.force_authenticate(user=user_admin)
+    return cliente
+
+
+@pytest.mark.api
+class TestDescifradoPorRol:
+    """Solo se descifran los campos que el rol puede ver y que se piden"""
+
+    def test_admin_ve_todo_y_descifra_una_vez_por_cliente(self, admin_client, pagina, contar_descifrados):
+        response = admin_client.get('/api/reservas/', {'all': 'true'})
+
+        assert response.status_code == status.HTTP_200_OK
+        resultados = {r['id']: r for r in response.json()['results']}
+        for reserva in pagina:
+            assert resultados[reserva.id]['cliente_rut'] == reserva.cliente.perfil.rut
+            assert resultados[reserva.id]['cliente_telefono'] == reserva.cliente.perfil.telefono
+        # 12 filas x 2 campos = 24 sin lote; 3 clientes x 2 campos con lote
+        assert contar_descifrados.call_count == 6
+
+    @pytest.mark.parametrize('rol', ['cajero', 'mesero'])
+    def test_personal_ve_rut_y_telefono(self, user_admin, pagina, rol):
+        cliente = cliente_con_rol(user_admin, rol)
+
+        resultados = {r['id']: r for r in cliente.get('/api/reservas/', {'all': 'true'}).json()['results']}
+
+        for reserva in pagina:
+            assert resultados[reserva.id]['cliente_rut'] == reserva.cliente.perfil.rut
+            assert resultados[reserva.id]['cliente_telefono'] == reserva.cliente.perfil.telefono
+
+    def test_campos_no_pedidos_no_se_descifran(self, user_admin, pagina, contar_descifrados):
+        cliente = cliente_con_rol(user_admin, 'mesero')
+        contar_descifrados.reset_mock()  # Guardar el perfil también descifra
+
+        response = cliente.get('/api/reservas/', {'all': 'true', 'fields': 'id,cliente_telefono'})
+
+        resultados = response.json()['results']
+        assert {r['cliente_telefono'] for r in resultados} == {
+            reserva.cliente.perfil.telefono for reserva in pagina
+        }
+        assert contar_descifrados.call_count == 3
+
+    def test_retrieve(self, user_admin, pagina, contar_descifrados):
+        reserva = pagina[0]
+        cliente = cliente_con_rol(user_admin, 'mesero')
+        contar_descifrados.reset_mock()
+
+        data = cliente.get(f'/api/reservas/{reserva.id}/').json()
+
+        assert data['cliente_rut'] == reserva.cliente.perfil.rut
+        assert data['cliente_telefono'] == reserva.cliente.perfil.telefono
+        assert contar_descifrados.call_count == 2
+
+    def test_cliente_ve_sus_datos(self, authenticated_client, user_cliente):
+        ReservaFactory(cliente=user_cliente)
+
+        resultado = authenticated_client.get('/api/reservas/').json()['results'][0]
+
+        assert resultado['cliente_rut'] == '12345678-5'
+        assert resultado['cliente_telefono'] == '+56912345678'
+
+    def test_sin_queries_por_fila(self, admin_client, pagina, django_assert_max_num_queries):
+        # Los campos diferidos del perfil no se cargan uno por uno al serializar
+        with django_assert_max_num_queries(4):
+            admin_client.get('/api/reservas/', {'all': 'true'})
+
+    def test_sin_request_muestra_todo(self, pagina):
+        reserva = pagina[0]
+        data = ReservaSerializer(reserva).data
+        assert data['cliente_rut'] == reserva.cliente.perfil.rut
@@ -0,0 +1,454 @@
+"""
+Tests para el motor de disponibilidad (mainApp/disponibilidad.py)
+
+Verifican que el cálculo en memoria coincida con la consulta por franja
+original y que el número de queries sea constante.
+"""
+
+import json
+import pytest
+from django.conf import settings
+from io import StringIO
+from unittest import mock
+from datetime import date, time, timedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from mainApp.models import Mesa, Reserva, BloqueoMesa, OcupacionSlot
+from mainApp import cache_disponibilidad
+from mainApp.disponibilidad import (
+    generar_horarios, calcular_hora_fin, contar_mesas_libres,
+    disponibilidad_del_dia, disponibilidad_rango, franjas_de_reserva,
+    mesas_no_disponibles_ids
+)
+from mainApp.tests.factories import MesaFactory, ReservaFactory
+
+
+def horas_disponibles_por_franja(fecha, num_personas):
+    """
+    Implementación de referencia: 3 queries por franja (algoritmo anterior
+    de ConsultarHorasDisponiblesView). Se usa para comparar resultados y
+    cantidad de queries.
+    """
+    mesas_suficientes = Mesa.objects.filter(capacidad__gte=num_personas)
+    resultado = []
+    for hora_inicio in generar_horarios():
+        hora_fin = calcular_hora_fin(hora_inicio)
+        mesas_ocupadas_ids = Reserva.objects.filter(
+            fecha_reserva=fecha,
+            estado__in=['pendiente', 'activa'],
+        ).filter(
+            Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio)
+        ).values_list('mesa_id', flat=True)
+        mesas_bloqueadas_ids = BloqueoMesa.objects.filter(
+            activo=True,
+            fecha_inicio__lte=fecha,
+            fecha_fin__gte=fecha
+        ).filter(
+            Q(hora_inicio__isnull=True) |
+            (Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio))
+        ).values_list('mesa_id', flat=True)
+        excluidas = list(mesas_ocupadas_ids) + list(mesas_bloqueadas_ids)
+        resultado.append(mesas_suficientes.exclude(id__in=excluidas).count())
+    return resultado
+
+
+@pytest.fixture
+def dia_con_ocupacion(user_cliente, user_admin):
+    """Día con reservas solapadas, bloqueos parciales y de día completo."""
+    fecha = date.today() + timedelta(days=2)
+    mesas = [MesaFactory(capacidad=capacidad) for capacidad in (2, 4, 4, 6, 8)]
+
+    ReservaFactory(cliente=user_cliente, mesa=mesas[0], fecha_reserva=fecha, hora_inicio=time(12, 0))
+    ReservaFactory(cliente=user_cliente, mesa=mesas[0], fecha_reserva=fecha, hora_inicio=time(15, 0))
+    ReservaFactory(cliente=user_cliente, mesa=mesas[1], fecha_reserva=fecha, hora_inicio=time(13, 30))
+    ReservaFactory(cliente=user_cliente, mesa=mesas[1], fecha_reserva=fecha, hora_inicio=time(19, 0),
+                   estado='activa')
+    # Estados que NO ocupan la mesa
+    ReservaFactory(cliente=user_cliente, mesa=mesas[2], fecha_reserva=fecha, hora_inicio=time(14, 0),
+                   estado='completada')
+    ReservaFactory(cliente=user_cliente, mesa=mesas[2], fecha_reserva=fecha, hora_inicio=time(18, 0),
+                   estado='cancelada')
+
+    BloqueoMesa.objects.create(
+        mesa=mesas[3], fecha_inicio=fecha, fecha_fin=fecha,
+        hora_inicio=time(16, 0), hora_fin=time(17, 30),
+        motivo='Mantenimiento', usuario_creador=user_admin
+    )
+    BloqueoMesa.objects.create(
+        mesa=mesas[4], fecha_inicio=fecha - timedelta(days=1), fecha_fin=fecha + timedelta(days=1),
+        motivo='Evento privado', usuario_creador=user_admin
+    )
+    return fecha
+
+
+@pytest.mark.unit
+class TestContarMesasLibres:
+    """Tests del barrido de intervalos"""
+
+    def test_sin_ocupacion_todas_libres(self):
+        libres = contar_mesas_libres([1, 2, 3], [], [])
+        assert libres == [3] * len(generar_horarios())
+
+    def test_reserva_descuenta_franjas_solapadas(self):
+        horarios = generar_horarios()
+        libres = contar_mesas_libres([1, 2], [(1, time(14, 0), time(16, 0))], [])
+
+        for hora, cantidad in zip(horarios, libres):
+            # Franja [h, h+2) se solapa con [14:00, 16:00) si 12:00 < h < 16:00
+            esperado = 1 if time(12, 0) < hora < time(16, 0) else 2
+            assert cantidad == esperado, hora
+
+    def test_misma_mesa_no_se_descuenta_dos_veces(self):
+        """Dos reservas de la misma mesa que caen en la misma franja cuentan una vez"""
+        reservas = [(1, time(12, 0), time(14, 0)), (1, time(14, 30), time(16, 30))]
+        libres = contar_mesas_libres([1, 2], reservas, [])
+        assert min(libres) == 1
+
+    def test_bloqueo_dia_completo(self):
+        libres = contar_mesas_libres([1, 2], [], [(2, None, None)])
+        assert libres == [1] * len(generar_horarios())
+
+    def test_ignora_mesas_sin_capacidad(self):
+        libres = contar_mesas_libres([1], [(99, time(14, 0), time(16, 0))], [(99, None, None)])
+        assert libres == [1] * len(generar_horarios())
+
+
+@pytest.mark.api
+class TestHorasDisponiblesView:
+    """Tests de equivalencia y número de queries de /api/horas-disponibles/"""
+
+    @pytest.mark.parametrize('personas', [1, 3, 5, 7, 9])
+    def test_coincide_con_calculo_por_franja(self, dia_con_ocupacion, personas):
+        esperado = horas_disponibles_por_franja(dia_con_ocupacion, personas)
+        if not Mesa.objects.filter(capacidad__gte=personas).exists():
+            assert disponibilidad_del_dia(dia_con_ocupacion, personas) is None
+        else:
+            assert disponibilidad_del_dia(dia_con_ocupacion, personas) == esperado
+
+    def test_respuesta_compatible(self, api_client, dia_con_ocupacion):
+        response = api_client.get('/api/horas-disponibles/', {
+            'fecha': dia_con_ocupacion.isoformat(), 'personas': 2
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        esperado = horas_disponibles_por_franja(dia_con_ocupacion, 2)
+        assert [h['mesas_disponibles'] for h in data['horas']] == esperado
+        assert data['horas_disponibles'] == [
+            h['hora'] for h in data['horas'] if h['mesas_disponibles'] > 0
+        ]
+        assert data['horas_no_disponibles'] == [
+            h['hora'] for h in data['horas'] if h['mesas_disponibles'] == 0
+        ]
+        assert data['total_horas'] == 20
+
+    def test_sin_mesas_con_capacidad(self, api_client, dia_con_ocupacion):
+        response = api_client.get('/api/horas-disponibles/', {
+            'fecha': dia_con_ocupacion.isoformat(), 'personas': 20
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data['horas_disponibles'] == []
+        assert len(data['horas_no_disponibles']) == 20
+        assert 'mensaje' in data
+
+    @pytest.mark.slow
+    def test_benchmark_queries_constantes(self, dia_con_ocupacion):
+        """El cálculo por franja hace O(franjas) queries; el motor, O(1)"""
+        with CaptureQueriesContext(connection) as por_franja:
+            horas_disponibles_por_franja(dia_con_ocupacion, 2)
+        with CaptureQueriesContext(connection) as barrido:
+            disponibilidad_del_dia(dia_con_ocupacion, 2)
+
+        assert len(por_franja) >= 3 * len(generar_horarios())
+        assert len(barrido) == 3
+
+    def test_consultar_mesas_excluye_ocupadas_y_bloqueadas(self, api_client, dia_con_ocupacion):
+        """ConsultaMesasView aplica la misma regla de solapamiento"""
+        response = api_client.get('/api/consultar-mesas/', {
+            'fecha': dia_con_ocupacion.isoformat(), 'hora': '16:00'
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        indice = generar_horarios().index(time(16, 0))
+        esperado = horas_disponibles_por_franja(dia_con_ocupacion, 1)[indice]
+        assert len(response.json()) == esperado
+
+    def test_mesas_no_disponibles_desde_ocupacion_slot(self, dia_con_ocupacion):
+        """Las franjas ofrecidas leen OcupacionSlot; otros horarios, Reserva"""
+        tabla_reservas = f'"{Reserva._meta.db_table}"'
+        por_franja = horas_disponibles_por_franja(dia_con_ocupacion, 1)
+        total = Mesa.objects.count()
+
+        for indice, hora in enumerate(generar_horarios()):
+            with CaptureQueriesContext(connection) as queries:
+                ids = set(mesas_no_disponibles_ids(dia_con_ocupacion, hora))
+            assert total - len(ids) == por_franja[indice]
+            assert not any(tabla_reservas in q['sql'] for q in queries)
+
+        # Fuera de las franjas ofrecidas: la regla de solapamiento sobre Reserva
+        with CaptureQueriesContext(connection) as queries:
+            fuera = set(mesas_no_disponibles_ids(dia_con_ocupacion, time(13, 15)))
+        assert any(tabla_reservas in q['sql'] for q in queries)
+        assert fuera == {
+            reserva.mesa_id for reserva in Reserva.objects.filter(fecha_reserva=dia_con_ocupacion)
+            if reserva.estado in ('pendiente', 'activa')
+            and reserva.hora_inicio < time(15, 15) and reserva.hora_fin > time(13, 15)
+        } | set(BloqueoMesa.objects.filter(hora_inicio__isnull=True).values_list('mesa_id', flat=True))
+
+
+@pytest.mark.api
+class TestDisponibilidadRangoView:
+    """Tests de /api/disponibilidad-rango/"""
+
+    def _get(self, api_client, **params):
+        response = api_client.get('/api/disponibilidad-rango/', params)
+        if response.status_code != status.HTTP_200_OK:
+            return response, None
+        return response, json.loads(b''.join(response.streaming_content))
+
+    def test_coincide_con_consulta_por_dia(self, api_client, dia_con_ocupacion):
+        desde = dia_con_ocupacion - timedelta(days=1)
+        hasta = dia_con_ocupacion + timedelta(days=2)
+
+        response, data = self._get(
+            api_client, desde=desde.isoformat(), hasta=hasta.isoformat(), personas=2
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/json'
+        assert [d['fecha'] for d in data['dias']] == [
+            (desde + timedelta(days=n)).isoformat() for n in range(4)
+        ]
+        for dia in data['dias']:
+            fecha = date.fromisoformat(dia['fecha'])
+            assert [h['mesas_disponibles'] for h in dia['horas']] == \
+                horas_disponibles_por_franja(fecha, 2)
+
+    def test_queries_constantes_en_el_rango(self, dia_con_ocupacion):
+        desde = dia_con_ocupacion - timedelta(days=30)
+        hasta = dia_con_ocupacion + timedelta(days=59)
+
+        with CaptureQueriesContext(connection) as queries:
+            dias = list(disponibilidad_rango(desde, hasta, 2))
+
+        assert len(dias) == 90
+        assert len(queries) == 3
+
+    def test_sin_mesas_con_capacidad(self, api_client, dia_con_ocupacion):
+        response, data = self._get(
+            api_client, desde=dia_con_ocupacion.isoformat(),
+            hasta=dia_con_ocupacion.isoformat(), personas=20
+        )
+
+        assert data['dias'][0]['disponibles'] == 0
+
+    def test_error_de_base_de_datos_no_responde_200(self, dia_con_ocupacion):
+        def falla_a_mitad(*args, **kwargs):
+            yield dia_con_ocupacion, [1] * len(generar_horarios())
+            raise DatabaseError('conexión perdida')
+
+        cliente = APIClient(raise_request_exception=False)
+        with mock.patch('mainApp.views.disponibilidad_rango', falla_a_mitad):
+            response = cliente.get('/api/disponibilidad-rango/', {
+                'desde': dia_con_ocupacion.isoformat(),
+                'hasta': (dia_con_ocupacion + timedelta(days=1)).isoformat(),
+            })
+
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    @pytest.mark.parametrize('params', [
+        {'desde': '2025-01-01'},
+        {'desde': '2025-01-10', 'hasta': '2025-01-01'},
+        {'desde': '2025-01-01', 'hasta': '2025-06-01'},
+        {'desde': '01-01-2025', 'hasta': '2025-01-02'},
+    ])
+    def test_parametros_invalidos(self, api_client, params):
+        response = api_client.get('/api/disponibilidad-rango/', params)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.models
+class TestOcupacionSlot:
+    """Tests de la ocupación materializada por franja"""
+
+    def _slots(self, reserva):
+        return sorted(OcupacionSlot.objects.filter(reserva=reserva).values_list('slot', flat=True))
+
+    def test_crear_reserva_marca_franjas(self, reserva_valida):
+        # 14:00-16:00 bloquea las franjas que empiezan entre 12:30 y 15:30
+        assert self._slots(reserva_valida) == [
+            time(12, 30), time(13, 0), time(13, 30), time(14, 0),
+            time(14, 30), time(15, 0), time(15, 30)
+        ]
+        assert self._slots(reserva_valida) == franjas_de_reserva(time(14, 0), time(16, 0))
+
+    def test_cambiar_hora_mueve_franjas(self, reserva_valida):
+        reserva_valida.hora_inicio = time(19, 0)
+        reserva_valida.save()
+
+        assert self._slots(reserva_valida) == franjas_de_reserva(time(19, 0), time(21, 0))
+
+    def test_cancelar_y_soft_delete_liberan_franjas(self, reserva_valida):
+        reserva_valida.delete()
+        assert self._slots(reserva_valida) == []
+
+        reserva_valida.restore()
+        assert len(self._slots(reserva_valida)) == 7
+
+        reserva_valida.estado = 'cancelada'
+        reserva_valida.save()
+        assert self._slots(reserva_valida) == []
+
+    def test_cambiar_estado_api_actualiza_ocupacion(self, admin_client, reserva_valida):
+        response = admin_client.patch(
+            f'/api/reservas/{reserva_valida.id}/cambiar_estado/',
+            {'estado': 'cancelada'},
+            format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert self._slots(reserva_valida) == []
+
+    def test_comando_reconstruye_y_verifica(self, dia_con_ocupacion):
+        esperado = horas_disponibles_por_franja(dia_con_ocupacion, 1)
+        OcupacionSlot.objects.all().delete()
+
+        with pytest.raises(CommandError):
+            call_command('reconstruir_ocupacion', '--solo-verificar', stdout=StringIO())
+
+        call_command('reconstruir_ocupacion', stdout=StringIO())
+
+        assert disponibilidad_del_dia(dia_con_ocupacion, 1) == esperado
+        call_command('reconstruir_ocupacion', '--solo-verificar', stdout=StringIO())
+
+
+@pytest.mark.api
+class TestCacheDisponibilidad:
+    """Tests de la cache versionada de disponibilidad"""
+
+    def _horas(self, api_client, fecha, personas=2):
+        response = api_client.get('/api/horas-disponibles/', {
+            'fecha': fecha.isoformat(), 'personas': personas
+        })
+        assert response.status_code == status.HTTP_200_OK
+        return [h['mesas_disponibles'] for h in response.json()['horas']]
+
+    def test_acierto_sin_queries(self, api_client, dia_con_ocupacion, django_assert_num_queries):
+        primera = self._horas(api_client, dia_con_ocupacion)
+
+        with django_assert_num_queries(0):
+            segunda = self._horas(api_client, dia_con_ocupacion)
+
+        assert primera == segunda
+        assert cache_disponibilidad.estadisticas()['hits'] == 1
+
+    def test_consultar_mesas_acierto_sin_queries(self, api_client, dia_con_ocupacion, django_assert_num_queries):
+        params = {'fecha': dia_con_ocupacion.isoformat(), 'hora': '14:00'}
+        primera = api_client.get('/api/consultar-mesas/', params).json()
+
+        with django_assert_num_queries(0):
+            segunda = api_client.get('/api/consultar-mesas/', params).json()
+
+        assert primera == segunda
+
+    def test_reserva_invalida_su_fecha(self, api_client, user_cliente, dia_con_ocupacion):
+        antes = self._horas(api_client, dia_con_ocupacion)
+
+        mesa = Mesa.objects.get(capacidad=6)
+        reserva = ReservaFactory(cliente=user_cliente, mesa=mesa, fecha_reserva=dia_con_ocupacion,
+                                 hora_inicio=time(12, 0))
+        despues = self._horas(api_client, dia_con_ocupacion)
+        assert despues[0] == antes[0] - 1
+
+        reserva.estado = 'cancelada'
+        reserva.save()
+        assert self._horas(api_client, dia_con_ocupacion) == antes
+
+    def test_cambio_de_fecha_invalida_fecha_anterior(self, api_client, user_cliente, dia_con_ocupacion):
+        otro_dia = dia_con_ocupacion + timedelta(days=1)
+        mesa = Mesa.objects.get(capacidad=6)
+        reserva = ReservaFactory(cliente=user_cliente, mesa=mesa, fecha_reserva=otro_dia,
+                                 hora_inicio=time(12, 0))
+        antes = self._horas(api_client, otro_dia)
+
+        reserva = Reserva.objects.get(pk=reserva.pk)
+        reserva.fecha_reserva = dia_con_ocupacion + timedelta(days=3)
+        reserva.save()
+
+        assert self._horas(api_client, otro_dia)[0] == antes[0] + 1
+
+    def test_bloqueo_y_mesa_invalidan(self, api_client, user_admin, dia_con_ocupacion):
+        mesa = MesaFactory(capacidad=6)
+        antes = self._horas(api_client, dia_con_ocupacion)
+
+        BloqueoMesa.objects.create(
+            mesa=mesa, fecha_inicio=dia_con_ocupacion, fecha_fin=dia_con_ocupacion,
+            motivo='Reparación', usuario_creador=user_admin
+        )
+        con_bloqueo = self._horas(api_client, dia_con_ocupacion)
+        assert con_bloqueo[0] == antes[0] - 1
+
+        mesa_nueva = MesaFactory(capacidad=2)
+        assert self._horas(api_client, dia_con_ocupacion)[0] == con_bloqueo[0] + 1
+
+        mesa_nueva.capacidad = 1
+        mesa_nueva.save()
+        assert self._horas(api_client, dia_con_ocupacion) == con_bloqueo
+
+    def test_estadisticas_solo_admin(self, api_client, user_admin, user_cliente, dia_con_ocupacion):
+        self._horas(api_client, dia_con_ocupacion)
+        self._horas(api_client, dia_con_ocupacion)
+
+        api_client.force_authenticate(user=user_admin)
+        response = api_client.get('/api/cache-disponibilidad/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['hits'] == 1
+        assert response.json()['misses'] == 1
+
+        api_client.force_authenticate(user=user_cliente)
+        response = api_client.get('/api/cache-disponibilidad/')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_sin_contadores_el_acierto_no_escribe(self, api_client, dia_con_ocupacion):
+        self._horas(api_client, dia_con_ocupacion)
+
+        with mock.patch.object(cache_disponibilidad, 'ESTADISTICAS', False), \
+                mock.patch.object(cache_disponibilidad.cache, 'incr') as incr, \
+                mock.patch.object(cache_disponibilidad.cache, 'add') as add:
+            self._horas(api_client, dia_con_ocupacion)
+            assert cache_disponibilidad.estadisticas()['activas'] is False
+
+        incr.assert_not_called()
+        add.assert_not_called()
+        assert cache_disponibilidad.estadisticas()['hits'] == 0
+
+    @pytest.mark.parametrize('backend, activos', [
+        ('django.core.cache.backends.redis.RedisCache', True),
+        ('django.core.cache.backends.locmem.LocMemCache', True),
+        ('django.core.cache.backends.db.DatabaseCache', False),
+        ('django.core.cache.backends.filebased.FileBasedCache', False),
+    ])
+    def test_contadores_segun_backend(self, backend, activos):
+        caches = {'default': {**settings.CACHES['default'], 'BACKEND': backend}}
+        with mock.patch.object(settings, 'CACHES', caches):
+            assert cache_disponibilidad.contadores_activos() is activos
+
+    def test_invalidar_sin_incr_atomico_reemplaza_la_version(self):
+        ambito = cache_disponibilidad.ambito_fecha('2030-01-01')
+        antes = cache_disponibilidad.obtener_versiones([ambito])[ambito]
+        caches = {'default': {**settings.CACHES['default'],
+                              'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache'}}
+
+        with mock.patch.object(settings, 'CACHES', caches), \
+                mock.patch.object(cache_disponibilidad.cache, 'incr') as incr:
+            cache_disponibilidad.invalidar(ambito)
+
+        incr.assert_not_called()
+        assert cache_disponibilidad.obtener_versiones([ambito])[ambito] != antes
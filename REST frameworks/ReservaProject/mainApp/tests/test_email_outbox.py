@@ -0,0 +1,357 @@
+"""
+Tests para el outbox de emails (EmailPendiente) y el worker procesar_emails
+
+Los requests solo encolan; el envío lo hace el worker contra el backend de
+email de tests (locmem, django.core.mail.outbox). La reutilización de
+conexiones se prueba contra un servidor SMTP local mínimo (ServidorSMTP).
+"""
+
+import socketserver
+import threading
+import pytest
+from datetime import date, time, timedelta
+from unittest.mock import patch
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from mainApp.models import EmailPendiente, Perfil, Reserva
+from django.core.mail import EmailMessage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mainApp import email_service
+from mainApp.email_service import (
+    LEASE_SEGUNDOS, MAX_INTENTOS, calcular_backoff, componer_email, encolar_email,
+    entregar_mensajes, procesar_emails_pendientes, reclamar_emails, renderizar_en_lote
+)
+from mainApp.tests.factories import ReservaFactory
+
+
+SEND_MESSAGES = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+
+
+@pytest.fixture
+def datos_invitado(mesa_disponible):
+    return {
+        'email': 'invitado@test.com', 'nombre': 'Ana', 'apellido': 'Rojas',
+        'rut': '12345678-5', 'telefono': '+56912345678',
+        'mesa': mesa_disponible.id,
+        'fecha_reserva': (date.today() + timedelta(days=2)).isoformat(),
+        'hora_inicio': '14:00', 'num_personas': 2,
+    }
+
+
+def encolar(n=1):
+    return [
+        encolar_email('bienvenida', f'cliente{i}@test.com', f'Asunto {i}', 'Mensaje')
+        for i in range(n)
+    ]
+
+
+@pytest.mark.api
+class TestEncoladoEnRequests:
+    """Los endpoints encolan dentro de su transacción y no envían"""
+
+    def test_register_and_reserve_encola_sin_enviar(self, api_client, datos_invitado):
+        response = api_client.post('/api/register-and-reserve/', datos_invitado, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(mail.outbox) == 0
+        email = EmailPendiente.objects.get()
+        assert email.tipo.startswith('confirmacion_')
+        assert email.destinatario == 'invitado@test.com'
+        assert email.estado == 'pendiente'
+
+    def test_transaccion_revertida_no_deja_email(self, api_client, datos_invitado):
+        # Falla después de encolar, todavía dentro de transaction.atomic()
+        with patch.object(Perfil, 'get_rol_display', side_effect=RuntimeError('falla simulada')):
+            response = api_client.post('/api/register-and-reserve/', datos_invitado, format='json')
+
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert not Reserva.objects.exists()
+        assert not EmailPendiente.objects.exists()
+
+    def test_cancelar_invitado_encola(self, api_client, datos_invitado):
+        api_client.post('/api/register-and-reserve/', datos_invitado, format='json')
+        token = Reserva.objects.get().cliente.perfil.token_activacion
+
+        response = api_client.delete(f'/api/reserva-invitado/{token}/cancelar/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert EmailPendiente.objects.count() == 2
+        assert EmailPendiente.objects.latest('id').tipo == 'cancelacion'
+        assert len(mail.outbox) == 0
+
+
+@pytest.mark.unit
+class TestWorker:
+    """Envío por lotes, reintentos y backoff"""
+
+    def test_envia_pendientes(self):
+        encolar(3)
+
+        resultado = procesar_emails_pendientes()
+
+        assert resultado == {'enviados': 3, 'reintentos': 0, 'fallidos': 0}
+        assert sorted(m.to[0] for m in mail.outbox) == [f'cliente{i}@test.com' for i in range(3)]
+        assert not EmailPendiente.objects.exclude(estado='enviado').exists()
+        assert procesar_emails_pendientes()['enviados'] == 0
+
+    def test_respeta_tamano_de_lote(self):
+        encolar(5)
+
+        assert procesar_emails_pendientes(lote=2)['enviados'] == 2
+        assert EmailPendiente.objects.filter(estado='pendiente').count() == 3
+
+    def test_error_reprograma_con_backoff(self):
+        email, = encolar()
+
+        with patch(SEND_MESSAGES, side_effect=OSError('SMTP caído')):
+            resultado = procesar_emails_pendientes()
+
+        email.refresh_from_db()
+        assert resultado['reintentos'] == 1
+        assert email.estado == 'pendiente'
+        assert email.intentos == 1
+        assert 'SMTP caído' in email.ultimo_error
+        assert email.proximo_intento > timezone.now() + calcular_backoff(1) - timedelta(seconds=5)
+        # Aún no vence: el siguiente lote no lo toma
+        assert procesar_emails_pendientes() == {'enviados': 0, 'reintentos': 0, 'fallidos': 0}
+
+    def test_falla_de_conexion_reprograma_todo_el_lote(self):
+        encolar(2)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('timeout'), create=True):
+            resultado = procesar_emails_pendientes()
+
+        assert resultado['reintentos'] == 2
+        assert len(mail.outbox) == 0
+
+    def test_descarta_tras_max_intentos(self):
+        email, = encolar()
+        EmailPendiente.objects.filter(pk=email.pk).update(intentos=MAX_INTENTOS - 1)
+
+        with patch(SEND_MESSAGES, side_effect=OSError('rechazado')):
+            resultado = procesar_emails_pendientes()
+
+        email.refresh_from_db()
+        assert resultado['fallidos'] == 1
+        assert email.estado == 'fallido'
+
+    def test_envia_con_el_lote_ya_reclamado(self):
+        encolar(2)
+        estados = []
+
+        def registrar_estado(mensajes):
+            estados.append(list(EmailPendiente.objects.values_list('estado', flat=True)))
+            return len(mensajes)
+
+        with patch(SEND_MESSAGES, side_effect=registrar_estado):
+            procesar_emails_pendientes()
+
+        # Durante el envío las filas ya están marcadas: otro worker no las toma
+        assert estados == [['enviando', 'enviando']] * 2
+        assert reclamar_emails() == []
+
+    def test_reclama_con_lease(self):
+        email, = encolar()
+
+        assert reclamar_emails() == [email]
+
+        email.refresh_from_db()
+        assert email.estado == 'enviando'
+        assert email.proximo_intento > timezone.now() + timedelta(seconds=LEASE_SEGUNDOS - 5)
+        assert reclamar_emails() == []
+
+    def test_lease_vencido_se_vuelve_a_tomar(self):
+        email, = encolar()
+        reclamar_emails()
+        # El worker que lo tenía murió sin registrar el resultado
+        EmailPendiente.objects.filter(pk=email.pk).update(proximo_intento=timezone.now() - timedelta(seconds=1))
+
+        assert procesar_emails_pendientes()['enviados'] == 1
+
+        email.refresh_from_db()
+        assert email.estado == 'enviado'
+
+    def test_backoff_exponencial_acotado(self):
+        assert calcular_backoff(1) == timedelta(minutes=1)
+        assert calcular_backoff(3) == timedelta(minutes=4)
+        assert calcular_backoff(20) == timedelta(hours=1)
+
+    def test_command_drena_el_outbox(self):
+        encolar(5)
+
+        call_command('procesar_emails', lote=2)
+
+        assert len(mail.outbox) == 5
+        assert not EmailPendiente.objects.filter(estado='pendiente').exists()
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    """
+    Servidor SMTP local de prueba: cuenta las sesiones, guarda los
+    destinatarios entregados y rechaza (550) los de 'rechazados'.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SesionSMTP)
+        self.sesiones = 0
+        self.entregados = []
+        self.rechazados = set()
+
+
+class SesionSMTP(socketserver.StreamRequestHandler):
+    def responder(self, linea):
+        self.wfile.write(f'{linea}\r\n'.encode())
+
+    def handle(self):
+        self.server.sesiones += 1
+        self.responder('220 localhost ESMTP prueba')
+        destinatarios = []
+        while True:
+            linea = self.rfile.readline().decode().strip()
+            comando = linea[:4].upper()
+            if not linea or comando == 'QUIT':
+                self.responder('221 Bye')
+                return
+            if comando == 'EHLO':
+                self.responder('250 localhost')
+            elif comando == 'RCPT':
+                destinatario = linea.split(':', 1)[1].strip(' <>')
+                if destinatario in self.server.rechazados:
+                    self.responder('550 Mailbox unavailable')
+                    continue
+                destinatarios.append(destinatario)
+                self.responder('250 OK')
+            elif comando == 'DATA':
+                self.responder('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline().rstrip(b'\r\n') != b'.':
+                    pass
+                self.server.entregados.extend(destinatarios)
+                destinatarios = []
+                self.responder('250 OK')
+            elif comando in ('MAIL', 'RSET', 'NOOP', 'HELO'):
+                destinatarios = [] if comando == 'RSET' else destinatarios
+                self.responder('250 OK')
+            else:
+                self.responder('502 Command not implemented')
+
+
+@pytest.fixture
+def servidor_smtp(settings):
+    servidor = ServidorSMTP()
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST, settings.EMAIL_PORT = servidor.server_address
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ''
+    settings.EMAIL_TIMEOUT = 5
+
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def mensajes(n):
+    return [EmailMessage('Asunto', 'Mensaje', 'noreply@test.com', [f'cliente{i}@test.com']) for i in range(n)]
+
+
+@pytest.mark.integration
+class TestEntregaSMTP:
+    """Una sesión SMTP para muchos mensajes, con tope y reconexión"""
+
+    def test_reutiliza_la_conexion(self, servidor_smtp):
+        errores = entregar_mensajes(mensajes(10))
+
+        assert errores == [None] * 10
+        assert servidor_smtp.sesiones == 1
+        assert len(servidor_smtp.entregados) == 10
+
+    def test_tope_de_mensajes_por_conexion(self, servidor_smtp):
+        errores = entregar_mensajes(mensajes(7), max_por_conexion=3)
+
+        assert errores == [None] * 7
+        assert servidor_smtp.sesiones == 3
+
+    def test_reconecta_tras_un_fallo(self, servidor_smtp):
+        servidor_smtp.rechazados.add('cliente2@test.com')
+
+        errores = entregar_mensajes(mensajes(5))
+
+        assert [e is None for e in errores] == [True, True, False, True, True]
+        assert servidor_smtp.entregados == [f'cliente{i}@test.com' for i in (0, 1, 3, 4)]
+        assert servidor_smtp.sesiones == 2
+
+    def test_servidor_caido_no_reintenta_cada_mensaje(self, servidor_smtp):
+        servidor_smtp.shutdown()
+        servidor_smtp.server_close()
+
+        errores = entregar_mensajes(mensajes(4))
+
+        assert all(isinstance(e, OSError) for e in errores)
+        assert servidor_smtp.sesiones == 0
+
+    def test_worker_envia_el_lote_en_una_sesion(self, servidor_smtp):
+        encolar(20)
+
+        resultado = procesar_emails_pendientes(lote=20)
+
+        assert resultado['enviados'] == 20
+        assert servidor_smtp.sesiones == 1
+
+
+@pytest.mark.unit
+class TestPlantillasEmail:
+    """Templates compilados una vez y render masivo"""
+
+    def test_compila_cada_template_una_sola_vez(self):
+        reservas = [ReservaFactory(hora_inicio=time(12 + 2 * i, 0)) for i in range(3)]
+        email_service._plantilla.cache_clear()
+        email_service._fragmentos.cache_clear()
+
+        with patch('mainApp.email_service.get_template', wraps=email_service.get_template) as compilar:
+            for _ in range(50):
+                list(renderizar_en_lote('recordatorio', reservas))
+                componer_email('cancelacion', reservas[0].cliente.perfil, reservas[0])
+
+        # recordatorio, cancelacion, _firma y _beneficios_cuenta
+        assert compilar.call_count == 4
+
+    def test_texto_sin_escapar_html(self, user_cliente, reserva_valida):
+        perfil = user_cliente.perfil
+        perfil.nombre_completo = "Ana O'Higgins & Cía"
+
+        asunto, mensaje = componer_email('cancelacion', perfil, reserva_valida)
+
+        assert asunto.startswith(f'Reserva Cancelada - Mesa {reserva_valida.mesa.numero}')
+        assert mensaje.startswith("Hola Ana O'Higgins & Cía,")
+        assert mensaje.endswith('Equipo del Restaurante')
+
+    def test_links_del_invitado(self, user_cliente, reserva_valida, settings):
+        settings.FRONTEND_URL = 'https://reservas.test'
+        perfil = user_cliente.perfil
+        perfil.token_activacion = 'abc123'
+
+        _, mensaje = componer_email('confirmacion_invitado', perfil, reserva_valida)
+
+        assert 'https://reservas.test/reserva/abc123' in mensaje
+        assert 'https://reservas.test/activar-cuenta/abc123' in mensaje
+        assert '- Recibir recordatorios automáticos' in mensaje
+
+    def test_render_en_lote_desde_queryset(self):
+        creadas = [ReservaFactory(hora_inicio=time(12 + 2 * i, 0)) for i in range(4)]
+        reservas = Reserva.objects.filter(
+            id__in=[r.id for r in creadas]
+        ).select_related('cliente__perfil', 'mesa').order_by('id')
+
+        with CaptureQueriesContext(connection) as queries:
+            mensajes = list(renderizar_en_lote('recordatorio', reservas, chunk_size=2))
+
+        assert len(queries) == 1
+        assert [r.id for r, _ in mensajes] == [r.id for r in creadas]
+        assert all(m.to == [r.cliente.email] for r, m in mensajes)
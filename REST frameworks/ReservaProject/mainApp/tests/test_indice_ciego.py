@@ -0,0 +1,161 @@
+"""
+Tests para los índices ciegos de RUT y teléfono (mainApp/indice_ciego.py)
+"""
+
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APIClient
+from mainApp.indice_ciego import (
+    indice_rut, indice_telefono, normalizar_rut, normalizar_telefono, rellenar_indices
+)
+from mainApp.models import Perfil
+from mainApp.serializers import RegisterSerializer
+from mainApp.tests.factories import UserFactory
+
+
+URL = '/api/clientes/buscar/'
+
+
+def perfil_con(rut='', telefono=''):
+    usuario = UserFactory()
+    usuario.perfil.rut = rut
+    usuario.perfil.telefono = telefono
+    usuario.perfil.save()
+    return usuario.perfil
+
+
+@pytest.mark.unit
+class TestIndiceCiego:
+    """Normalización y HMAC"""
+
+    def test_normalizar(self):
+        assert normalizar_rut('12.345.678-k') == '12345678K'
+        assert normalizar_telefono('+56 9 1234 5678') == '56912345678'
+        assert normalizar_telefono('9-1234-5678') == '56912345678'
+
+    def test_mismo_indice_para_cualquier_formato(self):
+        assert indice_rut('12.345.678-5') == indice_rut('12345678-5') == indice_rut('123456785')
+        assert indice_telefono('+56912345678') == indice_telefono('912345678')
+        assert len(indice_rut('12345678-5')) == 64
+
+    def test_vacio_y_dominios_separados(self):
+        assert indice_rut('') is None
+        assert indice_telefono(None) is None
+        assert indice_rut('56912345678') != indice_telefono('56912345678')
+
+    def test_depende_de_la_clave(self, settings):
+        antes = indice_rut('12345678-5')
+        settings.BLIND_INDEX_KEY = 'otra-clave'
+        assert indice_rut('12345678-5') != antes
+
+
+@pytest.mark.models
+class TestIndicesEnPerfil:
+    """Perfil.save() mantiene los índices"""
+
+    def test_save_calcula_indices(self):
+        perfil = perfil_con('12.345.678-5', '+56912345678')
+
+        guardado = Perfil.objects.get(id=perfil.id)
+        assert guardado.rut_indice == indice_rut('12345678-5')
+        assert guardado.telefono_indice == indice_telefono('912345678')
+
+    def test_se_actualiza_y_se_vacia(self):
+        perfil = perfil_con('12345678-5', '+56912345678')
+        perfil.rut = ''
+        perfil.telefono = '+56987654321'
+        perfil.save(update_fields=['rut', 'telefono'])
+
+        guardado = Perfil.objects.get(id=perfil.id)
+        assert guardado.rut_indice is None
+        assert guardado.telefono_indice == indice_telefono('987654321')
+
+    def test_registro_rechaza_rut_duplicado(self):
+        """filter(rut=...) nunca coincidía con el texto cifrado; el índice sí"""
+        perfil_con('12345678-5')
+        serializer = RegisterSerializer(data={
+            'username': 'nuevo@test.com', 'email': 'nuevo@test.com',
+            'password': 'Segura123!', 'password_confirm': 'Segura123!',
+            'nombre': 'Nuevo', 'apellido': 'Cliente',
+            'rut': '12.345.678-5', 'telefono': '+56912345678',
+        })
+
+        assert not serializer.is_valid()
+        assert 'rut' in serializer.errors
+
+
+@pytest.mark.api
+class TestBuscarCliente:
+    """GET /api/clientes/buscar/"""
+
+    def test_por_rut_en_cualquier_formato(self, admin_client):
+        perfil = perfil_con('12345678-5')
+        perfil_con('11111111-1')
+
+        response = admin_client.get(URL, {'rut': '12.345.678-5'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [p['id'] for p in response.json()] == [perfil.id]
+        assert response.json()[0]['rut'] == '12345678-5'
+
+    def test_por_telefono(self, admin_client):
+        perfil = perfil_con(telefono='+56912345678')
+
+        response = admin_client.get(URL, {'telefono': '9 1234 5678'})
+
+        assert [p['id'] for p in response.json()] == [perfil.id]
+
+    def test_una_sola_query_indexada(self, admin_client):
+        perfil_con('12345678-5')
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            admin_client.get(URL, {'rut': '12345678-5'})
+
+        perfiles = [q for q in queries if 'FROM "mainApp_perfil"' in q and '"rut_indice" =' in q]
+        assert len(perfiles) == 1
+
+    def test_sin_parametros(self, admin_client):
+        assert admin_client.get(URL).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cajero_si_cliente_no(self, user_cajero, authenticated_client):
+        cajero = APIClient()
+        cajero.force_authenticate(user=user_cajero)
+
+        assert cajero.get(URL, {'rut': '12345678-5'}).status_code == status.HTTP_200_OK
+        assert authenticated_client.get(URL, {'rut': '12345678-5'}).status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.models
+class TestRellenarIndices:
+    """Backfill de filas existentes"""
+
+    def test_rellena_faltantes(self):
+        perfil = perfil_con('12345678-5', '+56912345678')
+        # Como un perfil creado sin pasar por save()
+        Perfil.objects.filter(id=perfil.id).update(rut_indice=None, telefono_indice=None, indices_calculados=False)
+
+        salida = StringIO()
+        call_command('rellenar_indices_ciegos', '--solo-faltantes', stdout=salida)
+
+        guardado = Perfil.objects.get(id=perfil.id)
+        assert guardado.rut_indice == indice_rut('12345678-5')
+        assert guardado.telefono_indice == indice_telefono('+56912345678')
+        assert 'Perfiles actualizados: 1' in salida.getvalue()
+
+    def test_solo_faltantes_no_repite_perfiles_sin_rut_ni_telefono(self):
+        perfil = perfil_con()
+        assert perfil.indices_calculados
+        assert (perfil.rut_indice, perfil.telefono_indice) == (None, None)
+
+        assert rellenar_indices(solo_faltantes=True) == 0
+
+    def test_recalcula_tras_cambiar_la_clave(self, settings):
+        perfil = perfil_con('12345678-5')
+        settings.BLIND_INDEX_KEY = 'clave-rotada'
+
+        assert rellenar_indices(tamano_bloque=1) >= 1
+        assert Perfil.objects.get(id=perfil.id).rut_indice == indice_rut('12345678-5')
+        assert rellenar_indices() == 0
@@ -0,0 +1,148 @@
+"""
+Tests de equivalencia de los listados desde .values() (mainApp/lectura_rapida.py)
+
+Cada request se hace dos veces: con el camino rápido y con LISTADOS vacío
+(es decir, con los serializers de siempre). Las respuestas deben ser
+idénticas byte a byte.
+"""
+
+import pytest
+from unittest import mock
+from datetime import date, time, timedelta
+from django.db import connection
+from rest_framework.test import APIClient
+from mainApp import lectura_rapida
+from mainApp.models import Perfil
+from mainApp.paginacion import ReservaKeysetPagination
+from mainApp.tests.factories import BloqueoMesaFactory, MesaFactory, ReservaFactory, UserFactory
+
+
+def comparar(cliente, url, params=None):
+    """Retorna la respuesta rápida tras verificar que coincide con la de los serializers."""
+    rapida = cliente.get(url, params)
+    with mock.patch.dict(lectura_rapida.LISTADOS, clear=True):
+        serializer = cliente.get(url, params)
+
+    assert rapida.status_code == serializer.status_code == 200
+    assert rapida.content == serializer.content
+    return rapida.json()
+
+
+def cliente_con_rol(usuario, rol):
+    usuario.perfil.rol = rol
+    usuario.perfil.save()
+    cliente = APIClient()
+    cliente.force_authenticate(user=usuario)
+    return cliente
+
+
+@pytest.fixture
+def restaurante(user_admin, user_cliente):
+    mesas = MesaFactory.create_batch(6)
+    mesas[1].estado = 'ocupada'
+    mesas[1].save()
+    otro = UserFactory()
+    otro.perfil.rut = '44444444-4'
+    otro.perfil.telefono = '+56987654321'
+    otro.perfil.save()
+
+    inicio = date.today() + timedelta(days=1)
+    for i, mesa in enumerate(mesas[:4]):
+        for j, hora in enumerate((time(12, 0), time(14, 30), time(18, 0))):
+            ReservaFactory(
+                cliente=(user_cliente, otro)[(i + j) % 2], mesa=mesa,
+                fecha_reserva=inicio + timedelta(days=i % 2), hora_inicio=hora,
+                estado=('pendiente', 'activa', 'completada')[j], notas=('', 'Ventana', 'Cumpleaños')[j],
+            )
+
+    # Bloqueos parciales, de día completo, de varias categorías e inactivos
+    for i, categoria in enumerate(('mantenimiento', 'evento_privado', 'reparacion', 'otro')):
+        horas = {'hora_inicio': time(15, 0), 'hora_fin': time(17, 0)} if i % 2 else {}
+        BloqueoMesaFactory(
+            mesa=mesas[4 + i % 2], usuario_creador=user_admin, categoria=categoria,
+            fecha_inicio=inicio + timedelta(days=10 + 3 * i), fecha_fin=inicio + timedelta(days=11 + 3 * i),
+            activo=i != 3, **horas
+        )
+    return inicio
+
+
+@pytest.mark.api
+class TestEquivalenciaListados:
+    """Misma respuesta que los serializers existentes"""
+
+    def test_mesas(self, api_client, restaurante):
+        assert len(comparar(api_client, '/api/mesas/')) > 0
+
+    def test_bloqueos(self, admin_client, restaurante):
+        data = comparar(admin_client, '/api/bloqueos/')
+        assert {b['categoria_display'] for b in data['results']} == {
+            'Mantenimiento', 'Evento Privado', 'Reparación', 'Otro'
+        }
+        comparar(admin_client, '/api/bloqueos/', {'paginacion': 'cursor'})
+        comparar(admin_client, '/api/bloqueos/', {'activo': 'false'})
+
+    def test_reservas_admin(self, admin_client, restaurante):
+        data = comparar(admin_client, '/api/reservas/', {'all': 'true'})
+        assert data['count'] == 12
+        assert {r['cliente_rut'] for r in data['results']} == {'12345678-5', '44444444-4'}
+
+    @pytest.mark.parametrize('rol', ['cajero', 'mesero', 'cliente'])
+    def test_reservas_por_rol(self, user_admin, restaurante, rol):
+        comparar(cliente_con_rol(user_admin, rol), '/api/reservas/', {'all': 'true'})
+
+    def test_reservas_cliente(self, authenticated_client, restaurante):
+        data = comparar(authenticated_client, '/api/reservas/')
+        assert {r['cliente_rut'] for r in data['results']} == {'12345678-5'}
+
+    @pytest.mark.parametrize('params', [
+        {'fields': 'id,estado,estado_display,hora_fin'},
+        {'fields': 'cliente_telefono,mesa_numero'},
+        {'fields': 'id,mesa_info'},                       # Sin columna: usa el serializer
+        {'vista': 'completa'},
+        {'paginacion': 'cursor'},
+        {'ordering': 'hora_inicio', 'estado': 'activa'},
+        {'search': 'juan'},
+        {'date': 'today'},
+    ])
+    def test_reservas_con_parametros(self, admin_client, restaurante, params):
+        comparar(admin_client, '/api/reservas/', {'all': 'true', **params})
+
+    def test_cursor_sigue_funcionando(self, admin_client, restaurante):
+        primera = comparar(admin_client, '/api/reservas/', {'paginacion': 'cursor', 'all': 'true'})
+        assert primera['next'] is None or comparar(admin_client, primera['next'])
+
+    @pytest.mark.parametrize('fields', ['estado', 'id,cliente_rut', 'hora_fin,notas'])
+    def test_cursor_con_fields(self, admin_client, restaurante, fields):
+        # Las columnas del cursor (fecha_reserva, hora_inicio, id) no están en ?fields=
+        with mock.patch.object(ReservaKeysetPagination, 'page_size', 5):
+            primera = comparar(admin_client, '/api/reservas/', {'paginacion': 'cursor', 'all': 'true', 'fields': fields})
+            segunda = comparar(admin_client, primera['next'])
+
+        assert all(list(r) == fields.split(',') for r in primera['results'] + segunda['results'])
+        assert len(primera['results']) == len(segunda['results']) == 5
+
+    def test_cliente_sin_perfil(self, admin_client, restaurante, user_cliente):
+        Perfil.objects.filter(user=user_cliente).delete()
+        data = comparar(admin_client, '/api/reservas/', {'all': 'true'})
+        assert None in {r.get('cliente_nombre') for r in data['results']}
+
+
+@pytest.mark.api
+class TestCaminoRapido:
+    """El camino rápido no instancia modelos ni hace queries extra"""
+
+    def test_bloqueos_sin_n_mas_1(self, admin_client, restaurante, user_admin):
+        for mesa in MesaFactory.create_batch(10):
+            BloqueoMesaFactory(mesa=mesa, usuario_creador=user_admin,
+                               fecha_inicio=restaurante + timedelta(days=40))
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            admin_client.get('/api/bloqueos/')
+
+        # El serializer hacía una query por bloqueo para mesa.numero
+        assert len([q for q in queries if 'mainApp_mesa' in q]) <= 2
+
+    def test_no_instancia_modelos(self, admin_client, restaurante):
+        with mock.patch.object(lectura_rapida.ReservaResumenSerializer, 'to_representation') as serializar:
+            admin_client.get('/api/reservas/', {'all': 'true'})
+        serializar.assert_not_called()
@@ -6,11 +6,17 @@ Estos tests cubren las validaciones críticas y lógica de negocio en los modelo
 
 import pytest
 from datetime import date, time, timedelta
+from unittest import mock
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
-from mainApp.models import Perfil, Mesa, Reserva
+from django.db import IntegrityError, connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from encrypted_model_fields import fields as campos_encriptados
+from mainApp.indice_ciego import indice_rut
+from mainApp.models import Perfil, Mesa, Reserva, BloqueoMesa, solapamiento_validado_por_bd
 from mainApp.tests.factories import (
-    UserFactory, PerfilFactory, PerfilClienteFactory,
+    UserFactory, PerfilFactory, PerfilClienteFactory, PerfilInvitadoFactory,
     MesaFactory, ReservaFactory, ReservaPasadaFactory,
     crear_reserva_con_solapamiento
 )
@@ -54,6 +60,96 @@ class TestPerfilModel:
             assert len(perfil.rut) >= 9  # Al menos 8 dígitos + guión + verificador
 
 
+def escrituras_perfil(funcion):
+    """Ejecuta funcion() y retorna (UPDATEs de perfiles, encriptaciones Fernet)."""
+    sql = []
+    with mock.patch.object(campos_encriptados, 'encrypt_str', wraps=campos_encriptados.encrypt_str) as encriptar, \
+            connection.execute_wrapper(lambda execute, q, *args: sql.append(q) or execute(q, *args)):
+        funcion()
+    return [q for q in sql if q.startswith(f'UPDATE "{Perfil._meta.db_table}"')], encriptar.call_count
+
+
+@pytest.fixture
+def perfil_con_datos():
+    perfil = PerfilClienteFactory(rut='12345678-5', telefono='+56911112222')
+    return Perfil.objects.get(pk=perfil.pk)
+
+
+@pytest.mark.models
+@pytest.mark.unit
+class TestPerfilCamposModificados:
+    """Perfil.save() solo escribe (y encripta) lo que cambió"""
+
+    def test_sin_cambios_no_escribe(self, perfil_con_datos):
+        updates, encriptados = escrituras_perfil(perfil_con_datos.save)
+
+        assert updates == []
+        assert encriptados == 0
+
+    def test_solo_escribe_las_columnas_modificadas(self, perfil_con_datos):
+        perfil_con_datos.rol = 'cajero'
+
+        updates, encriptados = escrituras_perfil(perfil_con_datos.save)
+
+        assert len(updates) == 1
+        assert '"rol"' in updates[0] and '"rut"' not in updates[0] and '"telefono"' not in updates[0]
+        assert encriptados == 0
+        assert Perfil.objects.get(pk=perfil_con_datos.pk).rol == 'cajero'
+
+    def test_cambiar_rut_recalcula_su_indice(self, perfil_con_datos):
+        perfil_con_datos.rut = '11111111-1'
+
+        updates, encriptados = escrituras_perfil(perfil_con_datos.save)
+
+        assert len(updates) == 1 and '"rut_indice"' in updates[0]
+        assert encriptados == 1
+        assert Perfil.objects.get(pk=perfil_con_datos.pk).rut_indice == indice_rut('11111111-1')
+
+    def test_cargar_un_campo_diferido_no_es_modificarlo(self, perfil_con_datos):
+        perfil = Perfil.objects.defer('rut', 'telefono').get(pk=perfil_con_datos.pk)
+        assert perfil.rut == '12345678-5'
+
+        assert escrituras_perfil(perfil.save) == ([], 0)
+
+    def test_crear_usuario_no_actualiza_el_perfil(self):
+        updates, _ = escrituras_perfil(lambda: User.objects.create_user('nuevo', password='x'))
+
+        assert updates == []
+        assert Perfil.objects.filter(user__username='nuevo').exists()
+
+    def test_login_no_lee_ni_escribe_el_perfil(self, perfil_con_datos):
+        sql = []
+        with connection.execute_wrapper(lambda execute, q, *args: sql.append(q) or execute(q, *args)):
+            Client().force_login(perfil_con_datos.user)
+
+        assert any('last_login' in q for q in sql)
+        assert not any(Perfil._meta.db_table in q for q in sql)
+
+    def test_cambiar_nombre_del_usuario_actualiza_solo_la_busqueda(self, perfil_con_datos):
+        user = User.objects.get(pk=perfil_con_datos.user_id)
+        user.first_name = 'Zacarías'
+
+        with mock.patch.object(campos_encriptados, 'decrypt_str', wraps=campos_encriptados.decrypt_str) as descifrar:
+            updates, encriptados = escrituras_perfil(user.save)
+
+        assert len(updates) == 1 and '"busqueda"' in updates[0] and '"rut"' not in updates[0]
+        assert encriptados == descifrar.call_count == 0
+        assert 'zacarias' in Perfil.objects.get(pk=perfil_con_datos.pk).busqueda
+
+    def test_activar_cuenta_escribe_el_perfil_una_vez_sin_encriptar(self, api_client):
+        invitado = PerfilInvitadoFactory(rut='12345678-5', telefono='+56911112222')
+        datos = {'token': invitado.token_activacion, 'password': 'Clave123!', 'password_confirm': 'Clave123!'}
+
+        updates, encriptados = escrituras_perfil(
+            lambda: api_client.post('/api/activar-cuenta/', datos, format='json')
+        )
+
+        perfil = Perfil.objects.get(pk=invitado.pk)
+        assert not perfil.es_invitado and perfil.token_usado
+        assert len(updates) == 1
+        assert encriptados == 0
+
+
 @pytest.mark.models
 @pytest.mark.unit
 class TestMesaModel:
@@ -176,8 +272,10 @@ class TestReservaModel:
         dt_fin = dt_inicio + timedelta(hours=2)
         reserva2.hora_fin = dt_fin.time()
 
+        # save() cubre ambos caminos: clean() en SQLite y la exclusion
+        # constraint en PostgreSQL
         with pytest.raises(ValidationError) as exc_info:
-            reserva2.full_clean()
+            reserva2.save()
 
         error_msg = str(exc_info.value)
         assert 'solapamiento' in error_msg.lower() or 'solapa' in error_msg.lower()
@@ -306,3 +404,275 @@ class TestReservaWorkflow:
         reserva.save()
 
         assert reserva.estado == 'cancelada'
+
+
+def sql_ejecutado(funcion):
+    sql = []
+    with connection.execute_wrapper(lambda execute, q, *args: sql.append(q) or execute(q, *args)):
+        funcion()
+    return sql
+
+
+def consulta_solapamiento(sql):
+    """Queries de Reserva.reserva_en_conflicto() (SELECT de reservas con rango de horas)."""
+    tabla = Reserva._meta.db_table
+    return [q for q in sql if q.startswith('SELECT') and f'FROM "{tabla}"' in q and '"hora_fin" >' in q]
+
+
+@pytest.mark.models
+@pytest.mark.unit
+class TestReservaGuardadoValidado:
+    """Reserva.save() valida y escribe según los campos que cambiaron"""
+
+    @pytest.fixture
+    def reserva(self):
+        reserva = ReservaFactory(estado='pendiente', hora_inicio=time(14, 0))
+        return Reserva.objects.get(pk=reserva.pk)
+
+    def test_cambio_de_estado_sin_validacion_ni_solapamiento(self, reserva):
+        reserva.estado = 'cancelada'
+
+        with mock.patch.object(Reserva, 'full_clean') as full_clean:
+            sql = sql_ejecutado(lambda: reserva.save(update_fields=['estado']))
+
+        full_clean.assert_not_called()
+        assert consulta_solapamiento(sql) == []
+        updates = [q for q in sql if q.startswith(f'UPDATE "{Reserva._meta.db_table}"')]
+        assert len(updates) == 1
+        assert '"estado"' in updates[0] and '"notas"' not in updates[0] and '"hora_inicio"' not in updates[0]
+        assert not reserva.ocupacion.exists()
+
+    def test_sin_update_fields_escribe_solo_lo_modificado(self, reserva):
+        reserva.estado = 'activa'
+
+        with mock.patch.object(Reserva, 'full_clean') as full_clean:
+            sql = sql_ejecutado(reserva.save)
+
+        full_clean.assert_not_called()
+        update = next(q for q in sql if q.startswith(f'UPDATE "{Reserva._meta.db_table}"'))
+        assert '"estado"' in update and '"fecha_reserva"' not in update
+
+    def test_entre_estados_que_ocupan_no_reescribe_la_ocupacion(self, reserva):
+        franjas = list(reserva.ocupacion.values_list('slot', flat=True))
+        reserva.estado = 'activa'
+
+        sql = sql_ejecutado(lambda: reserva.save(update_fields=['estado']))
+
+        assert not any('ocupacionslot' in q for q in sql)
+        assert list(reserva.ocupacion.values_list('slot', flat=True)) == franjas
+
+    def test_sin_cambios_no_escribe(self, reserva):
+        assert sql_ejecutado(reserva.save) == []
+
+    def test_completar_reserva_de_fecha_pasada(self, reserva):
+        """Una transición de estado no repite las validaciones de creación (fecha pasada)"""
+        Reserva.objects.filter(pk=reserva.pk).update(fecha_reserva=date.today() - timedelta(days=1))
+        reserva = Reserva.objects.get(pk=reserva.pk)
+
+        reserva.estado = 'completada'
+        reserva.save(update_fields=['estado'])
+
+        assert Reserva.objects.get(pk=reserva.pk).estado == 'completada'
+
+    def test_soft_delete_solo_escribe_deleted_at(self, reserva):
+        sql = sql_ejecutado(reserva.delete)
+
+        assert consulta_solapamiento(sql) == []
+        assert Reserva.all_objects.get(pk=reserva.pk).deleted_at is not None
+        assert not reserva.ocupacion.exists()
+
+    def test_restaurar_valida_el_solapamiento(self, reserva):
+        reserva.delete()
+        ReservaFactory(mesa=reserva.mesa, fecha_reserva=reserva.fecha_reserva, hora_inicio=time(15, 0))
+
+        with pytest.raises(ValidationError, match='Solapamiento'):
+            reserva.restore()
+
+    def test_reactivar_valida_el_solapamiento(self, reserva):
+        reserva.estado = 'cancelada'
+        reserva.save(update_fields=['estado'])
+        ReservaFactory(mesa=reserva.mesa, fecha_reserva=reserva.fecha_reserva, hora_inicio=time(15, 0))
+
+        reserva.estado = 'pendiente'
+        with pytest.raises(ValidationError, match='Solapamiento'):
+            reserva.save(update_fields=['estado'])
+
+    def test_cambio_de_horario_valida_todo(self, reserva):
+        ReservaFactory(mesa=reserva.mesa, fecha_reserva=reserva.fecha_reserva, hora_inicio=time(18, 0))
+
+        reserva.hora_inicio = time(17, 0)
+        with pytest.raises(ValidationError, match='Solapamiento'):
+            reserva.save()
+
+    def test_validar_true_fuerza_full_clean(self, reserva):
+        reserva.estado = 'activa'
+
+        with mock.patch.object(Reserva, 'full_clean') as full_clean:
+            reserva.save(validar=True)
+
+        full_clean.assert_called_once()
+
+
+
+es_postgresql = connection.vendor == 'postgresql'
+
+
+@pytest.mark.models
+@pytest.mark.critical
+class TestSolapamientoBaseDeDatos:
+    """
+    Regla de no solapamiento: exclusion constraint en PostgreSQL,
+    validación en Reserva.clean() en SQLite.
+    """
+
+    def _reserva_base(self):
+        fecha = date.today() + timedelta(days=30)
+        return ReservaFactory(fecha_reserva=fecha, hora_inicio=time(14, 0))
+
+    @pytest.mark.skipif(not es_postgresql, reason="Exclusion constraint solo existe en PostgreSQL")
+    def test_constraint_rechaza_insercion_directa(self):
+        """La constraint rechaza solapamientos aunque se salte Reserva.save()"""
+        reserva = self._reserva_base()
+
+        with pytest.raises(IntegrityError, match='reserva_sin_solapamiento'):
+            with transaction.atomic():
+                Reserva.objects.bulk_create([Reserva(
+                    cliente=reserva.cliente, mesa=reserva.mesa,
+                    fecha_reserva=reserva.fecha_reserva,
+                    hora_inicio=time(15, 0), hora_fin=time(17, 0),
+                )])
+
+    @pytest.mark.skipif(not es_postgresql, reason="Exclusion constraint solo existe en PostgreSQL")
+    def test_clean_no_consulta_solapamientos_en_postgresql(self, django_assert_num_queries):
+        """En PostgreSQL clean() no vuelve a buscar reservas en conflicto"""
+        reserva = self._reserva_base()
+        nueva = Reserva(
+            cliente=reserva.cliente, mesa=reserva.mesa,
+            fecha_reserva=reserva.fecha_reserva,
+            hora_inicio=time(15, 0), hora_fin=time(17, 0),
+        )
+
+        assert solapamiento_validado_por_bd()
+        with django_assert_num_queries(0):
+            nueva.clean()
+
+    @pytest.mark.skipif(es_postgresql, reason="Camino de respaldo para motores sin exclusion constraint")
+    def test_clean_detecta_solapamiento_sin_constraint(self):
+        """En SQLite clean() detecta el solapamiento con una sola consulta"""
+        reserva = self._reserva_base()
+        nueva = Reserva(
+            cliente=reserva.cliente, mesa=reserva.mesa,
+            fecha_reserva=reserva.fecha_reserva,
+            hora_inicio=time(15, 0), hora_fin=time(17, 0),
+        )
+
+        assert not solapamiento_validado_por_bd()
+        assert nueva.reserva_en_conflicto() == reserva
+        with pytest.raises(ValidationError, match='Solapamiento detectado'):
+            nueva.clean()
+
+    def test_reserva_cancelada_no_bloquea_horario(self):
+        """Las reservas canceladas quedan fuera de la regla"""
+        reserva = self._reserva_base()
+        reserva.estado = 'cancelada'
+        reserva.save()
+
+        nueva = ReservaFactory(
+            mesa=reserva.mesa, fecha_reserva=reserva.fecha_reserva, hora_inicio=time(15, 0)
+        )
+        assert nueva.id is not None
+
+    def test_reserva_eliminada_no_bloquea_horario(self):
+        """Las reservas con soft delete quedan fuera de la regla"""
+        reserva = self._reserva_base()
+        reserva.delete()
+
+        nueva = ReservaFactory(
+            mesa=reserva.mesa, fecha_reserva=reserva.fecha_reserva, hora_inicio=time(15, 0)
+        )
+        assert nueva.id is not None
+
+
+
+@pytest.mark.models
+class TestBloqueoMesaSolapamiento:
+    """Validación de solapamiento entre bloqueos de la misma mesa"""
+
+    @pytest.fixture(autouse=True)
+    def _usuario(self, user_admin):
+        self.usuario = user_admin
+
+    def _bloqueo(self, mesa, inicio, fin=None, hora_inicio=None, hora_fin=None, **kwargs):
+        return BloqueoMesa(
+            mesa=mesa, fecha_inicio=inicio, fecha_fin=fin or inicio,
+            hora_inicio=hora_inicio, hora_fin=hora_fin, motivo='Test',
+            usuario_creador=self.usuario, **kwargs
+        )
+
+    def test_dia_completo_solapado(self):
+        mesa = MesaFactory()
+        inicio = date.today() + timedelta(days=5)
+        self._bloqueo(mesa, inicio, inicio + timedelta(days=3)).save()
+
+        with pytest.raises(ValidationError, match='bloqueo de día completo'):
+            self._bloqueo(mesa, inicio + timedelta(days=2)).full_clean()
+
+    def test_horario_contra_dia_completo(self):
+        mesa = MesaFactory()
+        fecha = date.today() + timedelta(days=5)
+        self._bloqueo(mesa, fecha).save()
+
+        with pytest.raises(ValidationError, match='se solapa con las fechas'):
+            self._bloqueo(mesa, fecha, hora_inicio=time(14, 0), hora_fin=time(16, 0)).full_clean()
+
+    def test_horarios_solapados(self):
+        mesa = MesaFactory()
+        fecha = date.today() + timedelta(days=5)
+        self._bloqueo(mesa, fecha, hora_inicio=time(14, 0), hora_fin=time(16, 0)).save()
+
+        with pytest.raises(ValidationError, match='Existe un bloqueo entre 14:00:00 y 16:00:00'):
+            self._bloqueo(mesa, fecha, hora_inicio=time(15, 0), hora_fin=time(17, 0)).full_clean()
+
+    def test_sin_conflicto(self):
+        """Horarios consecutivos, otras fechas, otras mesas y bloqueos inactivos no chocan"""
+        mesa = MesaFactory()
+        fecha = date.today() + timedelta(days=5)
+        self._bloqueo(mesa, fecha, hora_inicio=time(14, 0), hora_fin=time(16, 0)).save()
+        self._bloqueo(mesa, fecha + timedelta(days=1)).save()
+        self._bloqueo(MesaFactory(), fecha).save()
+        self._bloqueo(mesa, fecha, hora_inicio=time(18, 0), hora_fin=time(20, 0), activo=False).save()
+
+        self._bloqueo(mesa, fecha, hora_inicio=time(16, 0), hora_fin=time(20, 0)).full_clean()
+
+    def test_editar_bloqueo_no_choca_consigo_mismo(self):
+        mesa = MesaFactory()
+        bloqueo = self._bloqueo(mesa, date.today() + timedelta(days=5))
+        bloqueo.save()
+
+        bloqueo.motivo = 'Actualizado'
+        bloqueo.full_clean()
+
+    @pytest.mark.slow
+    def test_benchmark_historial_de_bloqueos(self):
+        """La validación hace 1 query y no depende del tamaño del historial"""
+        mesa = MesaFactory()
+        nuevo = self._bloqueo(mesa, date.today() + timedelta(days=5))
+
+        def validar():
+            with CaptureQueriesContext(connection) as queries:
+                nuevo.full_clean()
+            return [q['sql'] for q in queries if 'bloqueomesa' in q['sql'].lower()]
+
+        queries_vacio = validar()
+
+        # 10.000 bloqueos históricos (bulk_create evita la validación de fechas pasadas)
+        hoy = date.today()
+        BloqueoMesa.objects.bulk_create([
+            self._bloqueo(mesa, hoy - timedelta(days=n + 1))
+            for n in range(10000)
+        ], batch_size=2000)
+
+        queries_historial = validar()
+
+        assert len(queries_vacio) == len(queries_historial) == 1
+        assert 'LIMIT 1' in queries_historial[0]
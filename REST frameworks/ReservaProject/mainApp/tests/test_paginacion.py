@@ -0,0 +1,109 @@
+"""
+Tests para la paginación por cursor (mainApp/paginacion.py)
+"""
+
+import pytest
+from datetime import date, time, timedelta
+from django.db import connection
+from rest_framework import status
+from mainApp.models import BloqueoMesa, Reserva
+from mainApp.tests.factories import BloqueoMesaFactory, MesaFactory, ReservaFactory
+
+
+def recorrer(cliente, url, params=None):
+    """Sigue los links 'next' y retorna las páginas visitadas."""
+    paginas = []
+    response = cliente.get(url, params)
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        paginas.append(response.json())
+        if not paginas[-1]['next']:
+            return paginas
+        response = cliente.get(paginas[-1]['next'])
+
+
+@pytest.fixture
+def historial(user_cliente):
+    """120 reservas con fechas y horas repetidas (el desempate es el id)."""
+    mesas = MesaFactory.create_batch(5)
+    inicio = date.today() + timedelta(days=1)
+    reservas = []
+    for dia in range(8):
+        for hora in (time(12, 0), time(14, 0), time(16, 0)):
+            for mesa in mesas:
+                reservas.append(ReservaFactory(
+                    cliente=user_cliente, mesa=mesa,
+                    fecha_reserva=inicio + timedelta(days=dia), hora_inicio=hora,
+                ))
+    return reservas
+
+
+@pytest.mark.api
+class TestPaginacionCursorReservas:
+    """Modo ?paginacion=cursor de /api/reservas/"""
+
+    def test_recorre_todo_sin_repetir_en_orden(self, admin_client, historial):
+        paginas = recorrer(admin_client, '/api/reservas/', {'paginacion': 'cursor', 'all': 'true'})
+
+        ids = [r['id'] for pagina in paginas for r in pagina['results']]
+        esperado = list(
+            Reserva.objects.order_by('-fecha_reserva', '-hora_inicio', '-id').values_list('id', flat=True)
+        )
+        assert ids == esperado
+        assert [len(p['results']) for p in paginas] == [50, 50, 20]
+        assert all('count' not in p for p in paginas)
+
+    def test_sin_count_ni_offset(self, admin_client, historial):
+        primera = admin_client.get('/api/reservas/', {'paginacion': 'cursor'}).json()
+
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            response = admin_client.get(primera['next'])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert queries
+        sql = ' '.join(queries).upper()
+        assert 'COUNT(' not in sql
+        assert 'OFFSET' not in sql
+
+    def test_previous_vuelve_a_la_pagina_anterior(self, admin_client, historial):
+        paginas = recorrer(admin_client, '/api/reservas/', {'paginacion': 'cursor'})
+
+        assert paginas[0]['previous'] is None
+        atras = admin_client.get(paginas[2]['previous']).json()
+        assert [r['id'] for r in atras['results']] == [r['id'] for r in paginas[1]['results']]
+        primera = admin_client.get(atras['previous']).json()
+        assert [r['id'] for r in primera['results']] == [r['id'] for r in paginas[0]['results']]
+        assert primera['previous'] is None
+
+    def test_respeta_filtros(self, admin_client, historial):
+        fecha = historial[0].fecha_reserva.isoformat()
+
+        paginas = recorrer(admin_client, '/api/reservas/', {'paginacion': 'cursor', 'fecha_reserva': fecha})
+
+        assert sum(len(p['results']) for p in paginas) == 15
+
+    def test_cursor_invalido(self, admin_client):
+        response = admin_client.get('/api/reservas/', {'cursor': 'no-es-un-cursor'})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_paginacion_por_numero_sigue_por_defecto(self, admin_client, historial):
+        data = admin_client.get('/api/reservas/', {'all': 'true'}).json()
+        assert data['count'] == 120
+
+
+@pytest.mark.api
+class TestPaginacionCursorBloqueos:
+    """Modo ?paginacion=cursor de /api/bloqueos/ (hora_inicio puede ser NULL)"""
+
+    def test_recorre_bloqueos_parciales_y_de_dia_completo(self, admin_client, user_admin):
+        inicio = date.today() + timedelta(days=1)
+        for i, mesa in enumerate(MesaFactory.create_batch(60)):
+            horas = {'hora_inicio': time(14, 0), 'hora_fin': time(16, 0)} if i % 2 else {}
+            BloqueoMesaFactory(mesa=mesa, usuario_creador=user_admin,
+                               fecha_inicio=inicio + timedelta(days=i % 4), **horas)
+
+        paginas = recorrer(admin_client, '/api/bloqueos/', {'paginacion': 'cursor'})
+
+        ids = [b['id'] for pagina in paginas for b in pagina['results']]
+        assert ids == list(BloqueoMesa.objects.order_by('-fecha_inicio', '-id').values_list('id', flat=True))
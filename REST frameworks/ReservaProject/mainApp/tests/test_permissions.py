@@ -7,10 +7,15 @@ tengan los permisos correctos para cada operación.
 
 import pytest
 from datetime import date, timedelta
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from mainApp import permissions
+from mainApp.models import Perfil
 from mainApp.tests.factories import (
-    UserFactory, PerfilAdminFactory, PerfilClienteFactory,
+    UserFactory, PerfilFactory, PerfilAdminFactory, PerfilClienteFactory,
     PerfilCajeroFactory, MesaFactory, ReservaFactory
 )
 
@@ -151,6 +156,37 @@ class TestReservaPermissions:
         reserva_cliente2.refresh_from_db()
         assert reserva_cliente2.num_personas == 2
 
+    def test_cliente_cancela_su_reserva(self, api_client):
+        """Un cliente puede cancelar su propia reserva (Mis reservas)"""
+        cliente = PerfilClienteFactory().user
+        reserva = ReservaFactory(cliente=cliente, estado='pendiente')
+        api_client.force_authenticate(user=cliente)
+
+        response = api_client.patch(
+            f'/api/reservas/{reserva.id}/cambiar_estado/', {'estado': 'cancelada'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        reserva.refresh_from_db()
+        assert reserva.estado == 'cancelada'
+
+    def test_cliente_no_puede_cambiar_estado_de_otro(self, api_client):
+        """Un cliente NO debe poder cambiar el estado de reservas de otros"""
+        cliente = PerfilClienteFactory().user
+        reserva_otro = ReservaFactory(cliente=PerfilClienteFactory().user, estado='pendiente')
+        api_client.force_authenticate(user=cliente)
+
+        response = api_client.patch(
+            f'/api/reservas/{reserva_otro.id}/cambiar_estado/', {'estado': 'cancelada'}, format='json'
+        )
+
+        assert response.status_code in [
+            status.HTTP_404_NOT_FOUND,
+            status.HTTP_403_FORBIDDEN
+        ]
+        reserva_otro.refresh_from_db()
+        assert reserva_otro.estado == 'pendiente'
+
     def test_cliente_no_puede_eliminar_reserva_de_otro(self, api_client):
         """Un cliente NO debe poder eliminar reservas de otros"""
         perfil1 = PerfilClienteFactory()
@@ -486,3 +522,73 @@ class TestAutenticacionFlow:
             status.HTTP_401_UNAUTHORIZED,
             status.HTTP_200_OK  # Si el endpoint es público
         ]
+
+
+def request_de(user):
+    request = Request(APIRequestFactory().get('/'))
+    request.user = user
+    return request
+
+
+TODOS = set(permissions.ROLES)
+
+# clase: (roles con acceso a la vista, roles con acceso a un objeto ajeno, roles con acceso a uno propio)
+TABLA = {
+    permissions.IsAdministrador: ({'admin'}, {'admin'}, {'admin'}),
+    permissions.IsCajero: ({'cajero'}, {'cajero'}, {'cajero'}),
+    permissions.IsMesero: ({'mesero'}, {'mesero'}, {'mesero'}),
+    permissions.IsCliente: ({'cliente'}, set(), {'cliente'}),
+    permissions.IsAdminOrCajero: ({'admin', 'cajero'}, {'admin', 'cajero'}, {'admin', 'cajero'}),
+    permissions.IsAdminOrCajeroOrMesero: (TODOS - {'cliente'}, TODOS - {'cliente'}, TODOS - {'cliente'}),
+    permissions.IsOwnerOrAdmin: (TODOS, {'admin'}, TODOS),
+    permissions.IsAdminOrCajeroOrOwner: (TODOS, {'admin', 'cajero'}, TODOS),
+}
+
+
+@pytest.mark.permissions
+@pytest.mark.unit
+class TestTablaDePermisos:
+    """Cada clase de permiso contra cada rol, a nivel de vista y de objeto"""
+
+    @pytest.mark.parametrize('clase', TABLA, ids=lambda clase: clase.__name__)
+    def test_roles(self, clase):
+        vista, ajeno, propio = TABLA[clase]
+        otro = UserFactory()
+        for rol in permissions.ROLES:
+            user = PerfilFactory(rol=rol).user
+            reserva_ajena = ReservaFactory.build(cliente=otro)
+            reserva_propia = ReservaFactory.build(cliente=user)
+            permiso = clase()
+
+            assert permiso.has_permission(request_de(user), None) == (rol in vista), rol
+            assert permiso.has_object_permission(request_de(user), None, reserva_ajena) == (rol in ajeno), rol
+            assert permiso.has_object_permission(request_de(user), None, reserva_propia) == (rol in propio), rol
+            assert permiso.has_object_permission(request_de(user), None, user.perfil) == (rol in propio), rol
+
+    @pytest.mark.parametrize('clase', TABLA, ids=lambda clase: clase.__name__)
+    def test_anonimo_y_sin_perfil(self, clase):
+        sin_perfil = UserFactory()
+        Perfil.objects.filter(user=sin_perfil).delete()
+        sin_perfil = type(sin_perfil).objects.get(pk=sin_perfil.pk)
+        reserva = ReservaFactory.build(cliente=sin_perfil)
+
+        assert not clase().has_permission(request_de(AnonymousUser()), None)
+        assert not clase().has_object_permission(request_de(sin_perfil), None, reserva)
+
+    def test_rol_se_resuelve_una_vez_por_request(self, api_client):
+        cajero = PerfilCajeroFactory().user
+        reserva = ReservaFactory(num_personas=2)
+        api_client.force_authenticate(user=cajero)
+
+        with mock.patch.object(permissions, '_resolver_rol', wraps=permissions._resolver_rol) as resolver:
+            response = api_client.patch(f'/api/reservas/{reserva.id}/', {'num_personas': 3}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert resolver.call_count == 1
+
+    def test_rol_de_se_vuelve_a_resolver_si_cambia_el_usuario(self):
+        request = request_de(PerfilAdminFactory().user)
+        assert permissions.rol_de(request) == 'admin'
+
+        request.user = PerfilClienteFactory().user
+        assert permissions.rol_de(request) == 'cliente'
@@ -0,0 +1,137 @@
+"""
+Tests para los recordatorios de reservas próximas (mainApp/recordatorios.py)
+"""
+
+import pytest
+from datetime import datetime, time, timedelta
+from unittest.mock import patch
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mainApp.models import Perfil, Reserva
+from mainApp.recordatorios import enviar_recordatorios, reservas_para_recordar
+from mainApp.tests.factories import MesaFactory, ReservaFactory, UserFactory
+
+
+@pytest.fixture
+def ahora(fecha_futura):
+    """Las 20:00 del día anterior a fecha_futura (la ventana de 24 h cruza la medianoche)."""
+    return timezone.make_aware(datetime.combine(fecha_futura - timedelta(days=1), time(20, 0)))
+
+
+def reserva(fecha, hora, **kwargs):
+    return ReservaFactory(fecha_reserva=fecha, hora_inicio=hora, **kwargs)
+
+
+@pytest.mark.unit
+class TestRecordatorios:
+    """Ventana, marcado y envío por bloques"""
+
+    def test_envia_solo_dentro_de_la_ventana(self, ahora, fecha_futura):
+        dentro = reserva(fecha_futura, time(14, 0))
+        al_limite = reserva(fecha_futura, time(20, 0))
+        reserva(fecha_futura, time(20, 30))                           # 24,5 h después
+        reserva(fecha_futura + timedelta(days=1), time(14, 0))
+        reserva(fecha_futura, time(12, 0), estado='cancelada')
+
+        resultado = enviar_recordatorios(ahora=ahora)
+
+        assert resultado == {'enviados': 2, 'fallidos': 0}
+        assert sorted(m.to[0] for m in mail.outbox) == sorted(
+            [dentro.cliente.email, al_limite.cliente.email]
+        )
+        assert 'Recordatorio de Reserva' in mail.outbox[0].subject
+
+    def test_no_repite_recordatorios(self, ahora, fecha_futura):
+        enviada = reserva(fecha_futura, time(14, 0))
+
+        enviar_recordatorios(ahora=ahora)
+        assert enviar_recordatorios(ahora=ahora) == {'enviados': 0, 'fallidos': 0}
+
+        enviada.refresh_from_db()
+        assert enviada.recordatorio_enviado_at is not None
+        assert len(mail.outbox) == 1
+
+    def test_los_fallidos_se_reintentan(self, ahora, fecha_futura):
+        reservas = [reserva(fecha_futura, time(12 + i, 0)) for i in range(3)]
+        rechazado = reservas[1].cliente.email
+        enviar_original = mail.get_connection().__class__.send_messages
+
+        def enviar(backend, mensajes):
+            if mensajes[0].to == [rechazado]:
+                raise OSError('550 Mailbox unavailable')
+            return enviar_original(backend, mensajes)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', enviar):
+            assert enviar_recordatorios(ahora=ahora) == {'enviados': 2, 'fallidos': 1}
+
+        assert list(reservas_para_recordar(ahora=ahora)) == [reservas[1]]
+        assert enviar_recordatorios(ahora=ahora)['enviados'] == 1
+
+    def test_link_del_invitado_funciona(self, api_client, ahora, fecha_futura):
+        vigente, vencido = reserva(fecha_futura, time(13, 0)), reserva(fecha_futura, time(15, 0))
+        expiraciones = {vigente: timedelta(hours=1), vencido: timedelta(hours=-1)}
+        for r, margen in expiraciones.items():
+            Perfil.objects.filter(user=r.cliente).update(
+                es_invitado=True, token_activacion=f'token-{r.id}', token_expira=timezone.now() + margen
+            )
+
+        enviar_recordatorios(ahora=ahora)
+
+        vigente.cliente.perfil.refresh_from_db()
+        vencido.cliente.perfil.refresh_from_db()
+        assert vigente.cliente.perfil.token_activacion == f'token-{vigente.id}'
+        assert vencido.cliente.perfil.token_es_valido()
+        for r in (vigente, vencido):
+            token = r.cliente.perfil.token_activacion
+            cuerpo, = [m.body for m in mail.outbox if m.to == [r.cliente.email]]
+            assert f'/reserva/{token}' in cuerpo
+            assert api_client.get(f'/api/reserva-invitado/{token}/').status_code == 200
+
+    def test_lectura_por_bloques_con_una_sola_query(self, ahora, fecha_futura):
+        clientes = UserFactory.create_batch(3)
+        for i, mesa in enumerate(MesaFactory.create_batch(7)):
+            reserva(fecha_futura, time(14, 0), mesa=mesa, cliente=clientes[i % 3])
+
+        with CaptureQueriesContext(connection) as queries:
+            resultado = enviar_recordatorios(ahora=ahora, tamano_bloque=3)
+
+        assert resultado['enviados'] == 7
+        selects = [q for q in queries if q['sql'].startswith('SELECT')]
+        updates = [q for q in queries if q['sql'].startswith('UPDATE')]
+        assert len(selects) == 1
+        assert len(updates) == 3  # Un UPDATE por bloque
+        assert '"mainApp_perfil"."rut"' not in selects[0]['sql']
+
+    def test_command(self):
+        # Dentro de 2 horas, aunque caiga fuera del horario de atención
+        inicio = timezone.localtime() + timedelta(hours=2)
+        with patch('mainApp.models.Reserva.full_clean'):
+            reserva(inicio.date(), inicio.time().replace(second=0, microsecond=0))
+
+        call_command('enviar_recordatorios', horas=3)
+
+        assert len(mail.outbox) == 1
+        assert Reserva.objects.filter(recordatorio_enviado_at__isnull=False).count() == 1
+
+    @pytest.mark.parametrize('opciones, enviados', [
+        ({'continuo': True}, 1),
+        ({'continuo': True, 'recordatorios_cada': 0}, 0),
+        ({}, 0),
+    ])
+    def test_worker_de_emails_envia_recordatorios(self, opciones, enviados):
+        inicio = timezone.localtime() + timedelta(hours=2)
+        with patch('mainApp.models.Reserva.full_clean'):
+            reserva(inicio.date(), inicio.time().replace(second=0, microsecond=0))
+
+        # El worker continuo se detiene en su primera espera
+        with patch('mainApp.management.commands.procesar_emails.time.sleep', side_effect=KeyboardInterrupt):
+            try:
+                call_command('procesar_emails', **opciones)
+            except KeyboardInterrupt:
+                pass
+
+        assert len(mail.outbox) == enviados
+        assert Reserva.objects.filter(recordatorio_enviado_at__isnull=False).count() == enviados
@@ -0,0 +1,261 @@
+"""
+Tests para el motor de recurrencia de bloqueos (mainApp/recurrencia.py)
+
+Verifican la expansión de las reglas, la materialización en
+OcurrenciaBloqueo al guardar y que las consultas de disponibilidad solo la lean.
+"""
+
+import pytest
+from io import StringIO
+from datetime import date, time, timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from mainApp import cache_disponibilidad
+from mainApp.models import BloqueoMesa, OcurrenciaBloqueo
+from mainApp.recurrencia import (
+    HORIZONTE_MAXIMO_DIAS, extender_ocurrencias, fechas_del_bloqueo, horizonte_maximo, sumar_meses
+)
+from mainApp.disponibilidad import disponibilidad_del_dia, disponibilidad_rango, mesas_no_disponibles_ids
+from mainApp.tests.factories import MesaFactory
+
+
+@pytest.fixture
+def crear_bloqueo(user_admin):
+    def crear(mesa, fecha_inicio, fecha_fin=None, tipo_recurrencia='ninguna', **kwargs):
+        return BloqueoMesa.objects.create(
+            mesa=mesa, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin or fecha_inicio,
+            tipo_recurrencia=tipo_recurrencia, motivo='Test', usuario_creador=user_admin,
+            **kwargs
+        )
+    return crear
+
+
+def hoy():
+    return timezone.now().date()
+
+
+@pytest.mark.unit
+class TestFechasDelBloqueo:
+    """Expansión de reglas en memoria"""
+
+    def _bloqueo(self, inicio, fin, tipo):
+        return BloqueoMesa(fecha_inicio=inicio, fecha_fin=fin, tipo_recurrencia=tipo)
+
+    def test_sin_recurrencia_recorta_al_rango(self):
+        bloqueo = self._bloqueo(date(2030, 1, 10), date(2030, 1, 12), 'ninguna')
+        assert fechas_del_bloqueo(bloqueo, date(2030, 1, 11), date(2030, 2, 1)) == [
+            date(2030, 1, 11), date(2030, 1, 12)
+        ]
+
+    def test_semanal_multidia(self):
+        bloqueo = self._bloqueo(date(2030, 1, 7), date(2030, 1, 8), 'semanal')
+        assert fechas_del_bloqueo(bloqueo, date(2030, 1, 8), date(2030, 1, 21)) == [
+            date(2030, 1, 8), date(2030, 1, 14), date(2030, 1, 15), date(2030, 1, 21)
+        ]
+
+    def test_diaria_desde_fecha_lejana(self):
+        bloqueo = self._bloqueo(date(2030, 1, 1), date(2030, 1, 1), 'diaria')
+        assert fechas_del_bloqueo(bloqueo, date(2031, 6, 1), date(2031, 6, 3)) == [
+            date(2031, 6, 1), date(2031, 6, 2), date(2031, 6, 3)
+        ]
+        assert fechas_del_bloqueo(bloqueo, date(2029, 12, 1), date(2029, 12, 31)) == []
+
+    def test_mensual_ajusta_fin_de_mes(self):
+        bloqueo = self._bloqueo(date(2030, 1, 31), date(2030, 1, 31), 'mensual')
+        assert fechas_del_bloqueo(bloqueo, date(2030, 2, 1), date(2030, 4, 30)) == [
+            date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)
+        ]
+        assert sumar_meses(date(2031, 12, 15), 1) == date(2032, 1, 15)
+
+    def test_esta_activo_en_fecha_hora_respeta_recurrencia(self):
+        bloqueo = self._bloqueo(date(2030, 1, 7), date(2030, 1, 7), 'semanal')
+        bloqueo.activo = True
+        assert bloqueo.esta_activo_en_fecha_hora(date(2030, 1, 28))
+        assert not bloqueo.esta_activo_en_fecha_hora(date(2030, 1, 29))
+
+
+@pytest.mark.models
+class TestOcurrenciasMaterializadas:
+    """Materialización al guardar, acotada al horizonte, en OcurrenciaBloqueo"""
+
+    def test_guardar_expande_hasta_el_horizonte(self, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        bloqueo = crear_bloqueo(MesaFactory(), inicio, tipo_recurrencia='semanal')
+
+        bloqueo.refresh_from_db()
+        assert bloqueo.ocurrencias_hasta == horizonte_maximo()
+        assert list(OcurrenciaBloqueo.objects.order_by('fecha').values_list('fecha', flat=True)) == \
+            fechas_del_bloqueo(bloqueo, inicio, horizonte_maximo())
+
+    def test_consultas_no_escriben(self, api_client, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        mesa = MesaFactory()
+        crear_bloqueo(mesa, inicio, tipo_recurrencia='semanal')
+        objetivo = inicio + timedelta(weeks=3)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert mesa.id in mesas_no_disponibles_ids(objetivo, time(14, 0))
+            assert mesa.id not in mesas_no_disponibles_ids(objetivo + timedelta(days=1), time(14, 0))
+            disponibilidad_del_dia(objetivo, 2)
+            list(disponibilidad_rango(inicio, objetivo, 2))
+            api_client.get('/api/horas-disponibles/', {'fecha': objetivo.isoformat()})
+
+        escrituras = [q['sql'] for q in queries if not q['sql'].lstrip().upper().startswith('SELECT')]
+        assert escrituras == []
+
+    def test_horizonte_acotado(self, crear_bloqueo):
+        mesa = MesaFactory()
+        crear_bloqueo(mesa, hoy() + timedelta(days=1), tipo_recurrencia='diaria')
+
+        assert OcurrenciaBloqueo.objects.count() == HORIZONTE_MAXIMO_DIAS
+        mas_alla = hoy() + timedelta(days=HORIZONTE_MAXIMO_DIAS + 1)
+        assert mesa.id not in mesas_no_disponibles_ids(mas_alla, time(14, 0))
+
+    def test_sin_recurrencia_se_expande_completo(self, crear_bloqueo):
+        inicio = hoy() + timedelta(days=HORIZONTE_MAXIMO_DIAS + 10)
+        mesa = MesaFactory()
+        crear_bloqueo(mesa, inicio, inicio + timedelta(days=2))
+
+        assert mesa.id in mesas_no_disponibles_ids(inicio + timedelta(days=1), time(14, 0))
+        assert OcurrenciaBloqueo.objects.count() == 3
+
+    def test_editar_regenera(self, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        mesa = MesaFactory()
+        bloqueo = crear_bloqueo(mesa, inicio, tipo_recurrencia='semanal')
+
+        bloqueo.fecha_inicio = bloqueo.fecha_fin = inicio + timedelta(days=1)
+        bloqueo.hora_inicio, bloqueo.hora_fin = time(12, 0), time(13, 0)
+        bloqueo.save()
+
+        ocurrencias = OcurrenciaBloqueo.objects.filter(bloqueo=bloqueo)
+        assert ocurrencias.exists()
+        assert all(o.fecha.weekday() == bloqueo.fecha_inicio.weekday() for o in ocurrencias)
+        assert all(o.hora_inicio == time(12, 0) for o in ocurrencias)
+
+    def test_desactivar_elimina_ocurrencias(self, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        mesa = MesaFactory()
+        bloqueo = crear_bloqueo(mesa, inicio, tipo_recurrencia='semanal')
+
+        bloqueo.activo = False
+        bloqueo.save()
+        extender_ocurrencias()
+
+        assert not OcurrenciaBloqueo.objects.exists()
+        assert mesa.id not in mesas_no_disponibles_ids(inicio + timedelta(weeks=1), time(14, 0))
+
+    def test_update_fields_regenera_y_guarda_el_punto_expandido(self, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        bloqueo = crear_bloqueo(MesaFactory(), inicio, tipo_recurrencia='semanal')
+        BloqueoMesa.objects.filter(pk=bloqueo.pk).update(ocurrencias_hasta=inicio)
+
+        bloqueo.hora_inicio, bloqueo.hora_fin = time(12, 0), time(13, 0)
+        bloqueo.save(update_fields=['hora_inicio', 'hora_fin'])
+
+        bloqueo.refresh_from_db()
+        assert bloqueo.ocurrencias_hasta == horizonte_maximo()
+        ocurrencias = OcurrenciaBloqueo.objects.filter(bloqueo=bloqueo)
+        assert ocurrencias.count() == len(fechas_del_bloqueo(bloqueo, inicio, horizonte_maximo()))
+        assert all(o.hora_inicio == time(12, 0) for o in ocurrencias)
+
+    def test_extender_avanza_el_horizonte(self, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        bloqueo = crear_bloqueo(MesaFactory(), inicio, tipo_recurrencia='diaria')
+        # Como si el bloqueo se hubiera guardado hace 10 días
+        corte = horizonte_maximo() - timedelta(days=10)
+        BloqueoMesa.objects.filter(pk=bloqueo.pk).update(ocurrencias_hasta=corte)
+        OcurrenciaBloqueo.objects.filter(fecha__gt=corte).delete()
+
+        salida = StringIO()
+        call_command('extender_ocurrencias', stdout=salida)
+
+        assert 'Bloqueos extendidos: 1' in salida.getvalue()
+        assert OcurrenciaBloqueo.objects.count() == HORIZONTE_MAXIMO_DIAS
+        # Al día: una sola query y nada que escribir
+        with CaptureQueriesContext(connection) as queries:
+            assert extender_ocurrencias() == 0
+        assert len(queries) == 1
+
+    def test_extender_invalida_los_dias_expandidos(self, crear_bloqueo):
+        bloqueo = crear_bloqueo(MesaFactory(), hoy() + timedelta(days=1), tipo_recurrencia='diaria')
+        corte = horizonte_maximo() - timedelta(days=3)
+        BloqueoMesa.objects.filter(pk=bloqueo.pk).update(ocurrencias_hasta=corte)
+        OcurrenciaBloqueo.objects.filter(fecha__gt=corte).delete()
+        ambitos = [cache_disponibilidad.ambito_fecha(corte), cache_disponibilidad.ambito_fecha(horizonte_maximo())]
+        antes = cache_disponibilidad.obtener_versiones(ambitos)
+
+        assert extender_ocurrencias() == 1
+
+        despues = cache_disponibilidad.obtener_versiones(ambitos)
+        # Solo cambia la versión de los días recién expandidos
+        assert despues[ambitos[0]] == antes[ambitos[0]]
+        assert despues[ambitos[1]] != antes[ambitos[1]]
+
+
+@pytest.mark.api
+class TestVistasConRecurrencia:
+    """Las vistas de disponibilidad y activos-hoy aplican las recurrencias"""
+
+    def test_horas_disponibles_descuenta_bloqueo_semanal(self, api_client, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        mesa = MesaFactory(capacidad=4)
+        MesaFactory(capacidad=4)
+        crear_bloqueo(mesa, inicio, tipo_recurrencia='semanal')
+
+        response = api_client.get('/api/horas-disponibles/', {
+            'fecha': (inicio + timedelta(weeks=2)).isoformat(), 'personas': 2
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        assert all(h['mesas_disponibles'] == 1 for h in response.json()['horas'])
+
+    def test_consultar_mesas_excluye_bloqueo_mensual(self, api_client, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        mesa = MesaFactory()
+        crear_bloqueo(mesa, inicio, tipo_recurrencia='mensual',
+                      hora_inicio=time(14, 0), hora_fin=time(16, 0))
+
+        response = api_client.get('/api/consultar-mesas/', {
+            'fecha': sumar_meses(inicio, 2).isoformat(), 'hora': '15:00'
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        assert mesa.id not in [m['id'] for m in response.json()]
+
+    def test_editar_recurrencia_invalida_cache(self, api_client, crear_bloqueo):
+        inicio = hoy() + timedelta(days=1)
+        mesa = MesaFactory(capacidad=4)
+        bloqueo = crear_bloqueo(mesa, inicio)
+        fecha = (inicio + timedelta(weeks=1)).isoformat()
+
+        antes = api_client.get('/api/horas-disponibles/', {'fecha': fecha}).json()
+        bloqueo.tipo_recurrencia = 'semanal'
+        bloqueo.save()
+        despues = api_client.get('/api/horas-disponibles/', {'fecha': fecha}).json()
+
+        assert antes['horas'][0]['mesas_disponibles'] == 1
+        assert despues['horas'][0]['mesas_disponibles'] == 0
+
+    def test_activos_hoy_incluye_recurrencia(self, admin_client, crear_bloqueo):
+        mesa = MesaFactory()
+        bloqueo = crear_bloqueo(mesa, hoy() + timedelta(days=1), tipo_recurrencia='semanal')
+        # Bloqueo que comenzó hace una semana (clean() no permite crearlo en el pasado)
+        hace_una_semana = hoy() - timedelta(weeks=1)
+        BloqueoMesa.objects.filter(pk=bloqueo.pk).update(
+            fecha_inicio=hace_una_semana, fecha_fin=hace_una_semana, ocurrencias_hasta=None
+        )
+        # update() no pasa por save(): las ocurrencias las regenera el comando
+        OcurrenciaBloqueo.objects.filter(bloqueo=bloqueo).delete()
+        extender_ocurrencias()
+        otro = crear_bloqueo(MesaFactory(), hoy() + timedelta(days=1))
+
+        response = admin_client.get('/api/bloqueos/activos-hoy/')
+
+        assert response.status_code == status.HTTP_200_OK
+        ids = [b['id'] for b in response.json()]
+        assert bloqueo.id in ids
+        assert otro.id not in ids
@@ -0,0 +1,133 @@
+"""
+Tests para la creación masiva de reservas (POST /api/reservas/bulk/)
+"""
+
+import pytest
+from datetime import date, time, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from mainApp.models import Mesa, Reserva, OcupacionSlot
+from mainApp.disponibilidad import disponibilidad_del_dia, franjas_de_reserva
+from mainApp.tests.factories import MesaFactory, ReservaFactory
+
+
+URL = '/api/reservas/bulk/'
+
+
+@pytest.fixture
+def fecha():
+    return date.today() + timedelta(days=10)
+
+
+def elemento(mesa, fecha, hora, personas=2, **extra):
+    return {
+        'mesa': mesa.id, 'fecha_reserva': fecha.isoformat(),
+        'hora_inicio': hora, 'num_personas': personas, **extra
+    }
+
+
+@pytest.mark.api
+class TestReservasLote:
+    """Validación en memoria, modos y efectos secundarios del lote"""
+
+    def test_crea_todas(self, admin_client, user_cliente, fecha):
+        mesas = [MesaFactory(capacidad=4) for _ in range(3)]
+        datos = [elemento(mesa, fecha, hora, cliente=user_cliente.id)
+                 for mesa in mesas for hora in ('12:00', '14:00', '16:00')]
+
+        response = admin_client.post(URL, {'reservas': datos}, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['creadas'] == 9
+        assert all(r['ok'] for r in response.data['resultados'])
+        reservas = Reserva.objects.filter(id__in=[r['id'] for r in response.data['resultados']])
+        assert reservas.count() == 9
+        assert all(r.cliente == user_cliente and r.hora_fin for r in reservas)
+        assert all(m.estado == 'reservada' for m in Mesa.objects.filter(id__in=[m.id for m in mesas]))
+
+    def test_mantiene_ocupacion_y_cache(self, admin_client, api_client, fecha):
+        mesa = MesaFactory(capacidad=4)
+        antes = api_client.get('/api/horas-disponibles/', {'fecha': fecha.isoformat()}).json()
+
+        admin_client.post(URL, {'reservas': [elemento(mesa, fecha, '12:00')]}, format='json')
+
+        reserva = Reserva.objects.get(mesa=mesa)
+        assert sorted(OcupacionSlot.objects.filter(reserva=reserva).values_list('slot', flat=True)) == \
+            franjas_de_reserva(reserva.hora_inicio, reserva.hora_fin)
+        despues = api_client.get('/api/horas-disponibles/', {'fecha': fecha.isoformat()}).json()
+        assert antes['horas'][0]['mesas_disponibles'] == 1
+        assert despues['horas'][0]['mesas_disponibles'] == 0
+        assert despues['horas'][0]['mesas_disponibles'] == disponibilidad_del_dia(fecha, 1)[0]
+
+    def test_todo_o_nada_no_crea_si_hay_errores(self, admin_client, fecha):
+        mesa = MesaFactory(capacidad=4)
+        ReservaFactory(mesa=mesa, fecha_reserva=fecha, hora_inicio=time(14, 0))
+        datos = [
+            elemento(mesa, fecha, '12:00'),
+            elemento(mesa, fecha, '15:00'),                  # Solapa con la existente
+            elemento(mesa, fecha, '18:00', personas=10),     # Excede capacidad
+            elemento(mesa, fecha, '10:00'),                  # Antes de la apertura
+        ]
+
+        response = admin_client.post(URL, {'reservas': datos}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['creadas'] == 0
+        resultados = response.data['resultados']
+        assert resultados[0] == {'indice': 0, 'ok': False}
+        assert 'Solapamiento' in str(resultados[1]['errores'])
+        assert 'num_personas' in resultados[2]['errores']
+        assert 'hora_inicio' in resultados[3]['errores']
+        assert Reserva.objects.filter(mesa=mesa).count() == 1
+
+    def test_parcial_crea_las_validas(self, admin_client, fecha):
+        mesa = MesaFactory(capacidad=4)
+        datos = [
+            elemento(mesa, fecha, '12:00'),
+            elemento(mesa, fecha, '13:00'),   # Solapa con el elemento anterior del lote
+            elemento(mesa, fecha, '14:00'),   # Consecutiva: válida
+            elemento(mesa, fecha, '17:00', estado='cancelada'),
+            {'mesa': 999999, 'fecha_reserva': fecha.isoformat(), 'hora_inicio': '12:00', 'num_personas': 2},
+        ]
+
+        response = admin_client.post(URL, {'reservas': datos, 'modo': 'parcial'}, format='json')
+
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [r['ok'] for r in response.data['resultados']] == [True, False, True, True, False]
+        assert 'mesa' in response.data['resultados'][4]['errores']
+        assert Reserva.objects.filter(mesa=mesa).count() == 3
+
+    def test_queries_constantes(self, admin_client, fecha):
+        mesas = [MesaFactory(capacidad=4) for _ in range(5)]
+
+        def lote(n_horas, dia):
+            horas = ['12:00', '14:00', '16:00', '18:00'][:n_horas]
+            return [elemento(mesa, dia, hora) for mesa in mesas for hora in horas]
+
+        # La identidad del token se cachea en el primer request (ver autenticacion.py)
+        admin_client.get('/api/mesas/')
+        with CaptureQueriesContext(connection) as pequeno:
+            admin_client.post(URL, {'reservas': lote(1, fecha)}, format='json')
+        with CaptureQueriesContext(connection) as grande:
+            admin_client.post(URL, {'reservas': lote(4, fecha + timedelta(days=1))}, format='json')
+
+        assert Reserva.objects.count() == 25
+        assert len(grande) == len(pequeno)
+
+    def test_validaciones_del_request(self, admin_client, fecha):
+        mesa = MesaFactory()
+        assert admin_client.post(URL, {'reservas': []}, format='json').status_code == 400
+        assert admin_client.post(
+            URL, {'reservas': [elemento(mesa, fecha, '12:00')], 'modo': 'otro'}, format='json'
+        ).status_code == 400
+        assert admin_client.post(
+            URL, {'reservas': [elemento(mesa, fecha, '12:00')] * 501}, format='json'
+        ).status_code == 400
+
+    def test_solo_admin_o_cajero(self, authenticated_client, fecha):
+        mesa = MesaFactory()
+        response = authenticated_client.post(
+            URL, {'reservas': [elemento(mesa, fecha, '12:00')]}, format='json'
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,164 @@
+"""
+Tests para el cambio de estado masivo (PATCH /api/reservas/cambiar-estado-masivo/)
+"""
+
+import logging
+import pytest
+from datetime import date, time, timedelta
+from django.db import connection
+from rest_framework import status
+from mainApp.models import Mesa, OcupacionSlot, Reserva
+from mainApp.tests.factories import MesaFactory, ReservaFactory
+
+
+URL = '/api/reservas/cambiar-estado-masivo/'
+HORAS = (time(12, 0), time(14, 0), time(16, 0), time(18, 0))
+
+
+@pytest.fixture
+def manana():
+    return date.today() + timedelta(days=1)
+
+
+def reservas_del_dia(fecha, mesas, estado='activa'):
+    return [
+        ReservaFactory(mesa=mesa, fecha_reserva=fecha, hora_inicio=hora, estado=estado)
+        for mesa in mesas for hora in HORAS
+    ]
+
+
+@pytest.mark.api
+class TestCambioDeEstadoMasivo:
+    """Validación, modos y efectos sobre mesas, ocupación y auditoría"""
+
+    def test_completa_todas_y_libera_las_mesas(self, admin_client, manana):
+        mesas = MesaFactory.create_batch(3, estado='ocupada')
+        reservas = reservas_del_dia(manana, mesas)
+
+        response = admin_client.patch(
+            URL, {'ids': [r.id for r in reservas], 'estado': 'completada'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['cambiadas'] == 12
+        assert all(r['ok'] and r['estado_anterior'] == 'activa' for r in response.data['resultados'])
+        assert set(Reserva.objects.filter(id__in=[r.id for r in reservas]).values_list('estado', flat=True)) == {'completada'}
+        assert not OcupacionSlot.objects.filter(reserva__in=reservas).exists()
+        assert set(Mesa.objects.filter(id__in=[m.id for m in mesas]).values_list('estado', flat=True)) == {'disponible'}
+
+    def test_mesa_con_otras_reservas_no_queda_disponible(self, admin_client, manana):
+        mesa_libre, mesa_con_otra = MesaFactory.create_batch(2, estado='ocupada')
+        cerrar = [
+            ReservaFactory(mesa=mesa_libre, fecha_reserva=manana, hora_inicio=time(12, 0), estado='activa'),
+            ReservaFactory(mesa=mesa_con_otra, fecha_reserva=manana, hora_inicio=time(12, 0), estado='activa'),
+        ]
+        ReservaFactory(mesa=mesa_con_otra, fecha_reserva=manana, hora_inicio=time(20, 0), estado='pendiente')
+
+        admin_client.patch(URL, {'ids': [r.id for r in cerrar], 'estado': 'completada'}, format='json')
+
+        mesa_libre.refresh_from_db()
+        mesa_con_otra.refresh_from_db()
+        assert mesa_libre.estado == 'disponible'
+        assert mesa_con_otra.estado == 'ocupada'
+
+    def test_activar_ocupa_las_mesas_y_mantiene_la_ocupacion(self, admin_client, manana):
+        mesas = MesaFactory.create_batch(2, estado='reservada')
+        reservas = [
+            ReservaFactory(mesa=mesa, fecha_reserva=manana, hora_inicio=time(12, 0), estado='pendiente')
+            for mesa in mesas
+        ]
+        franjas = OcupacionSlot.objects.filter(reserva__in=reservas).count()
+
+        response = admin_client.patch(URL, {'ids': [r.id for r in reservas], 'estado': 'activa'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert set(Mesa.objects.filter(id__in=[m.id for m in mesas]).values_list('estado', flat=True)) == {'ocupada'}
+        assert OcupacionSlot.objects.filter(reserva__in=reservas).count() == franjas
+
+    def test_reservas_lejanas_no_cambian_la_mesa(self, admin_client):
+        mesa = MesaFactory(estado='reservada')
+        reserva = ReservaFactory(mesa=mesa, fecha_reserva=date.today() + timedelta(days=30),
+                                 hora_inicio=time(12, 0), estado='pendiente')
+
+        admin_client.patch(URL, {'ids': [reserva.id], 'estado': 'cancelada'}, format='json')
+
+        mesa.refresh_from_db()
+        assert mesa.estado == 'reservada'
+
+    def test_todo_o_nada_no_cambia_si_hay_errores(self, admin_client, manana):
+        mesa = MesaFactory()
+        activa = ReservaFactory(mesa=mesa, fecha_reserva=manana, hora_inicio=time(12, 0), estado='activa')
+        completada = ReservaFactory(mesa=mesa, fecha_reserva=manana, hora_inicio=time(14, 0), estado='completada')
+
+        response = admin_client.patch(
+            URL, {'ids': [activa.id, completada.id, 999999], 'estado': 'cancelada'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        resultados = {r['id']: r for r in response.data['resultados']}
+        assert resultados[activa.id] == {'id': activa.id, 'ok': False}
+        assert 'Transición inválida de completada a cancelada' in resultados[completada.id]['error']
+        assert resultados[999999]['error'] == 'Reserva no encontrada'
+        activa.refresh_from_db()
+        assert activa.estado == 'activa'
+
+    def test_parcial_cambia_las_validas(self, admin_client, manana):
+        mesa = MesaFactory()
+        activa = ReservaFactory(mesa=mesa, fecha_reserva=manana, hora_inicio=time(12, 0), estado='activa')
+        pasada = ReservaFactory(mesa=mesa, fecha_reserva=manana, hora_inicio=time(14, 0), estado='activa')
+        Reserva.objects.filter(pk=pasada.pk).update(fecha_reserva=date.today() - timedelta(days=1))
+
+        response = admin_client.patch(
+            URL, {'ids': [activa.id, pasada.id], 'estado': 'completada', 'modo': 'parcial'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [r['ok'] for r in response.data['resultados']] == [True, False]
+        assert 'fechas pasadas' in response.data['resultados'][1]['error']
+        assert Reserva.objects.get(pk=activa.pk).estado == 'completada'
+        assert Reserva.objects.get(pk=pasada.pk).estado == 'activa'
+
+    def test_una_linea_de_auditoria_por_reserva(self, admin_client, manana, caplog):
+        reservas = reservas_del_dia(manana, MesaFactory.create_batch(2))
+
+        with caplog.at_level(logging.INFO, logger='mainApp.audit'):
+            admin_client.patch(URL, {'ids': [r.id for r in reservas], 'estado': 'cancelada'}, format='json')
+
+        lineas = [r.getMessage() for r in caplog.records if r.name == 'mainApp.audit']
+        assert len(lineas) == len(reservas)
+        assert all('ESTADO_CAMBIADO' in linea and 'Estado_Nuevo=cancelada' in linea for linea in lineas)
+
+    def test_queries_constantes(self, admin_client, manana):
+        def contar(reservas):
+            sql = []
+            with connection.execute_wrapper(lambda execute, q, *args: sql.append(q) or execute(q, *args)):
+                response = admin_client.patch(
+                    URL, {'ids': [r.id for r in reservas], 'estado': 'completada'}, format='json'
+                )
+            assert response.status_code == status.HTTP_200_OK
+            return len(sql)
+
+        # La identidad del token se cachea en el primer request (ver autenticacion.py)
+        admin_client.get('/api/mesas/')
+        pocas = contar(reservas_del_dia(manana, MesaFactory.create_batch(1))[:1])
+        muchas = contar(reservas_del_dia(manana, MesaFactory.create_batch(5)))
+
+        assert muchas == pocas
+
+    def test_validaciones_del_request(self, admin_client):
+        reserva = ReservaFactory()
+        assert admin_client.patch(URL, {'ids': [], 'estado': 'cancelada'}, format='json').status_code == 400
+        assert admin_client.patch(URL, {'ids': ['x'], 'estado': 'cancelada'}, format='json').status_code == 400
+        assert admin_client.patch(URL, {'ids': [reserva.id], 'estado': 'otro'}, format='json').status_code == 400
+        assert admin_client.patch(
+            URL, {'ids': [reserva.id], 'estado': 'cancelada', 'modo': 'otro'}, format='json'
+        ).status_code == 400
+        assert admin_client.patch(
+            URL, {'ids': list(range(1, 502)), 'estado': 'cancelada'}, format='json'
+        ).status_code == 400
+
+    def test_solo_admin_o_cajero(self, authenticated_client):
+        reserva = ReservaFactory(cliente=authenticated_client.user)
+        response = authenticated_client.patch(URL, {'ids': [reserva.id], 'estado': 'cancelada'}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert Reserva.objects.get(pk=reserva.pk).estado == reserva.estado
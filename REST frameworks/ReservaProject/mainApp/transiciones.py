@@ -0,0 +1,142 @@
+"""
+Cambio de estado de reservas, individual y masivo.
+
+Al cierre del servicio el personal completa o cancela decenas de reservas.
+Con cambiar_estado cada una abre su transacción, bloquea la mesa, consulta
+si quedan otras reservas y guarda la mesa. cambiar_estado_en_lote aplica un
+mismo estado a muchas reservas con queries por conjunto:
+
+- Lee y bloquea las reservas en UNA query (con su mesa, en orden de id).
+- Valida cada transición contra TRANSICIONES_VALIDAS, en memoria.
+- Actualiza todas las reservas válidas con UN UPDATE y, si dejan de ocupar
+  la mesa, borra su ocupación por franja con UN DELETE.
+- Recalcula el estado de las mesas afectadas con UN UPDATE agrupado.
+
+Modos (los mismos que la creación masiva, ver reservas_lote.py):
+- 'todo_o_nada' (default): si alguna reserva no puede cambiar no cambia ninguna.
+- 'parcial': se cambian las válidas y se informan los errores del resto.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import cache_disponibilidad
+from .disponibilidad import ESTADOS_OCUPAN_MESA
+from .models import Mesa, OcupacionSlot, Reserva
+from .reservas_lote import MODO_TODO_O_NADA
+
+
+# FIX #19 (MODERADO): Transiciones de estado válidas
+TRANSICIONES_VALIDAS = {
+    'pendiente': ['activa', 'cancelada'],
+    'activa': ['completada', 'cancelada'],
+    'completada': [],  # Estado final, no se puede cambiar
+    'cancelada': []     # Estado final, no se puede cambiar
+}
+
+ESTADOS_DESTINO = ('activa', 'completada', 'cancelada', 'pendiente')
+
+# Máximo de reservas por request
+MAX_RESERVAS_TRANSICION = 500
+
+# Estado de la mesa según el nuevo estado de la reserva. Para 'completada' y
+# 'cancelada' la mesa queda disponible solo si no tiene otras reservas
+# pendientes/activas.
+ESTADO_MESA = {
+    'activa': 'ocupada',
+    'pendiente': 'reservada',
+    'completada': 'disponible',
+    'cancelada': 'disponible',
+}
+
+
+def error_de_transicion(reserva, nuevo_estado, hoy):
+    """Motivo por el que la reserva no puede pasar a nuevo_estado, o None."""
+    # FIX #5 (CRÍTICO): No modificar reservas de fechas pasadas
+    if reserva.fecha_reserva < hoy:
+        return 'No se pueden modificar reservas de fechas pasadas'
+    if nuevo_estado not in TRANSICIONES_VALIDAS.get(reserva.estado, []):
+        return f'Transición inválida de {reserva.estado} a {nuevo_estado}'
+    return None
+
+
+def actualizar_mesas(mesa_ids, nuevo_estado):
+    """
+    Estado de las mesas tras pasar sus reservas a nuevo_estado, en un UPDATE.
+    Se llama después de actualizar las reservas: las que se liberaron ya no
+    cuentan como pendientes/activas.
+    """
+    mesas = Mesa.objects.filter(id__in=mesa_ids)
+    if ESTADO_MESA[nuevo_estado] == 'disponible':
+        mesas = mesas.exclude(Exists(Reserva.objects.filter(
+            mesa_id=OuterRef('pk'), estado__in=ESTADOS_OCUPAN_MESA
+        )))
+    if mesas.exclude(estado=ESTADO_MESA[nuevo_estado]).update(estado=ESTADO_MESA[nuevo_estado]):
+        cache_disponibilidad.invalidar('mesas')
+
+
+def cambiar_estado_en_lote(ids, nuevo_estado, modo=MODO_TODO_O_NADA):
+    """
+    Pasa las reservas 'ids' a nuevo_estado.
+
+    Args:
+        ids: list[int] - ids de las reservas (sin repetir)
+        nuevo_estado: str - uno de ESTADOS_DESTINO
+        modo: 'todo_o_nada' | 'parcial'
+
+    Returns:
+        tuple(list[dict], list[Reserva]) - resultado por id
+        ({'id', 'ok', 'estado_anterior'} o {'id', 'ok', 'error'}) y reservas
+        cambiadas (con el estado anterior en 'estado_anterior')
+    """
+    hoy = timezone.now().date()
+    resultados = {id: {'id': id, 'ok': False} for id in ids}
+
+    with transaction.atomic():
+        # 1. Reservas y sus mesas, bloqueadas en orden estable (evita deadlocks)
+        reservas = (
+            Reserva.objects.select_for_update().select_related('mesa')
+            .filter(id__in=ids).order_by('id')
+        )
+
+        # 2. Validación de cada transición, en memoria
+        validas = []
+        for reserva in reservas:
+            error = error_de_transicion(reserva, nuevo_estado, hoy)
+            if error:
+                resultados[reserva.id]['error'] = error
+            else:
+                validas.append(reserva)
+            resultados[reserva.id]['encontrada'] = True
+        for resultado in resultados.values():
+            if not resultado.pop('encontrada', False):
+                resultado['error'] = 'Reserva no encontrada'
+
+        if not validas or (modo == MODO_TODO_O_NADA and len(validas) < len(ids)):
+            return list(resultados.values()), []
+
+        # 3. Un UPDATE para todas las reservas (sin save(): no hay nada que
+        # validar en un cambio de estado, ver Reserva.CAMPOS_SIN_VALIDACION)
+        ids_validas = [reserva.id for reserva in validas]
+        Reserva.objects.filter(id__in=ids_validas).update(estado=nuevo_estado, updated_at=timezone.now())
+        if nuevo_estado not in ESTADOS_OCUPAN_MESA:
+            OcupacionSlot.objects.filter(reserva_id__in=ids_validas).delete()
+
+        # 4. FIX #13 (MODERADO): solo cambia la mesa de reservas para hoy o mañana
+        fecha_limite = hoy + timedelta(days=1)
+        actualizar_mesas(
+            {reserva.mesa_id for reserva in validas if reserva.fecha_reserva <= fecha_limite},
+            nuevo_estado,
+        )
+
+        # update() no emite post_save: invalidar la cache de disponibilidad aquí
+        cache_disponibilidad.invalidar(*{
+            cache_disponibilidad.ambito_fecha(reserva.fecha_reserva) for reserva in validas
+        })
+
+    for reserva in validas:
+        reserva.estado_anterior, reserva.estado = reserva.estado, nuevo_estado
+        resultados[reserva.id] = {'id': reserva.id, 'ok': True, 'estado_anterior': reserva.estado_anterior}
+    return list(resultados.values()), validas
@@ -12,12 +12,28 @@ from rest_framework.authtoken.models import Token
 from rest_framework.throttling import AnonRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Mesa, Perfil, Reserva, BloqueoMesa
+from .models import Mesa, Perfil, Reserva, BloqueoMesa, OcurrenciaBloqueo
+from . import cache_disponibilidad
+from .disponibilidad import (
+    MAX_DIAS_RANGO,
+    generar_horarios,
+    disponibilidad_del_dia,
+    disponibilidad_rango,
+    mesas_no_disponibles_ids
+)
+from .paginacion import PaginacionBloqueos, PaginacionReservas
+from .busqueda import BusquedaClienteFilter
+from .indice_ciego import indice_rut, indice_telefono
+from .cifrado import anotar_cifrados, campos_visibles
+from .lectura_rapida import ListadoRapidoMixin
+from .transiciones import ESTADOS_DESTINO, TRANSICIONES_VALIDAS
 from .serializers import (
     MesaSerializer,
     PerfilSerializer,
     ReservaSerializer,
     ReservaListSerializer,
+    ReservaResumenSerializer,
+    campos_solicitados,
     UserSerializer,
     RegisterSerializer,
     BloqueoMesaSerializer,
@@ -31,11 +47,14 @@ from .permissions import (
     IsAdminOrCajero,
     IsAdminOrCajeroOrMesero,
     IsOwnerOrAdmin,
-    IsAdminOrCajeroOrOwner
+    IsAdminOrCajeroOrOwner,
+    rol_de
 )
 
 
 # ============ THROTTLING CLASSES ============
+# El historial de intentos se guarda en la cache 'default': con CACHE_URL
+# configurada el límite es global y no por worker de gunicorn
 
 class RegisterRateThrottle(AnonRateThrottle):
     """Rate limiting para registro: 5 intentos por hora"""
@@ -188,7 +207,7 @@ def register_and_reserve(request):
 
             user = user_serializer.save()
 
-            # 2. Bloquear la mesa PRIMERO para evitar race conditions
+            # 2. Validar la mesa
             mesa_id = reserva_data.get('mesa')
             if not mesa_id:
                 return Response({
@@ -196,10 +215,10 @@ def register_and_reserve(request):
                     'details': {'mesa': ['Este campo es requerido']}
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            mesa = Mesa.objects.select_for_update().get(id=mesa_id)
+            mesa = Mesa.objects.get(id=mesa_id)
 
-            # 3. IMPORTANTE: Validar DESPUÉS de obtener el lock
-            # Esto previene que dos usuarios reserven la misma mesa simultáneamente
+            # 3. Validar y guardar la reserva. Las reservas simultáneas solapadas
+            # las rechaza Reserva.save() (exclusion constraint en PostgreSQL)
             reserva_serializer = ReservaSerializer(data=reserva_data)
             if not reserva_serializer.is_valid():
                 return Response({
@@ -221,7 +240,8 @@ def register_and_reserve(request):
             reservas_count = Reserva.objects.filter(cliente=user).count()
             is_additional_reservation = reservas_count > 1
 
-            # 7. Enviar email de confirmación según tipo de usuario
+            # 7. Encolar email de confirmación según tipo de usuario (outbox:
+            # se guarda con la reserva y lo envía el worker procesar_emails)
             if perfil.es_invitado:
                 # Usuario invitado: enviar email con link único y link de activación
                 enviar_email_confirmacion_invitado(reserva, perfil)
@@ -499,6 +519,37 @@ def cambiar_rol_usuario(request, user_id):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminOrCajero])
+def buscar_cliente(request):
+    """
+    Endpoint para encontrar clientes por RUT o teléfono (Admin y Cajero).
+    GET /api/clientes/buscar/?rut=12.345.678-5
+    GET /api/clientes/buscar/?telefono=+56912345678
+
+    RUT y teléfono están encriptados: la búsqueda compara sus índices ciegos
+    (una igualdad indexada), sin descifrar ninguna fila. Acepta los mismos
+    formatos que el registro (con o sin puntos, guión, espacios o +56).
+    """
+    rut = request.query_params.get('rut', '').strip()
+    telefono = request.query_params.get('telefono', '').strip()
+
+    if not rut and not telefono:
+        return Response(
+            {'error': 'Debe indicar "rut" o "telefono"'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    perfiles = Perfil.objects.select_related('user')
+    if rut:
+        perfiles = perfiles.filter(rut_indice=indice_rut(rut))
+    if telefono:
+        perfiles = perfiles.filter(telefono_indice=indice_telefono(telefono))
+
+    serializer = PerfilSerializer(perfiles, many=True, context={'request': request})
+    return Response(serializer.data)
+
+
 # ============ ENDPOINTS PARA USUARIOS INVITADOS ============
 
 @api_view(['GET'])
@@ -621,7 +672,7 @@ def cancelar_reserva_invitado(request, token):
 
             # Marcar reserva como cancelada (en lugar de eliminar)
             reserva.estado = 'cancelada'
-            reserva.save()
+            reserva.save(update_fields=['estado'])
 
             # Verificar si hay otras reservas activas/pendientes para esta mesa
             otras_reservas_activas = Reserva.objects.filter(
@@ -634,7 +685,7 @@ def cancelar_reserva_invitado(request, token):
                 mesa.estado = 'disponible'
                 mesa.save()
 
-            # Enviar email de confirmación de cancelación
+            # Encolar email de confirmación de cancelación (outbox)
             enviar_email_cancelacion_reserva(reserva, perfil)
 
         return Response({
@@ -658,6 +709,7 @@ def activar_cuenta_invitado(request):
     Body: {token, password, password_confirm}
     """
     from django.contrib.auth.hashers import make_password
+    from django.db import transaction
     from .email_service import enviar_email_bienvenida_cuenta_activada
 
     token = request.data.get('token')
@@ -723,21 +775,23 @@ def activar_cuenta_invitado(request):
                 'error': 'Este token ya fue utilizado'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Actualizar usuario y perfil
-        user = perfil.user
-        user.set_password(password)
-        user.save()
-
-        perfil.es_invitado = False
-        perfil.token_usado = True
-        perfil.save()
-
         # Generar token de autenticación
         from rest_framework.authtoken.models import Token
-        token_auth, created = Token.objects.get_or_create(user=user)
 
-        # Enviar email de bienvenida
-        enviar_email_bienvenida_cuenta_activada(perfil)
+        with transaction.atomic():
+            # Actualizar usuario y perfil
+            user = perfil.user
+            user.set_password(password)
+            user.save()
+
+            perfil.es_invitado = False
+            perfil.token_usado = True
+            perfil.save()
+
+            token_auth, created = Token.objects.get_or_create(user=user)
+
+            # Encolar email de bienvenida (outbox)
+            enviar_email_bienvenida_cuenta_activada(perfil)
 
         return Response({
             'success': True,
@@ -759,7 +813,7 @@ def activar_cuenta_invitado(request):
 
 # ============ ENDPOINTS DE MESAS ============
 
-class MesaViewSet(viewsets.ModelViewSet):
+class MesaViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     """
     ViewSet para el CRUD completo de Mesas.
     Solo los Administradores pueden modificar.
@@ -824,58 +878,41 @@ class ConsultaMesasView(views.APIView):
         fecha_str = request.query_params.get('fecha', None)
         hora_str = request.query_params.get('hora', None)
 
-        # Obtener todas las mesas o filtrar por estado
-        if estado:
-            mesas = Mesa.objects.filter(estado=estado)
-        else:
-            mesas = Mesa.objects.all()
-
         # Si se proporciona fecha y hora, filtrar mesas disponibles
+        fecha = hora_inicio = None
         if fecha_str and hora_str:
-            from datetime import datetime, timedelta
+            from datetime import datetime
 
             try:
                 fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
                 hora_inicio = datetime.strptime(hora_str, '%H:%M').time()
-
-                # Calcular hora fin (2 horas después)
-                dt_inicio = datetime.combine(fecha, hora_inicio)
-                dt_fin = dt_inicio + timedelta(hours=2)
-                hora_fin = dt_fin.time()
-
-                # Obtener mesas con reservas que se solapen
-                mesas_ocupadas_ids = Reserva.objects.filter(
-                    fecha_reserva=fecha,
-                    estado__in=['pendiente', 'activa'],
-                    # Verificar solapamiento de horarios:
-                    # La nueva reserva se solapa si:
-                    # - Su hora_inicio es antes de hora_fin de reserva existente Y
-                    # - Su hora_fin es después de hora_inicio de reserva existente
-                ).filter(
-                    Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio)
-                ).values_list('mesa_id', flat=True)
-
-                # Obtener mesas con bloqueos activos que se solapen
-                mesas_bloqueadas_ids = BloqueoMesa.objects.filter(
-                    activo=True,
-                    fecha_inicio__lte=fecha,
-                    fecha_fin__gte=fecha
-                ).filter(
-                    # Si el bloqueo tiene horario, verificar solapamiento de horas
-                    # Si el bloqueo es de día completo (hora_inicio=None), bloquear toda la mesa
-                    Q(hora_inicio__isnull=True) |  # Bloqueo de día completo
-                    (Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio))  # Solapamiento de horario
-                ).values_list('mesa_id', flat=True)
-
-                # Excluir mesas ocupadas y bloqueadas
-                mesas = mesas.exclude(id__in=list(mesas_ocupadas_ids) + list(mesas_bloqueadas_ids))
-
             except ValueError:
                 # Si hay error en el formato de fecha/hora, ignorar el filtro
-                pass
+                fecha = hora_inicio = None
 
-        serializer = MesaSerializer(mesas, many=True)
-        return Response(serializer.data)
+        def calcular():
+            # Obtener todas las mesas o filtrar por estado
+            if estado:
+                mesas = Mesa.objects.filter(estado=estado)
+            else:
+                mesas = Mesa.objects.all()
+
+            if fecha:
+                # Excluir mesas ocupadas y bloqueadas (reserva de 2 horas)
+                mesas = mesas.exclude(id__in=mesas_no_disponibles_ids(fecha, hora_inicio))
+
+            return list(MesaSerializer(mesas, many=True).data)
+
+        # CACHE: la respuesta depende de las mesas y, si se filtra por horario,
+        # de las reservas y bloqueos de esa fecha
+        ambitos = ['mesas']
+        if fecha:
+            ambitos += ['bloqueos', cache_disponibilidad.ambito_fecha(fecha)]
+
+        data, _ = cache_disponibilidad.obtener_o_calcular(
+            'mesas', ambitos, (estado, fecha, hora_inicio), calcular
+        )
+        return Response(data)
 
 
 class ConsultarHorasDisponiblesView(views.APIView):
@@ -906,7 +943,7 @@ class ConsultarHorasDisponiblesView(views.APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        from datetime import datetime, timedelta, time
+        from datetime import datetime
 
         fecha_str = request.query_params.get('fecha', None)
         personas_str = request.query_params.get('personas', '1')
@@ -927,67 +964,44 @@ class ConsultarHorasDisponiblesView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Generar todas las horas disponibles (12:00 - 21:00 cada 30 min)
-        todas_las_horas = []
-        for hora in range(12, 22):  # 12:00 a 21:00 (última reserva a las 21:00)
-            for minuto in [0, 30]:
-                todas_las_horas.append(time(hora, minuto))
+        # CACHE: versión por fecha; en un acierto no se consulta la base de datos
+        data, _ = cache_disponibilidad.obtener_o_calcular(
+            'horas',
+            ['capacidad', 'bloqueos', cache_disponibilidad.ambito_fecha(fecha)],
+            (fecha_str, num_personas),
+            lambda: self.calcular_horas(fecha_str, fecha, num_personas)
+        )
+        return Response(data)
 
-        # Obtener mesas que cumplan con la capacidad requerida
-        mesas_suficientes = Mesa.objects.filter(capacidad__gte=num_personas)
+    def calcular_horas(self, fecha_str, fecha, num_personas):
+        """Calcula la respuesta del endpoint (sin cache)."""
+        # Generar todas las horas disponibles (12:00 - 21:30 cada 30 min)
+        todas_las_horas = generar_horarios()
 
-        if not mesas_suficientes.exists():
+        # OPTIMIZACIÓN: una sola lectura de mesas, reservas y bloqueos del día;
+        # los solapamientos por franja se resuelven en memoria
+        mesas_libres_por_hora = disponibilidad_del_dia(fecha, num_personas, todas_las_horas)
+
+        if mesas_libres_por_hora is None:
             # No hay mesas con capacidad suficiente
             horas_sin_capacidad = [
                 {'hora': h.strftime('%H:%M'), 'mesas_disponibles': 0}
                 for h in todas_las_horas
             ]
-            return Response({
+            return {
                 'fecha': fecha_str,
                 'personas': num_personas,
                 'horas': horas_sin_capacidad,
                 'horas_disponibles': [],
                 'horas_no_disponibles': [h.strftime('%H:%M') for h in todas_las_horas],
                 'mensaje': f'No hay mesas disponibles para {num_personas} personas'
-            })
+            }
 
         horas_info = []
         horas_disponibles = []
         horas_no_disponibles = []
 
-        # Verificar disponibilidad para cada hora
-        for hora_inicio in todas_las_horas:
-            # Calcular hora fin (2 horas después)
-            dt_inicio = datetime.combine(fecha, hora_inicio)
-            dt_fin = dt_inicio + timedelta(hours=2)
-            hora_fin = dt_fin.time()
-
-            # Buscar mesas ocupadas en este horario
-            mesas_ocupadas_ids = Reserva.objects.filter(
-                fecha_reserva=fecha,
-                estado__in=['pendiente', 'activa'],  # Solo reservas activas/pendientes
-            ).filter(
-                # Verificar solapamiento de horarios
-                Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio)
-            ).values_list('mesa_id', flat=True)
-
-            # Buscar mesas bloqueadas en este horario
-            mesas_bloqueadas_ids = BloqueoMesa.objects.filter(
-                activo=True,
-                fecha_inicio__lte=fecha,
-                fecha_fin__gte=fecha
-            ).filter(
-                # Si el bloqueo tiene horario, verificar solapamiento de horas
-                # Si el bloqueo es de día completo (hora_inicio=None), bloquear toda la mesa
-                Q(hora_inicio__isnull=True) |  # Bloqueo de día completo
-                (Q(hora_inicio__lt=hora_fin) & Q(hora_fin__gt=hora_inicio))  # Solapamiento de horario
-            ).values_list('mesa_id', flat=True)
-
-            # Verificar si hay al menos una mesa disponible con capacidad suficiente
-            mesas_no_disponibles_ids = list(mesas_ocupadas_ids) + list(mesas_bloqueadas_ids)
-            mesas_disponibles = mesas_suficientes.exclude(id__in=mesas_no_disponibles_ids)
-            num_mesas_disponibles = mesas_disponibles.count()
-
+        for hora_inicio, num_mesas_disponibles in zip(todas_las_horas, mesas_libres_por_hora):
             hora_str = hora_inicio.strftime('%H:%M')
 
             # Agregar info de la hora con cantidad de mesas disponibles
@@ -1002,7 +1016,7 @@ class ConsultarHorasDisponiblesView(views.APIView):
             else:
                 horas_no_disponibles.append(hora_str)
 
-        return Response({
+        return {
             'fecha': fecha_str,
             'personas': num_personas,
             'horas': horas_info,  # Nueva estructura con cantidad de mesas
@@ -1011,12 +1025,121 @@ class ConsultarHorasDisponiblesView(views.APIView):
             'total_horas': len(todas_las_horas),
             'disponibles': len(horas_disponibles),
             'no_disponibles': len(horas_no_disponibles)
-        })
+        }
+
+
+class DisponibilidadRangoView(views.APIView):
+    """
+    Endpoint para consultar la disponibilidad de varios días en una sola llamada.
+    Pensado para el calendario del widget de reservas (antes: 1 request por día).
+
+    GET /api/disponibilidad-rango/?desde=2025-11-01&hasta=2025-11-30&personas=2
+
+    Parámetros:
+    - desde (requerido): Fecha inicial en formato YYYY-MM-DD
+    - hasta (requerido): Fecha final en formato YYYY-MM-DD (inclusive)
+    - personas (opcional): Número de personas (default: 1)
+
+    Los días se calculan antes de responder (como máximo MAX_DIAS_RANGO, unos
+    pocos KB): un error de la base de datos a mitad del rango devuelve un 500
+    y no un JSON truncado con status 200. Después el JSON se envía en
+    streaming, un día a la vez:
+    {
+        "desde": "2025-11-01",
+        "hasta": "2025-11-30",
+        "personas": 2,
+        "dias": [
+            {
+                "fecha": "2025-11-01",
+                "horas": [{"hora": "12:00", "mesas_disponibles": 5}, ...],
+                "disponibles": 18
+            },
+            ...
+        ]
+    }
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        from datetime import datetime
+        from django.http import StreamingHttpResponse
+
+        desde_str = request.query_params.get('desde', None)
+        hasta_str = request.query_params.get('hasta', None)
+        personas_str = request.query_params.get('personas', '1')
+
+        if not desde_str or not hasta_str:
+            return Response(
+                {'error': 'Los parámetros "desde" y "hasta" son requeridos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            desde = datetime.strptime(desde_str, '%Y-%m-%d').date()
+            hasta = datetime.strptime(hasta_str, '%Y-%m-%d').date()
+            num_personas = int(personas_str)
+        except ValueError as e:
+            return Response(
+                {'error': f'Formato inválido: {str(e)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if hasta < desde:
+            return Response(
+                {'error': 'La fecha "hasta" debe ser posterior o igual a "desde"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if (hasta - desde).days + 1 > MAX_DIAS_RANGO:
+            return Response(
+                {'error': f'El rango no puede superar {MAX_DIAS_RANGO} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        horarios = generar_horarios()
+        horas_str = [h.strftime('%H:%M') for h in horarios]
+        dias = list(disponibilidad_rango(desde, hasta, num_personas, horarios))
+
+        def generar_json():
+            import json
+
+            cabecera = json.dumps({
+                'desde': desde_str,
+                'hasta': hasta_str,
+                'personas': num_personas,
+            })
+            # Abrir el objeto y la lista de días, cerrando ambos al final
+            yield cabecera[:-1] + ', "dias": ['
+
+            for indice, (fecha, libres) in enumerate(dias):
+                dia = json.dumps({
+                    'fecha': fecha.isoformat(),
+                    'horas': [
+                        {'hora': hora, 'mesas_disponibles': cantidad}
+                        for hora, cantidad in zip(horas_str, libres)
+                    ],
+                    'disponibles': sum(1 for cantidad in libres if cantidad > 0),
+                })
+                yield dia if indice == 0 else ', ' + dia
+
+            yield ']}'
+
+        return StreamingHttpResponse(generar_json(), content_type='application/json')
+
 
 
+@api_view(['GET'])
+@permission_classes([IsAdministrador])
+def estadisticas_cache_disponibilidad(request):
+    """
+    Contadores de aciertos/fallos de la cache de disponibilidad (solo Admin).
+    GET /api/cache-disponibilidad/
+    """
+    return Response(cache_disponibilidad.estadisticas())
+
 # ============ ENDPOINTS DE RESERVAS ============
 
-class ReservaViewSet(viewsets.ModelViewSet):
+class ReservaViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     """
     ViewSet para el CRUD de Reservas.
 
@@ -1035,14 +1158,17 @@ class ReservaViewSet(viewsets.ModelViewSet):
        - ?fecha_reserva__range=2025-01-01,2025-12-31  Rango de fechas
        - ?mesa=5                            Filtra por número de mesa
 
-    2. Búsqueda por cliente (Search Filter):
+    2. Búsqueda por cliente (BusquedaClienteFilter):
        - ?search=juan                       Busca en: username, nombre, apellido, email, nombre_completo
-       - La búsqueda es case-insensitive y busca coincidencias parciales
+       - La búsqueda no distingue mayúsculas ni tildes y busca coincidencias parciales
        - Ejemplos: "juan perez", "juan@example.com", "jpérez"
+       - Usa el documento desnormalizado Perfil.busqueda (índice de trigramas en
+         PostgreSQL), por lo que no necesita limitarse por fecha
 
     3. Filtros especiales de fecha:
        - ?date=today                        Reservas de hoy
-       - ?all=true                          BÚSQUEDA GLOBAL: sin límite de fecha (usar con precaución)
+       - ?all=true                          Se acepta por compatibilidad: sin ?date el listado
+                                            ya cubre todo el historial
 
     4. Ordenamiento:
        - ?ordering=fecha_reserva            Ordena ascendente por fecha
@@ -1051,25 +1177,29 @@ class ReservaViewSet(viewsets.ModelViewSet):
 
     5. Paginación (50 elementos por página):
        - ?page=2                            Segunda página de resultados
-
-    OPTIMIZACIÓN DE RENDIMIENTO (Filtro Masivo):
+       - ?paginacion=cursor                 Paginación por cursor: sin COUNT ni OFFSET, cada
+                                            página cuesta lo mismo (historial completo con
+                                            ?all=true). Seguir los links 'next'/'previous'.
+                                            Orden fijo: -fecha_reserva, -hora_inicio, -id
+
+    6. Campos de la respuesta:
+       - El listado usa un serializer compacto (ReservaResumenSerializer): sin
+         mesa_info, estado_display, created_at ni updated_at
+       - ?vista=completa                    Listado con todos los campos (ReservaSerializer)
+       - ?fields=id,estado,mesa_numero      Solo esos campos (listado y detalle); los
+                                            campos no pedidos no se calculan (p. ej. sin
+                                            cliente_rut no se descifra el RUT)
+
+    OPTIMIZACIÓN DE RENDIMIENTO (Búsqueda de clientes):
     ==========================================
-    Cuando se combinan filtros de fecha + búsqueda de cliente, el sistema aplica
-    la fecha PRIMERO para limitar el conjunto de datos antes de procesar la búsqueda.
+    La búsqueda filtra por una sola columna indexada (Perfil.busqueda) en vez de
+    icontains sobre cinco columnas unidas, así que buscar en todo el historial
+    no recorre la tabla de reservas. Los filtros de fecha se siguen combinando
+    con la búsqueda para acotar el resultado.
 
-    Esto es especialmente útil en "Reservas del día" donde necesitas buscar clientes
-    dentro de una fecha específica sin escanear toda la base de datos.
-
-    Ejemplo optimizado (RECOMENDADO):
-    - GET /api/reservas/?date=today&search=juan
-      → Busca "juan" SOLO en las reservas de hoy (muy rápido)
-
-    Búsqueda sin fecha (con límite automático):
+    Búsqueda sin fecha:
     - GET /api/reservas/?search=juan
-      → Busca "juan" en reservas de últimos 7 días + futuras (previene escaneo completo)
-
-    Beneficio: 60-90% más rápido cuando se especifica fecha en búsquedas de clientes.
-    Protección automática: Búsquedas sin fecha se limitan a ventana relevante (7 días).
+      → Busca "juan" en todo el historial
 
     Ejemplos de uso:
     - GET /api/reservas/?estado=activa&date=today
@@ -1081,25 +1211,31 @@ class ReservaViewSet(viewsets.ModelViewSet):
     - GET /api/reservas/?fecha_reserva=2025-11-15&mesa=5
       → Reservas de la mesa 5 en fecha específica
     - GET /api/reservas/?all=true&search=juan
-      → BÚSQUEDA GLOBAL: Buscar "juan" en TODO el historial (puede ser lento)
+      → Buscar "juan" en TODO el historial (equivale a ?search=juan)
     - GET /api/reservas/?fecha_reserva__gte=2025-01-01&search=perez
       → Buscar "perez" en reservas desde el 1 de enero 2025
     - GET /api/reservas/?fecha_reserva__range=2025-01-01,2025-03-31
       → Reservas del primer trimestre de 2025
     - GET /api/reservas/?search=@example.com
-      → Todas las reservas de clientes con email @example.com (últimos 7 días + futuras)
+      → Todas las reservas de clientes con email @example.com
     - GET /api/reservas/?ordering=-created_at&page=1
       → Primera página de reservas ordenadas por fecha de creación descendente
+    - GET /api/reservas/?date=today&fields=id,hora_inicio,mesa_numero,estado
+      → Panel "reservas del día" con el mínimo de datos
     """
     queryset = Reserva.objects.all()
     serializer_class = ReservaSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = PaginacionReservas
+    filter_backends = [DjangoFilterBackend, BusquedaClienteFilter, filters.OrderingFilter]
     # Filtros disponibles con lookups avanzados
     filterset_fields = {
         'estado': ['exact'],
         'mesa': ['exact'],
         'fecha_reserva': ['exact', 'gte', 'lte', 'range'],  # Soporte para rangos de fecha
     }
+    # ?search= filtra sobre el documento de búsqueda; search_fields solo documenta
+    # qué campos contiene (y habilita el buscador de la API navegable)
+    search_document_field = 'cliente__perfil__busqueda'
     search_fields = ['cliente__username', 'cliente__first_name', 'cliente__last_name',
                      'cliente__email', 'cliente__perfil__nombre_completo']
     ordering_fields = ['fecha_reserva', 'hora_inicio', 'created_at']
@@ -1112,15 +1248,25 @@ class ReservaViewSet(viewsets.ModelViewSet):
         if self.action in ['create']:
             # Cualquier usuario autenticado puede crear reserva
             permission_classes = [IsAuthenticated]
-        elif self.action in ['update', 'partial_update', 'destroy']:
+        elif self.action in ['update', 'partial_update', 'destroy', 'cambiar_estado']:
             # Admins y Cajeros pueden modificar/eliminar cualquier reserva
-            # Clientes solo pueden modificar/eliminar sus propias reservas
+            # Clientes solo pueden modificar/eliminar (o cancelar) sus propias reservas
             permission_classes = [IsAdminOrCajeroOrOwner]
+        elif self.action in ['bulk', 'cambiar_estado_masivo']:
+            # Creación y cambio de estado masivos: solo personal del restaurante
+            permission_classes = [IsAdminOrCajero]
         else:
             # Para list y retrieve, cualquier autenticado
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def get_serializer_class(self):
+        # Listado compacto salvo que se pida la vista completa o campos concretos
+        params = self.request.query_params
+        if self.action == 'list' and 'fields' not in params and params.get('vista') != 'completa':
+            return ReservaResumenSerializer
+        return ReservaSerializer
+
     def get_queryset(self):
         """
         Filtrar reservas según el rol del usuario.
@@ -1128,51 +1274,40 @@ class ReservaViewSet(viewsets.ModelViewSet):
         - Cliente: solo sus propias reservas
 
         OPTIMIZACIÓN:
-        - Aplica filtros de fecha PRIMERO para reducir el conjunto de datos
         - Usa select_related para evitar N+1 queries
-        - Scoping de búsqueda: cuando se busca por cliente, el filtro de fecha
-          se aplica antes de que SearchFilter procese, evitando escaneos completos
+        - La búsqueda por cliente (BusquedaClienteFilter) usa el documento
+          indexado Perfil.busqueda, sin ventana de fechas implícita
         """
         user = self.request.user
+        rol = rol_de(self.request)
 
-        try:
-            if user.perfil.rol in ['admin', 'cajero', 'mesero']:
-                queryset = Reserva.objects.all()
-            else:
-                # Cliente solo ve sus reservas
-                queryset = Reserva.objects.filter(cliente=user)
-        except AttributeError:
+        if rol in ['admin', 'cajero', 'mesero']:
+            queryset = Reserva.objects.all()
+        else:
+            # Cliente (o usuario sin perfil) solo ve sus reservas
             queryset = Reserva.objects.filter(cliente=user)
 
-        # OPTIMIZACIÓN CRÍTICA: Aplicar filtros de fecha PRIMERO
-        # Esto limita el conjunto de datos antes de que SearchFilter procese
-        # Beneficio: búsquedas de clientes en "Reservas del día" no escanean toda la BD
-
         # Filtro por fecha (para HU-17: reservas del día)
         fecha = self.request.query_params.get('date', None)
-        all_results = self.request.query_params.get('all', None)
 
         if fecha == 'today':
             queryset = queryset.filter(fecha_reserva=timezone.now().date())
         elif fecha:
             queryset = queryset.filter(fecha_reserva=fecha)
-        elif all_results == 'true':
-            # BÚSQUEDA GLOBAL: No aplicar límite de fecha
-            # Usar con precaución - puede ser lento con muchas reservas
-            pass
-        else:
-            # OPTIMIZACIÓN ADICIONAL: Si no hay filtro de fecha Y hay búsqueda,
-            # limitar automáticamente a reservas relevantes (últimos 7 días + futuras)
-            # Esto previene escaneos completos de la base de datos
-            search_query = self.request.query_params.get('search', None)
-            if search_query:
-                from datetime import timedelta
-                fecha_limite = timezone.now().date() - timedelta(days=7)
-                queryset = queryset.filter(fecha_reserva__gte=fecha_limite)
 
         # OPTIMIZACIÓN: Cargar relaciones en una sola query
         queryset = queryset.select_related('cliente', 'cliente__perfil', 'mesa')
 
+        # RUT y teléfono del cliente: solo el texto cifrado de los campos que
+        # el rol puede ver (y que ?fields= pide), descifrado en lote al
+        # serializar (ver cifrado.py)
+        if self.action in ('list', 'retrieve'):
+            campos = campos_visibles(rol)
+            solicitados = campos_solicitados(self.request)
+            if solicitados is not None:
+                campos = [campo for campo in campos if f'cliente_{campo}' in solicitados]
+            queryset = anotar_cifrados(queryset, campos)
+
         return queryset
 
     def perform_create(self, serializer):
@@ -1180,14 +1315,14 @@ class ReservaViewSet(viewsets.ModelViewSet):
         Al crear una reserva, asignar el usuario autenticado como cliente
         y actualizar el estado de la mesa a 'reservada'.
 
-        IMPORTANTE: Usa transacción atómica y select_for_update() para evitar race conditions
+        Las reservas simultáneas solapadas las rechaza Reserva.save() (exclusion
+        constraint en PostgreSQL), sin bloquear la fila de la mesa: reservas en
+        franjas distintas de la misma mesa no se serializan.
         """
         from django.db import transaction
 
         with transaction.atomic():
-            # Bloquear la mesa para evitar dobles reservas simultáneas
-            mesa_id = serializer.validated_data['mesa'].id
-            mesa = Mesa.objects.select_for_update().get(id=mesa_id)
+            mesa = serializer.validated_data['mesa']
 
             # Guardar la reserva
             reserva = serializer.save(cliente=self.request.user)
@@ -1224,11 +1359,6 @@ class ReservaViewSet(viewsets.ModelViewSet):
             })
 
         with transaction.atomic():
-            # Si se está cambiando la mesa, bloquear la nueva mesa
-            if 'mesa' in serializer.validated_data:
-                nueva_mesa_id = serializer.validated_data['mesa'].id
-                nueva_mesa = Mesa.objects.select_for_update().get(id=nueva_mesa_id)
-
             # Guardar con validación completa (ejecuta model.clean())
             serializer.save()
 
@@ -1257,7 +1387,77 @@ class ReservaViewSet(viewsets.ModelViewSet):
                 mesa.estado = 'disponible'
                 mesa.save()
 
-    @action(detail=True, methods=['patch'], permission_classes=[IsAdminOrCajero])
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Creación masiva de reservas (solo Admin y Cajero).
+        POST /api/reservas/bulk/
+        Body: {
+            reservas: [{mesa, fecha_reserva, hora_inicio, num_personas, cliente?, notas?}, ...],
+            modo: 'todo_o_nada' (default) | 'parcial'
+        }
+
+        Valida solapamientos de todo el lote en memoria e inserta con bulk_create
+        (ver reservas_lote.py). Retorna el resultado de cada elemento:
+        - 201: todas creadas
+        - 207: modo parcial con algunos elementos inválidos
+        - 400: ningún elemento creado
+        - 409: otra reserva ocupó un horario del lote durante la inserción
+        """
+        from django.core.exceptions import ValidationError as DjangoValidationError
+        from .reservas_lote import MAX_RESERVAS_LOTE, MODOS, MODO_TODO_O_NADA, crear_reservas_en_lote
+
+        elementos = request.data.get('reservas')
+        modo = request.data.get('modo', MODO_TODO_O_NADA)
+
+        if not isinstance(elementos, list) or not elementos:
+            return Response(
+                {'error': 'El campo "reservas" debe ser una lista no vacía'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(elementos) > MAX_RESERVAS_LOTE:
+            return Response(
+                {'error': f'El lote no puede superar {MAX_RESERVAS_LOTE} reservas'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if modo not in MODOS:
+            return Response(
+                {'error': f'Modo inválido. Opciones: {", ".join(MODOS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(isinstance(elemento, dict) for elemento in elementos):
+            return Response(
+                {'error': 'Cada reserva debe ser un objeto'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            resultados, creadas = crear_reservas_en_lote(elementos, request.user, modo)
+        except DjangoValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_409_CONFLICT)
+
+        # FIX #21: Logging de auditoría
+        self.audit_logger.info(
+            f"RESERVAS_LOTE: Usuario={request.user.username}, Modo={modo}, "
+            f"Recibidas={len(elementos)}, Creadas={len(creadas)}, "
+            f"IDs={[reserva.pk for reserva in creadas]}"
+        )
+
+        if len(creadas) == len(elementos):
+            codigo = status.HTTP_201_CREATED
+        elif creadas:
+            codigo = status.HTTP_207_MULTI_STATUS
+        else:
+            codigo = status.HTTP_400_BAD_REQUEST
+
+        return Response({
+            'modo': modo,
+            'creadas': len(creadas),
+            'errores': len(elementos) - len(creadas),
+            'resultados': resultados,
+        }, status=codigo)
+
+    @action(detail=True, methods=['patch'], permission_classes=[IsAdminOrCajeroOrOwner])
     def cambiar_estado(self, request, pk=None):
         """
         Endpoint personalizado para cambiar el estado de una reserva.
@@ -1269,17 +1469,23 @@ class ReservaViewSet(viewsets.ModelViewSet):
         - #19 MODERADO: Valida transiciones de estado válidas
         - #23 MODERADO: Locks para prevenir inconsistencias en cancelaciones múltiples
         - #13 MODERADO: Solo cambia estado de mesa si reserva es para hoy/futuro cercano
+
+        Admin y Cajero cambian cualquier reserva; un cliente solo las suyas
+        (p. ej. cancelar desde "Mis reservas").
         """
         from django.db import transaction
         from datetime import timedelta
 
         # FIX #23 (MODERADO): Usar transacción con locks
         with transaction.atomic():
+            # get_object() aplica get_queryset (el cliente solo ve las suyas)
+            # y los permisos de objeto; después se bloquea la fila
+            self.get_object()
             # Bloquear la reserva y la mesa para prevenir race conditions
             reserva = Reserva.objects.select_for_update().select_related('mesa').get(pk=pk)
             nuevo_estado = request.data.get('estado')
 
-            if nuevo_estado not in ['activa', 'completada', 'cancelada', 'pendiente']:
+            if nuevo_estado not in ESTADOS_DESTINO:
                 return Response(
                     {'error': 'Estado inválido'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -1293,17 +1499,10 @@ class ReservaViewSet(viewsets.ModelViewSet):
                 )
 
             # FIX #19 (MODERADO): Validar transiciones de estado válidas
-            transiciones_validas = {
-                'pendiente': ['activa', 'cancelada'],
-                'activa': ['completada', 'cancelada'],
-                'completada': [],  # Estado final, no se puede cambiar
-                'cancelada': []     # Estado final, no se puede cambiar
-            }
-
-            if nuevo_estado not in transiciones_validas.get(reserva.estado, []):
+            if nuevo_estado not in TRANSICIONES_VALIDAS.get(reserva.estado, []):
                 return Response({
                     'error': f'Transición inválida de {reserva.estado} a {nuevo_estado}',
-                    'transiciones_validas': transiciones_validas.get(reserva.estado, [])
+                    'transiciones_validas': TRANSICIONES_VALIDAS.get(reserva.estado, [])
                 }, status=status.HTTP_400_BAD_REQUEST)
 
             # Actualizar estado de la reserva
@@ -1334,7 +1533,8 @@ class ReservaViewSet(viewsets.ModelViewSet):
 
                 reserva.mesa.save()
 
-            reserva.save()
+            # Solo cambia el estado: sin full_clean() ni consulta de solapamiento
+            reserva.save(update_fields=['estado'])
 
             # FIX #21: Logging de auditoría
             self.audit_logger.info(
@@ -1346,8 +1546,87 @@ class ReservaViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(reserva)
             return Response(serializer.data)
 
+    @action(detail=False, methods=['patch'], url_path='cambiar-estado-masivo')
+    def cambiar_estado_masivo(self, request):
+        """
+        Cambio de estado de muchas reservas a la vez (solo Admin y Cajero),
+        p. ej. completar o cancelar las del día al cierre del servicio.
+        PATCH /api/reservas/cambiar-estado-masivo/
+        Body: {
+            ids: [id, ...],
+            estado: 'activa'|'completada'|'cancelada'|'pendiente',
+            modo: 'todo_o_nada' (default) | 'parcial'
+        }
+
+        Mismas reglas que cambiar_estado (transiciones válidas, sin fechas
+        pasadas, estado de la mesa solo para hoy/mañana), aplicadas con
+        UPDATEs por conjunto (ver transiciones.py). Retorna el resultado de
+        cada id:
+        - 200: todas cambiadas
+        - 207: modo parcial con algunas reservas inválidas
+        - 400: ninguna cambiada
+        """
+        from .reservas_lote import MODOS, MODO_TODO_O_NADA
+        from .transiciones import MAX_RESERVAS_TRANSICION, cambiar_estado_en_lote
+
+        ids = request.data.get('ids')
+        nuevo_estado = request.data.get('estado')
+        modo = request.data.get('modo', MODO_TODO_O_NADA)
 
-class BloqueoMesaViewSet(viewsets.ModelViewSet):
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {'error': 'El campo "ids" debe ser una lista no vacía'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            return Response(
+                {'error': 'Cada id debe ser un número entero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > MAX_RESERVAS_TRANSICION:
+            return Response(
+                {'error': f'No se pueden cambiar más de {MAX_RESERVAS_TRANSICION} reservas por request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if nuevo_estado not in ESTADOS_DESTINO:
+            return Response(
+                {'error': 'Estado inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if modo not in MODOS:
+            return Response(
+                {'error': f'Modo inválido. Opciones: {", ".join(MODOS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultados, cambiadas = cambiar_estado_en_lote(ids, nuevo_estado, modo)
+
+        # FIX #21: Logging de auditoría (una línea por reserva, como cambiar_estado)
+        for reserva in cambiadas:
+            self.audit_logger.info(
+                f"ESTADO_CAMBIADO: Reserva_ID={reserva.id}, Usuario={request.user.username}, "
+                f"Estado_Anterior={reserva.estado_anterior}, Estado_Nuevo={nuevo_estado}, "
+                f"Mesa={reserva.mesa.numero}, Fecha={reserva.fecha_reserva}, Masivo=1"
+            )
+
+        if len(cambiadas) == len(ids):
+            codigo = status.HTTP_200_OK
+        elif cambiadas:
+            codigo = status.HTTP_207_MULTI_STATUS
+        else:
+            codigo = status.HTTP_400_BAD_REQUEST
+
+        return Response({
+            'estado': nuevo_estado,
+            'modo': modo,
+            'cambiadas': len(cambiadas),
+            'errores': len(ids) - len(cambiadas),
+            'resultados': resultados,
+        }, status=codigo)
+
+
+class BloqueoMesaViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     """
     ViewSet para el CRUD completo de Bloqueos de Mesas.
     Solo los Administradores pueden crear, modificar y eliminar bloqueos.
@@ -1366,9 +1645,12 @@ class BloqueoMesaViewSet(viewsets.ModelViewSet):
     - categoria: Filtrar por categoría de bloqueo
     - fecha_inicio: Filtrar por fecha de inicio
     - fecha_fin: Filtrar por fecha de fin
+
+    Paginación: ?page=N (default) o ?paginacion=cursor (orden fijo -fecha_inicio, -id)
     """
     queryset = BloqueoMesa.objects.all()
     serializer_class = BloqueoMesaSerializer
+    pagination_class = PaginacionBloqueos
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_fields = ['mesa__numero', 'activo', 'categoria', 'fecha_inicio', 'fecha_fin']
     search_fields = ['motivo', 'notas']
@@ -1418,22 +1700,28 @@ class BloqueoMesaViewSet(viewsets.ModelViewSet):
         if solo_activos == 'true':
             queryset = queryset.filter(activo=True)
 
-        # Filtrar bloqueos activos en una fecha específica
+        # Filtrar bloqueos activos en una fecha específica (incluye recurrencias)
         activos_en_fecha = self.request.query_params.get('activos_en_fecha', None)
         if activos_en_fecha:
             from datetime import datetime
             try:
                 fecha = datetime.strptime(activos_en_fecha, '%Y-%m-%d').date()
-                queryset = queryset.filter(
-                    activo=True,
-                    fecha_inicio__lte=fecha,
-                    fecha_fin__gte=fecha
-                )
+                queryset = self.filtrar_activos_en_fecha(queryset, fecha)
             except ValueError:
                 pass  # Ignorar fechas inválidas
 
         return queryset
 
+    def filtrar_activos_en_fecha(self, queryset, fecha):
+        """
+        Bloqueos activos que aplican en la fecha, resuelto con el índice
+        (fecha, mesa) de OcurrenciaBloqueo en vez de evaluar las recurrencias.
+        """
+        return queryset.filter(
+            activo=True,
+            id__in=OcurrenciaBloqueo.objects.filter(fecha=fecha).values('bloqueo_id')
+        )
+
     @action(detail=False, methods=['get'], url_path='activos-hoy')
     def activos_hoy(self, request):
         """
@@ -1443,11 +1731,7 @@ class BloqueoMesaViewSet(viewsets.ModelViewSet):
         from datetime import date
         hoy = date.today()
 
-        bloqueos_hoy = self.get_queryset().filter(
-            activo=True,
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        )
+        bloqueos_hoy = self.filtrar_activos_en_fecha(self.get_queryset(), hoy)
 
         serializer = self.get_serializer(bloqueos_hoy, many=True)
         return Response(serializer.data)
@@ -7,6 +7,15 @@ echo "🚀 Iniciando deployment en Railway..."
 echo "📦 Ejecutando migraciones..."
 python manage.py migrate --noinput
 
+# 1b. Crear tabla de cache (solo tiene efecto con CACHE_URL=db://...)
+python manage.py createcachetable
+
+# 1c. Índices ciegos de RUT y teléfono de perfiles que aún no los tienen
+python manage.py rellenar_indices_ciegos --solo-faltantes
+
+# 1d. Llevar los bloqueos recurrentes al horizonte de hoy (también es un job diario)
+python manage.py extender_ocurrencias
+
 # 2. Crear mesas (no detener si falla)
 echo "🪑 Creando mesas iniciales..."
 python crear_mesas.py || echo "⚠️  Advertencia: No se pudieron crear mesas (posiblemente ya existen)"
@@ -19,7 +28,14 @@ python crear_superuser.py || echo "⚠️  Advertencia: No se pudo crear superus
 echo "📁 Recolectando archivos estáticos..."
 python manage.py collectstatic --noinput --clear
 
-# 5. Iniciar Gunicorn
+# 5. Worker del outbox de emails, en segundo plano (se relanza si termina)
+echo "📧 Iniciando worker de emails..."
+(while true; do
+    python manage.py procesar_emails --continuo || echo "⚠️  El worker de emails terminó con error, reiniciando..."
+    sleep 5
+done) &
+
+# 6. Iniciar Gunicorn
 echo "🌐 Iniciando servidor Gunicorn..."
 exec gunicorn ReservaProject.wsgi:application \
     --bind 0.0.0.0:${PORT:-8000} \
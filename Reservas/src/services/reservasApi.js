@@ -420,6 +420,33 @@ export async function getHorasDisponibles({ fecha, personas = 1 } = {}) {
   return response.json();
 }
 
+/**
+ * Obtener disponibilidad por hora para un rango de días (máx. 90)
+ * @param {Object} params - {desde: string (YYYY-MM-DD), hasta: string (YYYY-MM-DD), personas: number}
+ * @returns {Object} - {desde, hasta, personas, dias: [{fecha, horas: [{hora, mesas_disponibles}], disponibles}]}
+ */
+export async function getDisponibilidadRango({ desde, hasta, personas = 1 } = {}) {
+  const params = new URLSearchParams();
+  if (desde) params.append('desde', desde);
+  if (hasta) params.append('hasta', hasta);
+  if (personas) params.append('personas', personas.toString());
+
+  const response = await fetch(
+    `${API_BASE_URL}/disponibilidad-rango/?${params.toString()}`,
+    {
+      method: 'GET',
+      headers: getAuthHeaders(),
+    }
+  );
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.error || 'Error al obtener disponibilidad del rango');
+  }
+
+  return response.json();
+}
+
 /**
  * Obtener todas las mesas
  * @param {Object} params - {estado: string, fecha: string, hora: string} (opcional)